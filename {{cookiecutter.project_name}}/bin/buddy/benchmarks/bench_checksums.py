@@ -0,0 +1,121 @@
+"""
+Benchmark the throughput of each hashing algorithm that can be used by the
+file validators.
+
+Synthetic files of each requested size are written to a temporary directory,
+read once (so that every algorithm sees a warm page-cache) and then hashed
+with each algorithm in turn. The results are printed as a tab-separated table.
+
+Usage:
+    python benchmarks/bench_checksums.py \\
+        --sizes 1M 10M 100M 1G 10G --algorithms md5 sha256 blake2b
+"""
+
+import argparse
+import os
+import os.path
+import sys
+import tempfile
+import time
+
+from buddy.hashing import get_algorithms, hash_file, hash_file_mmap
+
+UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_size(size):
+    """
+    Convert a size such as "10M" or "1G" into a number of bytes
+    """
+    if size[-1].upper() in UNITS:
+        return int(float(size[:-1]) * UNITS[size[-1].upper()])
+    return int(size)
+
+
+def write_synthetic_file(filepath, n_bytes, is_text=False):
+    """
+    Write a file of `n_bytes`; either random bytes or tab-separated text
+    """
+    if is_text:
+        row = b"gene_00001\tsample_01\t0.123456\t42\n"
+        block = row * ((1 << 20) // len(row) + 1)
+    else:
+        block = os.urandom(1 << 20)
+    with open(filepath, "wb") as file_handle:
+        remaining = n_bytes
+        while remaining > 0:
+            file_handle.write(block[: min(remaining, len(block))])
+            remaining -= len(block)
+
+
+def time_hashing(filepath, algorithm, use_mmap):
+    """
+    The number of seconds taken to hash a file
+    """
+    hasher = hash_file_mmap if use_mmap else hash_file
+    start = time.perf_counter()
+    hasher(filepath, algorithm=algorithm)
+    return time.perf_counter() - start
+
+
+def run_benchmark(sizes, algorithms, directory=None, is_text=False, use_mmap=False):
+    """
+    Print the time taken, and throughput, for hashing files of each size
+    with each algorithm
+    """
+    print("\t".join(["algorithm", "size", "seconds", "MB_per_second"]))
+    with tempfile.TemporaryDirectory(dir=directory) as temp_dir:
+        for size in sizes:
+            n_bytes = parse_size(size)
+            filepath = os.path.join(temp_dir, "synthetic_{}".format(size))
+            write_synthetic_file(filepath, n_bytes, is_text)
+            # warm the page-cache
+            hash_file(filepath, algorithm="md5")
+
+            for algorithm in algorithms:
+                seconds = time_hashing(filepath, algorithm, use_mmap)
+                throughput = n_bytes / (1 << 20) / seconds if seconds else float("inf")
+                print(
+                    "\t".join(
+                        [
+                            algorithm,
+                            size,
+                            "{:.3f}".format(seconds),
+                            "{:.1f}".format(throughput),
+                        ]
+                    )
+                )
+                sys.stdout.flush()
+            os.remove(filepath)
+
+
+def define_command_arg_parser():
+    """
+    Get a parser that extracts the command args used when calling this program
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        default=["1M", "10M", "100M", "1G", "10G"],
+        help="sizes of the synthetic files (eg, 1M, 10G)",
+    )
+    parser.add_argument(
+        "--algorithms",
+        nargs="+",
+        default=get_algorithms(),
+        help="hashing algorithms to compare (default: all available)",
+    )
+    parser.add_argument(
+        "--dir", default=None, help="directory in which to write the files"
+    )
+    parser.add_argument(
+        "--text", action="store_true", help="hash text files rather than binary"
+    )
+    parser.add_argument("--mmap", action="store_true", help="memory-map the files")
+    return parser
+
+
+if __name__ == "__main__":
+    ARGS = define_command_arg_parser().parse_args()
+    run_benchmark(ARGS.sizes, ARGS.algorithms, ARGS.dir, ARGS.text, ARGS.mmap)
@@ -0,0 +1,151 @@
+"""
+Benchmark the start-up time of `sidekick` subcommands.
+
+Each command is ran repeatedly, in a temporary project that holds a small
+validation yaml file, and the median wall-clock time is reported together
+with the total import time reported by `python -X importtime` and the slowest
+top-level imports. The results are printed as a tab-separated table.
+
+With `--max-import-ms`, the benchmark exits with status 1 if the import time
+for any command exceeds that limit, so it can be used as a regression guard.
+
+Usage:
+    python benchmarks/bench_startup.py --repeats 20 --max-import-ms 50
+"""
+
+import argparse
+import os
+import os.path
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SIDEKICK = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "sidekick.py",
+)
+
+COMMANDS = {
+    "help": ["--help"],
+    "validate_quick": ["validate", "tests.yaml", "--quick", "--no-cache"],
+    "validate": ["validate", "tests.yaml", "--no-cache"],
+}
+
+VALIDATION_YAML = """\
+test_data:
+    input_file: data.tsv
+    expected_md5sum: 5c22ab96a92ef6ae58d95a71e79943f7
+    expected_size: 16
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Parse the output of `python -X importtime`
+
+    :param stderr: The standard error of a python process.
+    :return: A list of (module, cumulative microseconds) for each top-level
+    import, in the order that they were imported.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        if not module.startswith("  "):
+            # modules imported by other modules are indented
+            imports.append((module.strip(), int(cumulative)))
+    return imports
+
+
+def time_command(args, cwd):
+    """
+    Run `sidekick` once, with `-X importtime`
+
+    :return: A tuple (seconds, imports), where `imports` is as for
+    `parse_importtime`.
+    """
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", SIDEKICK] + args,
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    seconds = time.perf_counter() - start
+    return seconds, parse_importtime(process.stderr)
+
+
+def run_benchmark(commands, n_repeats=10, max_import_ms=None):
+    """
+    Print the median start-up time, and import time, for each command
+
+    :return: The names of the commands whose import time exceeded
+    `max_import_ms`.
+    """
+    print("\t".join(["command", "median_ms", "import_ms", "slowest_imports"]))
+    too_slow = []
+    with tempfile.TemporaryDirectory() as project_dir:
+        with open(os.path.join(project_dir, "tests.yaml"), "w") as file_handle:
+            file_handle.write(VALIDATION_YAML)
+        with open(os.path.join(project_dir, "data.tsv"), "w") as file_handle:
+            file_handle.write("gene\tsample\t0.1\n")
+
+        for name in commands:
+            timings = [
+                time_command(COMMANDS[name], project_dir) for _ in range(n_repeats)
+            ]
+            median_ms = 1000 * statistics.median(seconds for seconds, _ in timings)
+            imports = timings[-1][1]
+            import_ms = sum(us for _, us in imports) / 1000
+            slowest = sorted(imports, key=lambda x: -x[1])[:3]
+            print(
+                "\t".join(
+                    [
+                        name,
+                        "{:.1f}".format(median_ms),
+                        "{:.1f}".format(import_ms),
+                        " ".join(
+                            "{}:{:.1f}".format(module, us / 1000)
+                            for module, us in slowest
+                        ),
+                    ]
+                )
+            )
+            sys.stdout.flush()
+            if max_import_ms is not None and import_ms > max_import_ms:
+                too_slow.append(name)
+    return too_slow
+
+
+def define_command_arg_parser():
+    """
+    Get a parser that extracts the command args used when calling this program
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--commands",
+        nargs="+",
+        choices=sorted(COMMANDS),
+        default=sorted(COMMANDS),
+        help="sidekick commands to time (default: all)",
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=10, help="number of runs of each command"
+    )
+    parser.add_argument(
+        "--max-import-ms",
+        type=float,
+        default=None,
+        help="exit with status 1 if the imports for any command take longer",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    ARGS = define_command_arg_parser().parse_args()
+    TOO_SLOW = run_benchmark(ARGS.commands, ARGS.repeats, ARGS.max_import_ms)
+    sys.exit(1 if TOO_SLOW else 0)
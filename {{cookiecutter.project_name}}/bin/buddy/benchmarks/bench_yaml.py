@@ -0,0 +1,137 @@
+"""
+Benchmark the loading of large validation yaml files.
+
+Synthetic validation yaml files, with each requested number of tests, are
+written to a temporary directory and then loaded by each method in turn:
+
+- `safe_load`: the pure-python `yaml.SafeLoader`;
+- `csafe_load`: libyaml's `yaml.CSafeLoader` (if it is available);
+- `read_yaml`: `file_utils.read_yaml`, without a cache;
+- `read_yaml_cached`: `file_utils.read_yaml`, once the parsed file has been
+  cached;
+- `iter_yaml_mapping`: the streaming loader, `file_utils.iter_yaml_mapping`.
+
+The results are printed as a tab-separated table.
+
+Usage:
+    python benchmarks/bench_yaml.py --n-tests 1000 10000 100000
+"""
+
+import argparse
+import os
+import os.path
+import sys
+import tempfile
+import time
+
+import yaml
+
+from buddy.file_utils import iter_yaml_mapping, read_yaml
+
+
+def write_synthetic_yaml(filepath, n_tests):
+    """
+    Write a validation yaml file that defines `n_tests` tests
+    """
+    with open(filepath, "w") as file_handle:
+        for i in range(n_tests):
+            file_handle.write(
+                "test_{i:07d}:\n"
+                "    input_file: data/sample_{i:07d}/counts.tsv\n"
+                "    expected_md5sum: {digest:032x}\n"
+                "    expected_size: {size}\n"
+                "    expected_lines: {lines}\n".format(
+                    i=i, digest=i * 7919, size=1000 + i, lines=10 + i % 100
+                )
+            )
+
+
+def get_methods(cache_dir):
+    """
+    The methods for loading a yaml file, by name; each takes a file path
+    """
+
+    def safe_load(filepath):
+        with open(filepath, "r") as file_handle:
+            return yaml.load(file_handle, Loader=yaml.SafeLoader)
+
+    def csafe_load(filepath):
+        with open(filepath, "r") as file_handle:
+            return yaml.load(file_handle, Loader=yaml.CSafeLoader)
+
+    def read_yaml_cached(filepath):
+        return read_yaml(filepath, cache_dir=cache_dir)
+
+    def stream(filepath):
+        for _ in iter_yaml_mapping(filepath):
+            pass
+
+    methods = {"safe_load": safe_load}
+    if hasattr(yaml, "CSafeLoader"):
+        methods["csafe_load"] = csafe_load
+    methods["read_yaml"] = read_yaml
+    methods["read_yaml_cached"] = read_yaml_cached
+    methods["iter_yaml_mapping"] = stream
+    return methods
+
+
+def run_benchmark(n_tests_list, method_names=None, directory=None):
+    """
+    Print the time taken to load a file of each size with each method
+    """
+    print("\t".join(["method", "n_tests", "seconds", "tests_per_second"]))
+    with tempfile.TemporaryDirectory(dir=directory) as temp_dir:
+        methods = get_methods(os.path.join(temp_dir, "cache"))
+        for n_tests in n_tests_list:
+            filepath = os.path.join(temp_dir, "tests_{}.yaml".format(n_tests))
+            write_synthetic_yaml(filepath, n_tests)
+            # fill the cache (and the page-cache)
+            methods["read_yaml_cached"](filepath)
+
+            for name, method in methods.items():
+                if method_names and name not in method_names:
+                    continue
+                start = time.perf_counter()
+                method(filepath)
+                seconds = time.perf_counter() - start
+                print(
+                    "\t".join(
+                        [
+                            name,
+                            str(n_tests),
+                            "{:.3f}".format(seconds),
+                            "{:.0f}".format(n_tests / seconds),
+                        ]
+                    )
+                )
+                sys.stdout.flush()
+            os.remove(filepath)
+
+
+def define_command_arg_parser():
+    """
+    Get a parser that extracts the command args used when calling this program
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--n-tests",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="numbers of tests in the synthetic yaml files",
+    )
+    parser.add_argument(
+        "--methods",
+        nargs="+",
+        default=None,
+        help="loading methods to compare (default: all available)",
+    )
+    parser.add_argument(
+        "--dir", default=None, help="directory in which to write the files"
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    ARGS = define_command_arg_parser().parse_args()
+    run_benchmark(ARGS.n_tests, ARGS.methods, ARGS.dir)
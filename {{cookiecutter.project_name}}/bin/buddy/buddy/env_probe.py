@@ -0,0 +1,325 @@
+"""
+Probe the active environment for executables and installed packages, without
+running any subprocesses.
+
+- An executable is found by scanning the directories in `PATH` (as for
+  `which`).
+- A package is installed if it is listed in `$CONDA_PREFIX/conda-meta` (one
+  `<name>-<version>-<build>.json` file per conda package), or if the active
+  python has metadata for it (eg, a package installed by `pip install -e`).
+  This avoids `conda list`, which loads the whole of conda.
+
+The results are cached, per conda environment, in a JSON file. A cached result
+is only reused while the fingerprint of the environment (the paths to the
+environment and to `python`, `PATH`, and the modification times of
+`conda-meta` and `site-packages`) is unchanged; installing or removing a
+package with either `conda` or `pip` changes the fingerprint.
+
+This module only uses the standard library, so it can be ran as a script
+before `buddy` has been installed:
+
+    python bin/buddy/buddy/env_probe.py --package buddy --executable Rscript
+"""
+
+import argparse
+import json
+import os
+import os.path
+import re
+import shutil
+import sys
+import sysconfig
+import tempfile
+
+DEFAULT_PROBE_CACHE = os.path.join("~", ".cache", "buddy", "env_probe.json")
+
+
+def get_default_probe_cache():
+    """
+    The file that caches the results of probing each environment; this is
+    `$BUDDY_ENV_CACHE` if that is set, otherwise `~/.cache/buddy/env_probe.json`.
+    """
+    return os.path.expanduser(os.environ.get("BUDDY_ENV_CACHE", DEFAULT_PROBE_CACHE))
+
+
+def normalise_package_name(name):
+    """
+    Package names are compared case-insensitively, and "-", "_" and "." are
+    equivalent within them (as for pip).
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def find_executable(name, environ=None):
+    """
+    The path to the executable that `name` resolves to, by scanning the
+    directories in `PATH`.
+
+    :param name: The name of an executable, eg, "Rscript".
+    :param environ: A dictionary of environment variables; defaults to
+    `os.environ`.
+    :return: A path, or None if there is no such executable on the `PATH`.
+    """
+    if environ is None:
+        environ = os.environ
+    return shutil.which(name, path=environ.get("PATH", os.defpath))
+
+
+def read_conda_packages(conda_prefix):
+    """
+    The names of the packages that conda has installed into an environment.
+
+    :param conda_prefix: The path to a conda environment.
+    :return: A set of normalised package names (empty if the environment has
+    no `conda-meta` directory).
+    """
+    try:
+        filenames = os.listdir(os.path.join(conda_prefix, "conda-meta"))
+    except OSError:
+        return set()
+    return {
+        normalise_package_name(filename[: -len(".json")].rsplit("-", 2)[0])
+        for filename in filenames
+        if filename.endswith(".json") and filename.count("-") >= 2
+    }
+
+
+def _has_distribution_info(name):
+    # For python < 3.8: look for the `.dist-info` / `.egg-info` / `.egg-link`
+    # that is installed alongside a package on `sys.path`
+    for directory in sys.path:
+        try:
+            entries = os.listdir(directory or os.curdir)
+        except OSError:
+            continue
+        for entry in entries:
+            stem, extension = os.path.splitext(entry)
+            if extension not in (".dist-info", ".egg-info", ".egg-link"):
+                continue
+            if normalise_package_name(stem.split("-")[0]) == name:
+                return True
+    return False
+
+
+def python_package_is_installed(name):
+    """
+    Does the active python have metadata for an installed package?
+
+    :param name: The name of a package.
+    :return: bool
+    """
+    name = normalise_package_name(name)
+    # `importlib.metadata` is only imported when a package is probed, so a
+    # fully-cached run doesn't pay for importing it
+    try:
+        from importlib import metadata as importlib_metadata
+    except ImportError:  # python < 3.8
+        return _has_distribution_info(name)
+    try:
+        importlib_metadata.distribution(name)
+    except importlib_metadata.PackageNotFoundError:
+        return False
+    return True
+
+
+def package_is_installed(name, conda_prefix=None):
+    """
+    Is a package installed, by conda (into `conda_prefix`) or for the active
+    python?
+
+    :param name: The name of a package.
+    :param conda_prefix: The path to a conda environment, or None.
+    :return: bool
+    """
+    if conda_prefix is not None:
+        if normalise_package_name(name) in read_conda_packages(conda_prefix):
+            return True
+    return python_package_is_installed(name)
+
+
+def _get_mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_fingerprint(conda_prefix, environ=None):
+    """
+    The properties of an environment that must be unchanged for the cached
+    results of probing that environment to be reused.
+
+    :param conda_prefix: The path to a conda environment.
+    :param environ: A dictionary of environment variables; defaults to
+    `os.environ`.
+    :return: A dictionary.
+    """
+    if environ is None:
+        environ = os.environ
+    site_packages = sysconfig.get_paths()["purelib"]
+    return {
+        "conda_prefix": conda_prefix,
+        "conda_meta_mtime_ns": _get_mtime_ns(os.path.join(conda_prefix, "conda-meta")),
+        "python": sys.executable,
+        "site_packages_mtime_ns": _get_mtime_ns(site_packages),
+        "path": environ.get("PATH", os.defpath),
+    }
+
+
+class EnvProbe:
+    """
+    `EnvProbe` finds executables and installed packages in a conda
+    environment, caching the results in a JSON file that maps the path of
+    each environment to its fingerprint and results.
+    """
+
+    def __init__(self, conda_prefix=None, cache_file=None, environ=None):
+        """
+        :param conda_prefix: The path to a conda environment; defaults to
+        `$CONDA_PREFIX`. If there is no conda environment, nothing is cached.
+        :param cache_file: The path to the cache file, or None (for no cache).
+        :param environ: A dictionary of environment variables; defaults to
+        `os.environ`.
+        """
+        if environ is None:
+            environ = os.environ
+        if conda_prefix is None:
+            conda_prefix = environ.get("CONDA_PREFIX")
+        self.conda_prefix = conda_prefix
+        self.cache_file = cache_file if conda_prefix is not None else None
+        self.environ = environ
+        self.n_probes = 0
+        self._is_modified = False
+        self._entry = {"executables": {}, "packages": {}}
+        if self.cache_file is not None:
+            self._entry["fingerprint"] = get_fingerprint(conda_prefix, environ)
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_file, "r") as file_handle:
+                entry = json.load(file_handle).get(self.conda_prefix)
+        except (OSError, ValueError, AttributeError):
+            return
+        if (
+            isinstance(entry, dict)
+            and entry.get("fingerprint") == self._entry["fingerprint"]
+        ):
+            self._entry["executables"].update(entry.get("executables", {}))
+            self._entry["packages"].update(entry.get("packages", {}))
+
+    def save(self):
+        """
+        Write the results for this environment to the cache file (if they have
+        changed); the results for other environments are kept.
+        """
+        if self.cache_file is None or not self._is_modified:
+            return
+        try:
+            with open(self.cache_file, "r") as file_handle:
+                entries = json.load(file_handle)
+            if not isinstance(entries, dict):
+                entries = {}
+        except (OSError, ValueError):
+            entries = {}
+        entries[self.conda_prefix] = self._entry
+
+        cache_dir = os.path.dirname(os.path.abspath(self.cache_file))
+        os.makedirs(cache_dir, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".partial")
+        try:
+            with os.fdopen(handle, "w") as file_handle:
+                json.dump(entries, file_handle, indent=2, sort_keys=True)
+            os.replace(temp_path, self.cache_file)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self._is_modified = False
+
+    def _lookup(self, kind, name, probe):
+        results = self._entry[kind]
+        if name not in results:
+            self.n_probes += 1
+            results[name] = probe()
+            self._is_modified = True
+        return results[name]
+
+    def which(self, name):
+        """
+        The path to the executable `name`, or None (see `find_executable`)
+        """
+        return self._lookup(
+            "executables", name, lambda: find_executable(name, self.environ)
+        )
+
+    def has_package(self, name):
+        """
+        Is the package `name` installed? (see `package_is_installed`)
+        """
+        return self._lookup(
+            "packages",
+            normalise_package_name(name),
+            lambda: package_is_installed(name, self.conda_prefix),
+        )
+
+
+def run_workflow(packages=(), executables=(), cache_file=None):
+    """
+    Report whether each package is installed, and the path to each executable,
+    in the active environment.
+
+    :return: bool: Are all of the packages and executables present?
+    """
+    probe = EnvProbe(cache_file=cache_file)
+    is_complete = True
+    for name in packages:
+        is_installed = probe.has_package(name)
+        is_complete = is_complete and is_installed
+        print(
+            "package\t{}\t{}".format(
+                name, "installed" if is_installed else "not installed"
+            )
+        )
+    for name in executables:
+        path = probe.which(name)
+        is_complete = is_complete and path is not None
+        print("executable\t{}\t{}".format(name, path or "not found"))
+    probe.save()
+    return is_complete
+
+
+def define_command_arg_parser():
+    """
+    Get a parser that extracts the command args used when calling this program
+    """
+    parser = argparse.ArgumentParser(
+        description="Exits with status 1 if any of the packages / executables"
+        " are missing from the active environment"
+    )
+    parser.add_argument(
+        "--package", action="append", default=[], help="a package to look for"
+    )
+    parser.add_argument(
+        "--executable", action="append", default=[], help="an executable to look for"
+    )
+    parser.add_argument(
+        "--cache-file",
+        default=get_default_probe_cache(),
+        help="file for caching the results (default: $BUDDY_ENV_CACHE or"
+        " ~/.cache/buddy/env_probe.json)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="cache_file",
+        action="store_const",
+        const=None,
+        help="probe the environment without using the cache",
+    )
+    return parser
+
+
+# ---- run as a script
+
+if __name__ == "__main__":
+    ARGS = define_command_arg_parser().parse_args()
+    sys.exit(0 if run_workflow(ARGS.package, ARGS.executable, ARGS.cache_file) else 1)
@@ -0,0 +1,283 @@
+"""
+Functions for copying files and directories into a project, without storing
+a separate byte-for-byte copy of the same file in every project.
+
+Each copy is made using the cheapest method that the filesystem allows:
+
+- a hardlink to a file in a `ContentStore`, if this is requested; the store
+  is a directory of files that are keyed by the digest of their contents (so
+  each distinct file is stored once per machine), and stored files are made
+  read-only, so a hardlinked copy can't be modified by mistake. Files are only
+  added to the store when a hardlink to it can be made, since a store that
+  isn't shared by hardlinks would just hold another copy of each file;
+- a reflink (`FICLONE`), which shares the data blocks of the original file
+  until either file is modified (btrfs, XFS, ...);
+- an in-kernel copy (`copy_file_range`, or `sendfile`), so the data isn't
+  copied through user-space;
+- otherwise, an ordinary copy.
+
+An existing file is never overwritten by a copy.
+"""
+
+import errno
+import os
+import os.path
+import shutil
+import stat
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from buddy.hashing import hash_raw_file
+
+DEFAULT_CONTENT_STORE = os.path.join("~", ".cache", "buddy", "store")
+
+COPY_EXCLUSIONS = (".git", ".gitignore")
+
+# ioctl request code for cloning a file (linux/fs.h)
+FICLONE = 0x40049409
+
+# Errors that mean a copy method isn't supported for a pair of files; the
+# next method is tried instead
+_UNSUPPORTED_ERRNOS = {
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.EOPNOTSUPP,
+    errno.ENOTTY,
+    errno.EPERM,
+    errno.EMLINK,
+    errno.EBADF,
+}
+
+
+def get_default_content_store():
+    """
+    The directory that holds the content-addressed store; this is
+    `$BUDDY_CONTENT_STORE` if that is set, otherwise `~/.cache/buddy/store`.
+    """
+    return os.path.expanduser(
+        os.environ.get("BUDDY_CONTENT_STORE", DEFAULT_CONTENT_STORE)
+    )
+
+
+def _is_unsupported(error):
+    return error.errno in _UNSUPPORTED_ERRNOS
+
+
+def _reflink(source_handle, destination_handle, size):
+    fcntl.ioctl(destination_handle.fileno(), FICLONE, source_handle.fileno())
+
+
+def _copy_file_range(source_handle, destination_handle, size):
+    copied = 0
+    while copied < size:
+        n_bytes = os.copy_file_range(
+            source_handle.fileno(),
+            destination_handle.fileno(),
+            size - copied,
+            copied,
+            copied,
+        )
+        if n_bytes == 0:
+            break
+        copied += n_bytes
+
+
+def _sendfile(source_handle, destination_handle, size):
+    copied = 0
+    while copied < size:
+        n_bytes = os.sendfile(
+            destination_handle.fileno(), source_handle.fileno(), copied, size - copied
+        )
+        if n_bytes == 0:
+            break
+        copied += n_bytes
+
+
+def _get_copy_methods():
+    # The available methods for copying the contents of one open file to
+    # another, cheapest first
+    methods = []
+    if fcntl is not None:
+        methods.append(("reflink", _reflink))
+    if hasattr(os, "copy_file_range"):
+        methods.append(("copy_file_range", _copy_file_range))
+    if hasattr(os, "sendfile"):
+        methods.append(("sendfile", _sendfile))
+    return methods
+
+
+def copy_contents(source, destination):
+    """
+    Copy the contents of a file to a new file, using the cheapest method that
+    works for the pair of files.
+
+    :param source: The path to an existing file.
+    :param destination: The path for the new file; a FileExistsError is
+    raised if anything exists at this path.
+    :return: The name of the copy method that was used ("reflink",
+    "copy_file_range", "sendfile" or "copy").
+    """
+    with open(source, "rb") as source_handle, open(
+        destination, "xb"
+    ) as destination_handle:
+        try:
+            size = os.fstat(source_handle.fileno()).st_size
+            for name, method in _get_copy_methods():
+                try:
+                    method(source_handle, destination_handle, size)
+                except OSError as error:
+                    # a method can only be abandoned before it has copied
+                    # anything
+                    if (
+                        not _is_unsupported(error)
+                        or os.fstat(destination_handle.fileno()).st_size
+                    ):
+                        raise
+                    continue
+                return name
+            shutil.copyfileobj(source_handle, destination_handle)
+            return "copy"
+        except BaseException:
+            destination_handle.close()
+            os.remove(destination)
+            raise
+
+
+class ContentStore:
+    """
+    `ContentStore` is a directory of read-only files, each named by the digest
+    of its contents.
+    """
+
+    def __init__(self, store_dir, algorithm="sha256"):
+        self.store_dir = store_dir
+        self.algorithm = algorithm
+
+    def can_link_to(self, directory):
+        """
+        Can a file in `directory` be hardlinked to the stored files? That is,
+        are the store and the directory on the same filesystem?
+        """
+        os.makedirs(self.store_dir, exist_ok=True)
+        return os.stat(self.store_dir).st_dev == os.stat(directory).st_dev
+
+    def object_path(self, digest):
+        """
+        The path for the stored file with a given digest
+        """
+        return os.path.join(self.store_dir, self.algorithm, digest[:2], digest[2:])
+
+    def add(self, filepath):
+        """
+        Add a file to the store, if a file with the same contents isn't already
+        stored.
+
+        :return: The path to the stored file.
+        """
+        object_path = self.object_path(hash_raw_file(filepath, self.algorithm))
+        if os.path.exists(object_path):
+            return object_path
+
+        object_dir = os.path.dirname(object_path)
+        os.makedirs(object_dir, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=object_dir, suffix=".partial")
+        os.close(handle)
+        os.remove(temp_path)
+        try:
+            copy_contents(filepath, temp_path)
+            # the file may have changed since it was hashed, so the stored
+            # copy is hashed again
+            object_path = self.object_path(hash_raw_file(temp_path, self.algorithm))
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.chmod(temp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(temp_path, object_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return object_path
+
+
+def copy_file(source, destination, store=None, hardlink=False, preserve_times=False):
+    """
+    Copy a file, never overwriting an existing file.
+
+    :param source: The path to an existing file.
+    :param destination: The path for the copy; a FileExistsError is raised if
+    anything exists at this path.
+    :param store: A `ContentStore`, or None.
+    :param hardlink: Should the copy be a hardlink to a file in the `store`
+    (where the filesystem allows)? If so, the source is added to the store,
+    and the hardlinked copy is read-only. Otherwise, the source is copied
+    directly.
+    :param preserve_times: Should the access / modification times of the
+    source be copied (as well as its permissions)?
+    :return: The name of the method that was used to make the copy.
+    """
+    if os.path.lexists(destination):
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), destination)
+
+    if (
+        hardlink
+        and store is not None
+        and store.can_link_to(os.path.dirname(os.path.abspath(destination)))
+    ):
+        try:
+            os.link(store.add(source), destination)
+            return "hardlink"
+        except OSError as error:
+            if not _is_unsupported(error):
+                raise
+
+    method = copy_contents(source, destination)
+    if preserve_times:
+        shutil.copystat(source, destination)
+    else:
+        shutil.copymode(source, destination)
+    return method
+
+
+def copy_tree(original, copy, store=None, hardlink=False):
+    """
+    Copy a directory, as for `rsync -a`: `.git` and `.gitignore` are not
+    copied, symlinks are copied as symlinks, and permissions and times are
+    preserved (except for hardlinked files).
+
+    If `original` ends with a path separator, its contents are copied into
+    `copy`; otherwise it is copied to `copy/<basename of original>`. Existing
+    files are never overwritten.
+
+    :param store: A `ContentStore` for hardlinked copies, or None.
+    :param hardlink: Should copies be hardlinks to files in the store?
+    :return: A dictionary giving the number of files that were copied with
+    each method.
+    """
+    if not original.endswith(os.sep):
+        copy = os.path.join(copy, os.path.basename(original))
+    n_files = {}
+    _copy_tree(original, copy, store, hardlink, n_files)
+    return n_files
+
+
+def _copy_tree(original, copy, store, hardlink, n_files):
+    os.makedirs(copy, exist_ok=True)
+    with os.scandir(original) as entries:
+        entries = sorted(entries, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.name in COPY_EXCLUSIONS:
+            continue
+        destination = os.path.join(copy, entry.name)
+        if entry.is_symlink():
+            os.symlink(os.readlink(entry.path), destination)
+        elif entry.is_dir():
+            _copy_tree(entry.path, destination, store, hardlink, n_files)
+        else:
+            method = copy_file(
+                entry.path, destination, store, hardlink, preserve_times=True
+            )
+            n_files[method] = n_files.get(method, 0) + 1
+    shutil.copystat(original, copy)
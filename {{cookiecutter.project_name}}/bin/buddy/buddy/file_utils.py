@@ -1,18 +1,259 @@
 """
 Simple file manipulation functions
 
-- `yaml` files must be read using `yaml.safe_load` for security purposes
+- `yaml` files must be read using the safe loaders, for security purposes;
+  libyaml's `CSafeLoader` is used when it is available, since it is many
+  times faster than the pure-python `SafeLoader`
+- `yaml` is only imported when a yaml file is read, since importing it is
+  slow relative to the start-up of a short-lived command
+- The parsed contents of yaml files can be cached (see `read_yaml`), so that
+  large files are only parsed again when they change
 """
 
-import yaml
+import marshal
+import os
+import os.path
+import zlib
 
+from buddy.hash_cache import get_stat_signature
 
-def read_yaml(yaml_file):
+EXCLUDED_DIRS = {".git"}
+
+# Change this whenever the format of the parsed-yaml cache files changes
+YAML_CACHE_VERSION = 1
+
+
+def walk_files(directory):
+    """
+    Yield the path to every file below a directory, in sorted order; symlinks
+    to directories are not followed, and `.git` directories are skipped.
+
+    :param directory: A path to a directory.
+    """
+    with os.scandir(directory) as entries:
+        entries = sorted(entries, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name not in EXCLUDED_DIRS:
+                yield from walk_files(entry.path)
+        elif entry.is_file():
+            yield entry.path
+
+
+def read_lines(filepath):
+    """
+    Reads the entries from a text file that has one entry per line; blank
+    lines and lines that start with `#` are dropped, and whitespace is
+    stripped from each entry.
+
+    :return: A list of strings.
+    """
+    with open(filepath, "r") as file_handle:
+        lines = [line.strip() for line in file_handle]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def read_path_pairs(filepath):
+    """
+    Reads pairs of paths from a text file that has a whitespace-separated pair
+    on each line (eg, "target link" or "original copy"); blank lines and
+    comment lines are dropped and a leading `~` in any path is expanded to the
+    user's home directory.
+
+    Raises a ValueError that reports every line that doesn't contain exactly
+    two paths.
+
+    :return: A list of (first_path, second_path) tuples.
+    """
+    pairs = []
+    bad_lines = []
+    with open(filepath, "r") as file_handle:
+        for line_number, line in enumerate(file_handle, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split()
+            if len(fields) != 2:
+                bad_lines.append("{}: '{}'".format(line_number, line))
+                continue
+            pairs.append(tuple(os.path.expanduser(field) for field in fields))
+    if bad_lines:
+        raise ValueError(
+            "Couldn't parse a pair of paths from lines in '{}' "
+            "(make sure there are no spaces in the filenames):\n{}".format(
+                filepath, "\n".join(bad_lines)
+            )
+        )
+    return pairs
+
+
+def get_yaml_cache_dir():
+    """
+    The directory for caching the parsed contents of yaml files; this is
+    `$BUDDY_YAML_CACHE` if that is set, otherwise None (no caching).
+    """
+    cache_dir = os.environ.get("BUDDY_YAML_CACHE")
+    return os.path.expanduser(cache_dir) if cache_dir else None
+
+
+def _get_yaml_cache_path(cache_dir, yaml_file):
+    # One cache file per yaml file; the path of the yaml file is stored in the
+    # cache file, so a clash between the checksums is harmless
+    return os.path.join(
+        cache_dir,
+        "{}.{:08x}.marshal".format(
+            os.path.basename(yaml_file), zlib.crc32(yaml_file.encode("utf-8"))
+        ),
+    )
+
+
+def _read_cached_yaml(cache_path, yaml_file, signature):
+    try:
+        # `marshal.loads` on the whole file is much faster than `marshal.load`
+        # on a file object
+        with open(cache_path, "rb") as file_handle:
+            data = file_handle.read()
+        version, path, cached_signature, contents = marshal.loads(data)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if (version, path, tuple(cached_signature)) != (
+        YAML_CACHE_VERSION,
+        yaml_file,
+        signature,
+    ):
+        return None
+    return (contents,)
+
+
+def _write_cached_yaml(cache_path, yaml_file, signature, contents):
+    try:
+        data = marshal.dumps((YAML_CACHE_VERSION, yaml_file, signature, contents))
+    except ValueError:
+        # eg, the yaml file contains dates, which can't be marshalled
+        return
+    # `tempfile` is slow to import, and is only needed to write the cache
+    import tempfile
+
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".partial")
+    try:
+        with os.fdopen(handle, "wb") as file_handle:
+            file_handle.write(data)
+        os.replace(temp_path, cache_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _parse_yaml(yaml_file):
+    import yaml
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(yaml_file, "r") as file_handle:
+        return yaml.load(file_handle, Loader=loader)
+
+
+def read_yaml(yaml_file, cache_dir=None):
     """
     Reads all data stored in a yaml file; returns a dictionary storing the
     key-value pairs within the file
+
+    If a cache directory is given (or `$BUDDY_YAML_CACHE` is set), the parsed
+    contents of the file are stored there (using `marshal`, which, unlike
+    `pickle`, can't run code when it is loaded) and are reused until the size,
+    modification time or inode of the file changes.
+
+    :param yaml_file: A file path.
+    :param cache_dir: A directory for caching the parsed contents of yaml
+    files; defaults to `get_yaml_cache_dir()`.
     """
-    yaml_dict = yaml.safe_load(open(yaml_file, "r"))
+    if cache_dir is None:
+        cache_dir = get_yaml_cache_dir()
+
+    if cache_dir is None:
+        yaml_dict = _parse_yaml(yaml_file)
+    else:
+        yaml_file = os.path.abspath(yaml_file)
+        cache_path = _get_yaml_cache_path(cache_dir, yaml_file)
+        # The file is stat-ed before parsing, so that any change made to the
+        # file while it is being parsed invalidates the cached contents
+        signature = get_stat_signature(os.stat(yaml_file))
+        cached = _read_cached_yaml(cache_path, yaml_file, signature)
+        if cached is not None:
+            yaml_dict = cached[0]
+        else:
+            yaml_dict = _parse_yaml(yaml_file)
+            _write_cached_yaml(cache_path, yaml_file, signature, yaml_dict)
+
     if yaml_dict is None:
         return {}
     return yaml_dict
+
+
+def _make_streaming_loader_class(yaml):
+    # A loader whose `compose_node` can be used to build the nodes for one
+    # part of a document at a time; the events are read by libyaml, if it is
+    # available
+    try:
+        from yaml.cyaml import CParser
+    except ImportError:
+        return yaml.SafeLoader
+
+    class StreamingLoader(
+        CParser,
+        yaml.composer.Composer,
+        yaml.constructor.SafeConstructor,
+        yaml.resolver.Resolver,
+    ):
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            yaml.composer.Composer.__init__(self)
+            yaml.constructor.SafeConstructor.__init__(self)
+            yaml.resolver.Resolver.__init__(self)
+
+    return StreamingLoader
+
+
+def iter_yaml_mapping(yaml_file):
+    """
+    Reads the entries of a yaml file that holds a single mapping, one entry at
+    a time; so only one entry is held in memory, rather than the whole of the
+    parsed file (as for `read_yaml`).
+
+    Anchors may be used across entries. The entries are yielded in the order
+    of the file (a repeated key is yielded more than once).
+
+    :param yaml_file: A file path.
+    :return: A generator over (key, value) tuples.
+    """
+    import yaml
+
+    with open(yaml_file, "r") as file_handle:
+        loader = _make_streaming_loader_class(yaml)(file_handle)
+        try:
+            loader.get_event()
+            if loader.check_event(yaml.StreamEndEvent):
+                # an empty file
+                return
+            loader.get_event()
+            if not loader.check_event(yaml.MappingStartEvent):
+                root = loader.construct_object(loader.compose_node(None, None))
+                if root is None:
+                    # a document without any contents
+                    return
+                raise ValueError(
+                    "The yaml file '{}' should contain a mapping".format(yaml_file)
+                )
+            loader.get_event()
+            while not loader.check_event(yaml.MappingEndEvent):
+                key_node = loader.compose_node(None, None)
+                value_node = loader.compose_node(None, None)
+                key = loader.construct_object(key_node, deep=True)
+                value = loader.construct_object(value_node, deep=True)
+                # the constructed objects would otherwise be kept for every
+                # entry
+                loader.constructed_objects = {}
+                yield key, value
+        finally:
+            loader.dispose()
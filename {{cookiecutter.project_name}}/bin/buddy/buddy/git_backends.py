@@ -0,0 +1,181 @@
+"""
+Backends that carry out git operations for `ExternalRepository` /
+`LocalRepository`.
+
+- `GitCliBackend` runs the `git` command-line program (through `sh`) for
+  every operation.
+- `GitDulwichBackend` resolves commits and checks them out in-process, using
+  the `dulwich` package, so these don't pay the cost of spawning a `git`
+  process; operations that need the network (clone / fetch) still use the
+  `git` program.
+
+`sh` and `dulwich` are only imported when a backend first needs them.
+"""
+
+import os
+
+BACKEND_NAMES = ("cli", "dulwich", "auto")
+
+# dulwich is opt-in
+DEFAULT_BACKEND = "cli"
+
+
+class GitError(Exception):
+    """
+    A git operation that was ran in-process failed
+    """
+
+
+class GitCliBackend:
+    """
+    `GitCliBackend` runs each git operation in a `git` subprocess.
+    """
+
+    name = "cli"
+
+    @property
+    def errors(self):
+        """
+        The exception types that are raised by failing git operations
+        """
+        import sh
+
+        return (sh.ErrorReturnCode,)
+
+    @staticmethod
+    def git(*args):
+        """
+        Run `git` with the given arguments.
+
+        :return: The standard output from git, as a string.
+        """
+        import sh
+
+        return str(sh.git(*args))
+
+    @staticmethod
+    def remove_tree(path):
+        import sh
+
+        sh.rm("-rf", path)
+
+    def clone(self, url, path, *options):
+        """
+        Clone the repository at `url` into `path`; `options` are passed to
+        `git clone`.
+        """
+        self.git("clone", *options, url, path)
+
+    def checkout(self, path, commit):
+        """
+        Checkout a commit in the repository at `path`.
+        """
+        self.git("-C", path, "checkout", commit)
+
+    def resolve_commit(self, path, revision):
+        """
+        Find the full sha1 code for a revision (eg, an abbreviated sha1 code,
+        a branch or a tag) in the repository at `path`.
+
+        :return: The sha1 code (a string), or None if the revision doesn't
+        identify a commit in the repository.
+        """
+        try:
+            sha1 = self.git(
+                "-C", path, "rev-parse", "--verify", "--quiet", revision + "^{commit}"
+            )
+        except self.errors:
+            return None
+        return sha1.strip()
+
+    def head_sha1(self, path):
+        """
+        The sha1 code for the commit that is checked out in the repository at
+        `path`, or None if that can't be determined.
+        """
+        return self.resolve_commit(path, "HEAD")
+
+
+class GitDulwichBackend(GitCliBackend):
+    """
+    `GitDulwichBackend` resolves commits and checks them out in-process,
+    using `dulwich`. Cloning and fetching are left to the `git` program.
+    """
+
+    name = "dulwich"
+
+    def __init__(self):
+        # raises ImportError if dulwich is not installed
+        from dulwich import objectspec, porcelain
+        from dulwich.repo import Repo
+
+        self._objectspec = objectspec
+        self._porcelain = porcelain
+        self._repo_class = Repo
+
+    @property
+    def errors(self):
+        return super().errors + (GitError,)
+
+    def _open(self, path):
+        try:
+            return self._repo_class(path)
+        except Exception as exception:
+            raise GitError("Not a git repository: '{}'".format(path)) from exception
+
+    def checkout(self, path, commit):
+        if not hasattr(self._porcelain, "checkout"):
+            # older versions of dulwich have no checkout
+            return super().checkout(path, commit)
+        repo = self._open(path)
+        try:
+            target = self._objectspec.parse_commit(repo, commit)
+            self._porcelain.checkout(repo, target.id)
+        except Exception as exception:
+            raise GitError(
+                "Could not checkout '{}' in '{}': {}".format(commit, path, exception)
+            ) from exception
+        finally:
+            repo.close()
+
+    def resolve_commit(self, path, revision):
+        try:
+            repo = self._open(path)
+        except GitError:
+            return None
+        try:
+            if revision == "HEAD":
+                return repo.head().decode("ascii")
+            return self._objectspec.parse_commit(repo, revision).id.decode("ascii")
+        except (KeyError, ValueError):
+            return None
+        finally:
+            repo.close()
+
+
+def get_backend(name=None):
+    """
+    Make a git backend.
+
+    :param name: "cli", "dulwich" or "auto" (dulwich if it is installed,
+    otherwise the git program). If None, this is taken from the
+    `BUDDY_GIT_BACKEND` environment variable, and defaults to
+    `DEFAULT_BACKEND` ("cli").
+    :return: A backend object.
+    """
+    if name is None:
+        name = os.environ.get("BUDDY_GIT_BACKEND", DEFAULT_BACKEND)
+    if name not in BACKEND_NAMES:
+        raise ValueError(
+            "Unknown git backend '{}'; use one of: {}".format(
+                name, ", ".join(BACKEND_NAMES)
+            )
+        )
+    if name == "cli":
+        return GitCliBackend()
+    try:
+        return GitDulwichBackend()
+    except ImportError:
+        if name == "dulwich":
+            raise
+        return GitCliBackend()
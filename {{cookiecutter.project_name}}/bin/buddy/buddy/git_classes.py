@@ -3,10 +3,214 @@ Classes for holding details about any git repositories that should be cloned /
 copied into a given file-path.
 """
 
+import hashlib
 import os
-import sys
+import re
 
-import sh
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from buddy.git_backends import GitCliBackend
+
+DEFAULT_MIRROR_CACHE = os.path.join("~", ".cache", "buddy", "git")
+
+FULL_SHA1_PATTERN = re.compile(r"^[0-9a-fA-F]{40}$")
+SHA1_PREFIX_PATTERN = re.compile(r"^[0-9a-fA-F]{7,40}$")
+
+
+def normalise_url(url):
+    """
+    Local repositories are referred to (and fetched from) by their absolute
+    path; any other URL is unchanged.
+    """
+    if os.path.isdir(url):
+        return os.path.abspath(url)
+    return url
+
+
+class _Filesystem:
+    # Reads the files of a `.git` directory directly; a
+    # `setup_plan.FilesystemSnapshot` can be used in its place, so that each
+    # file is only read once
+
+    @staticmethod
+    def isdir(path):
+        return os.path.isdir(path)
+
+    @staticmethod
+    def read_text(path):
+        try:
+            with open(path, "r") as file_handle:
+                return file_handle.read()
+        except OSError:
+            return None
+
+
+def find_git_dir(repo_path, filesystem=None):
+    """
+    The path to the `.git` directory of a repository; this follows the
+    `gitdir: ...` file that worktrees and submodules use in place of a `.git`
+    directory.
+
+    :param filesystem: An object whose `isdir` and `read_text` methods the
+    filesystem is read through (eg, a `setup_plan.FilesystemSnapshot`); by
+    default, files are read directly.
+    :return: A path, or None if `repo_path` is not a git repository.
+    """
+    if filesystem is None:
+        filesystem = _Filesystem
+    dot_git = os.path.join(repo_path, ".git")
+    if filesystem.isdir(dot_git):
+        return dot_git
+    contents = filesystem.read_text(dot_git)
+    if contents is None:
+        return None
+    contents = contents.strip()
+    if not contents.startswith("gitdir:"):
+        return None
+    return os.path.join(repo_path, contents[len("gitdir:") :].strip())
+
+
+def _read_ref(git_dirs, ref, filesystem):
+    # Find the sha1 for a ref, in the loose refs then the packed refs of each
+    # of the git directories
+    for git_dir in git_dirs:
+        contents = filesystem.read_text(os.path.join(git_dir, *ref.split("/")))
+        if contents is not None:
+            return contents.strip()
+        packed_refs = filesystem.read_text(os.path.join(git_dir, "packed-refs"))
+        for line in (packed_refs or "").splitlines():
+            fields = line.split()
+            if len(fields) == 2 and fields[1] == ref:
+                return fields[0]
+    return None
+
+
+def read_head_sha1(repo_path, filesystem=None):
+    """
+    Find the sha1 code of the commit that is checked out in a repository, by
+    reading the files in its `.git` directory (git itself is not called).
+
+    :param filesystem: The object that files are read through (see
+    `find_git_dir`).
+    :return: The sha1 code (a string), or None if it can't be determined.
+    """
+    if filesystem is None:
+        filesystem = _Filesystem
+    git_dir = find_git_dir(repo_path, filesystem)
+    if git_dir is None:
+        return None
+    head = filesystem.read_text(os.path.join(git_dir, "HEAD"))
+    if head is None:
+        return None
+    head = head.strip()
+
+    if head.startswith("ref:"):
+        git_dirs = [git_dir]
+        # the refs for a worktree are stored in the main repository
+        common_dir = filesystem.read_text(os.path.join(git_dir, "commondir"))
+        if common_dir is not None:
+            git_dirs.append(os.path.join(git_dir, common_dir.strip()))
+        head = _read_ref(git_dirs, head[len("ref:") :].strip(), filesystem)
+
+    if head is None or not FULL_SHA1_PATTERN.match(head):
+        return None
+    return head.lower()
+
+
+def get_default_mirror_cache():
+    """
+    The directory that holds the bare mirrors of cloned repositories; this is
+    `$BUDDY_GIT_CACHE` if that is set, otherwise `~/.cache/buddy/git`.
+    """
+    return os.path.expanduser(os.environ.get("BUDDY_GIT_CACHE", DEFAULT_MIRROR_CACHE))
+
+
+class GitMirrorCache:
+    """
+    `GitMirrorCache` keeps a bare mirror of each external repository, keyed by
+    URL, so that the objects for a repository are stored (and downloaded)
+    once per machine, rather than once per clone.
+
+    Clones are made with a local `git clone` from the mirror, which
+    hard-links (or copies) the objects of the mirror rather than borrowing
+    them; so a clone doesn't depend on the mirror, and the cache can be
+    removed at any time.
+    """
+
+    def __init__(self, cache_dir, backend=None):
+        self.cache_dir = cache_dir
+        self.backend = GitCliBackend() if backend is None else backend
+
+    def mirror_path(self, url):
+        """
+        The path to the mirror for a given URL.
+        """
+        url = normalise_url(url)
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", os.path.basename(url.rstrip("/")))
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, "{}-{}".format(key, name or "repo"))
+
+    def update(self, url, commit=None):
+        """
+        Create, or fetch the latest commits into, the mirror for a given URL.
+
+        If `commit` is a sha1 code (or a prefix of one) that is already in the
+        mirror, nothing is fetched; a commit can't change, so there is no need
+        to contact the remote.
+
+        A lock is held while the mirror is updated (where `fcntl` is
+        available), so that several processes (or threads) can share the
+        cache. A new mirror is fetched into a
+        `.partial` directory that is renamed once the fetch completes; if the
+        fetch is interrupted, the objects fetched so far are kept and the next
+        update resumes from them.
+
+        :param url: The URL (or path) of the repository.
+        :param commit: The commit that is wanted from the mirror, or None.
+        :return: The path to the mirror.
+        """
+        path = self.mirror_path(url)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(path + ".lock", "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            git = self.backend.git
+            if os.path.isdir(path):
+                if not self.has_commit(path, commit):
+                    git("-C", path, "fetch", "--quiet", "origin")
+            else:
+                partial_path = path + ".partial"
+                if not os.path.isdir(partial_path):
+                    git("init", "--quiet", "--bare", partial_path)
+                    git(
+                        "-C",
+                        partial_path,
+                        "remote",
+                        "add",
+                        "--mirror=fetch",
+                        "origin",
+                        normalise_url(url),
+                    )
+                git("-C", partial_path, "fetch", "--quiet", "origin")
+                os.rename(partial_path, path)
+        return path
+
+    def has_commit(self, path, commit):
+        """
+        Is `commit` a sha1 code (or prefix) for a commit in the mirror at
+        `path`? Branches and tags can move, so they are never taken to be in
+        the mirror.
+        """
+        if commit is None or not SHA1_PREFIX_PATTERN.match(commit):
+            return False
+        try:
+            self.backend.git("-C", path, "cat-file", "-e", commit + "^{commit}")
+        except self.backend.errors:
+            return False
+        return True
 
 
 class LocalRepository:
@@ -15,13 +219,25 @@ class LocalRepository:
     be checked out
     """
 
-    def __init__(self, path, commit):
+    def __init__(self, path, commit, backend=None):
         self.path = path
         self.commit = commit
+        # The backend that carries out the git operations (see `git_backends`)
+        self.backend = GitCliBackend() if backend is None else backend
 
     def __eq__(self, other):
         return self.path == other.path and self.commit == other.commit
 
+    def sha1_matches(self):
+        """
+        Is the requested commit checked out in the repository?
+        """
+        wanted = self.backend.resolve_commit(self.path, self.commit)
+        return wanted is not None and wanted == self.backend.head_sha1(self.path)
+
+    def checkout(self):
+        self.backend.checkout(self.path, self.commit)
+
 
 class ExternalRepository:
     """
@@ -33,10 +249,24 @@ class ExternalRepository:
 
     # check that len(commit) >= 7
 
-    def __init__(self, input_path, commit, output_path):
+    def __init__(
+        self,
+        input_path,
+        commit,
+        output_path,
+        mirror_cache=None,
+        shallow=False,
+        backend=None,
+    ):
         self.input_path = input_path
         self.commit = commit
         self.output_path = output_path
+        # A `GitMirrorCache`; if None, the repository is cloned directly
+        self.mirror_cache = mirror_cache
+        # Fetch only the requested commit (if it is a full sha1 code)
+        self.shallow = shallow
+        # The backend that carries out the git operations (see `git_backends`)
+        self.backend = GitCliBackend() if backend is None else backend
 
     def __eq__(self, other):
         return (
@@ -51,49 +281,151 @@ class ExternalRepository:
         """
         return os.path.exists(self.output_path)
 
+    def is_satisfied(self, filesystem=None):
+        """
+        Is the requested commit already checked out in the local copy?
+
+        This only reads files in the `.git` directory of the local copy, so
+        it is fast and makes no git calls. The requested `commit` must be a
+        sha1 code (or a prefix of at least 7 characters); for any other
+        commit (eg, a tag) this returns False.
+
+        :param filesystem: The object that files are read through (see
+        `find_git_dir`).
+        """
+        if not SHA1_PREFIX_PATTERN.match(self.commit):
+            return False
+        head = read_head_sha1(self.output_path, filesystem)
+        return head is not None and head.startswith(self.commit.lower())
+
     def sha1_matches(self):
         """
         Is the sha1 code for the requested commit a valid sha1 code for the
-        requested repository?
+        requested repository, and is that commit checked out in the local
+        copy?
+        """
+        if not self.local_exists():
+            return False
+        return LocalRepository(
+            self.output_path, self.commit, self.backend
+        ).sha1_matches()
+
+    def staging_path(self):
+        """
+        The directory that the repository is fetched into before it is moved
+        to `output_path`. This is a hidden sibling of `output_path`, so that
+        it is on the same filesystem.
+        """
+        head, tail = os.path.split(os.path.normpath(self.output_path))
+        return os.path.join(head, ".{}.partial".format(tail))
+
+    def fetch_into(self, directory):
+        """
+        Fetch the external repository into a directory, resuming from any
+        objects that were fetched into that directory by a previous
+        (interrupted) attempt.
+
+        If `shallow` is set and `commit` is a full sha1 code, only that commit
+        is fetched (without history); if the remote refuses this, all the
+        branches (as `origin/<branch>`) and tags are fetched.
         """
-        pass
+        git = self.backend.git
+        url = normalise_url(self.input_path)
+        if find_git_dir(directory) is None:
+            git("init", "--quiet", directory)
+            git("-C", directory, "remote", "add", "origin", url)
+        else:
+            try:
+                git("-C", directory, "remote", "set-url", "origin", url)
+            except self.backend.errors:
+                git("-C", directory, "remote", "add", "origin", url)
+
+        if self.shallow and FULL_SHA1_PATTERN.match(self.commit):
+            try:
+                git(
+                    "-C",
+                    directory,
+                    "fetch",
+                    "--quiet",
+                    "--depth",
+                    "1",
+                    "origin",
+                    self.commit,
+                )
+                return
+            except self.backend.errors:
+                pass
+        git("-C", directory, "fetch", "--quiet", "--tags", "origin")
+
+    def _make_local_branch(self, directory):
+        # A fetch (or a clone) only makes a remote-tracking branch for each
+        # branch of the remote; so if `commit` names a branch, make (or move)
+        # the local branch of that name, for it to be resolved and checked out
+        remote_branch = "refs/remotes/origin/" + self.commit
+        if self.backend.resolve_commit(directory, remote_branch) is not None:
+            self.backend.git(
+                "-C",
+                directory,
+                "update-ref",
+                "refs/heads/" + self.commit,
+                remote_branch,
+            )
 
     def clone_into(self, directory):
         """
         Clone the external repository into the stated (possibly temporary)
-        directory.
-        """
-        # TODO:
-        # git clone from url to directory
-        #
-        # try:
-        #   sh.git.clone(self.url, directory)
-        # except sh.ErrorReturnCode as e:
-        #   print(e)
-        #   sys.exit(1)
-        #
-        pass
+        directory, and checkout the requested commit.
+
+        If there is a `mirror_cache`, the mirror of the repository is updated
+        and the clone is made from that mirror; the `origin` of the clone
+        still points at `input_path`. Otherwise, or if `shallow` is set
+        (a mirror holds the whole history), the repository is fetched from
+        `input_path` (see `fetch_into`). If `commit` is a branch name, a local
+        branch is made from `origin/<commit>`.
+
+        :raises ValueError: If the requested commit isn't in the repository;
+        the directory is kept, so that a later attempt need not re-fetch it.
+        """
+        if self.mirror_cache is None or self.shallow:
+            self.fetch_into(directory)
+        else:
+            mirror = self.mirror_cache.update(self.input_path, self.commit)
+            # cloning from the mirror is cheap, so is never resumed
+            if os.path.isdir(directory):
+                self.backend.remove_tree(directory)
+            self.backend.clone(mirror, directory, "--quiet")
+            self.backend.git(
+                "-C",
+                directory,
+                "remote",
+                "set-url",
+                "origin",
+                normalise_url(self.input_path),
+            )
+
+        self._make_local_branch(directory)
+        if self.backend.resolve_commit(directory, self.commit) is None:
+            raise ValueError(
+                "commit '{}' was not found in '{}'".format(self.commit, self.input_path)
+            )
+        self.backend.checkout(directory, self.commit)
 
     def clone(self):
         """
         Clone the requested repository into the directory `output_path` and
         ensure that the requested `commit` is checked out
+
+        The repository is cloned into a staging directory (see
+        `staging_path`); this is only moved to `output_path` once the
+        requested commit has been checked out, so an interrupted clone never
+        leaves a half-populated `output_path`. A partially-fetched staging
+        directory is reused by the next attempt.
         """
-        if not self.local_exists():
-            sh.git("clone", self.input_path, self.output_path)
-        # TODO:
-        # if output dir is occupied:
-        # - check that the sha-1 hash matches the wanted commit
-        #   and throw an exception if it doesn't
-        # otherwise:
-        # - try to clone from the URL to a temp directory
-        # - checkout the requested commit (throw exception if it
-        #   doesn't exist)
-        # - move from the temp directory to output
+        if self.local_exists():
+            return
+        staging_path = self.staging_path()
+        self.clone_into(staging_path)
+        os.rename(staging_path, self.output_path)
 
     def checkout(self):
-        try:
-            sh.git("-C", self.output_path, "checkout", self.commit)
-        except Exception:
-            raise
-            sys.exit(1)
+        self.backend.checkout(self.output_path, self.commit)
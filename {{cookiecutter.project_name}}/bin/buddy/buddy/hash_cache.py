@@ -0,0 +1,187 @@
+"""
+An on-disk cache of the digests for previously-hashed files.
+
+- A cached digest is only reused if the file's size, modification time and
+  inode are unchanged since the digest was computed, and the digest was
+  computed using the same algorithm and comment-character.
+- The cache is stored in an `sqlite` database, so it can be shared by the
+  threads / processes that validate files concurrently.
+"""
+
+import os
+import os.path
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT NOT NULL,
+    algorithm TEXT NOT NULL,
+    comment TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (path, algorithm, comment)
+)
+"""
+
+
+def get_stat_signature(file_stat):
+    """
+    The properties of a file that must be unchanged for a cached digest of
+    that file to be reused.
+
+    :param file_stat: An `os.stat_result`.
+    :return: A tuple (size, mtime_ns, inode).
+    """
+    return file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino
+
+
+class HashCache:
+    """
+    `HashCache` stores the digests of files, keyed on the file path, the
+    hashing algorithm and the comment-character used when hashing.
+    """
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def __eq__(self, other):
+        return self.cache_file == other.cache_file
+
+    def __getstate__(self):
+        # Database connections can't be pickled; each process that uses the
+        # cache opens its own connection
+        return {"cache_file": self.cache_file}
+
+    def __setstate__(self, state):
+        self.__init__(state["cache_file"])
+
+    def _connect(self):
+        if self._connection is None:
+            # `sqlite3` is imported on first use, so that commands that don't
+            # use the cache needn't import it
+            import sqlite3
+
+            cache_dir = os.path.dirname(self.cache_file)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            self._connection = sqlite3.connect(
+                self.cache_file, timeout=60, check_same_thread=False
+            )
+            with self._connection:
+                self._connection.execute(SCHEMA)
+        return self._connection
+
+    @staticmethod
+    def _make_key(filepath, algorithm, comment):
+        return os.path.abspath(filepath), algorithm, repr(comment)
+
+    def lookup(self, filepath, algorithm="md5", comment=None, file_stat=None):
+        """
+        Obtain the cached digest for a file.
+
+        :param filepath: A path to a file.
+        :param algorithm: The name of the hashing algorithm.
+        :param comment: The comment-character that was used when hashing.
+        :param file_stat: The `os.stat_result` for the file (this is obtained
+        if not provided).
+        :return: The cached digest, or None if there is no digest for the file
+        or the file has changed since the digest was stored.
+        """
+        if file_stat is None:
+            file_stat = os.stat(filepath)
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT size, mtime_ns, inode, digest FROM digests "
+                    "WHERE path = ? AND algorithm = ? AND comment = ?",
+                    self._make_key(filepath, algorithm, comment),
+                )
+                .fetchone()
+            )
+        if row is None or tuple(row[:3]) != get_stat_signature(file_stat):
+            return None
+        return row[3]
+
+    def store(self, filepath, digest, algorithm="md5", comment=None, file_stat=None):
+        """
+        Add the digest for a file to the cache, replacing any previous digest.
+
+        :param file_stat: The `os.stat_result` for the file, taken before the
+        digest was computed (this is obtained if not provided).
+        """
+        if file_stat is None:
+            file_stat = os.stat(filepath)
+        values = self._make_key(filepath, algorithm, comment) + (
+            get_stat_signature(file_stat) + (digest,)
+        )
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    values,
+                )
+
+    def get_digest(self, filepath, compute_digest, algorithm="md5", comment=None):
+        """
+        Obtain the digest for a file, from the cache if possible, otherwise by
+        calling `compute_digest()` and storing the result.
+
+        :param filepath: A path to a file.
+        :param compute_digest: A function of no arguments that returns the
+        digest for the file.
+        :param algorithm: The name of the hashing algorithm.
+        :param comment: The comment-character used when hashing.
+        :return: The digest for the file.
+        """
+        digest, _ = self.get_digest_and_status(
+            filepath, compute_digest, algorithm, comment
+        )
+        return digest
+
+    def get_digest_and_status(
+        self, filepath, compute_digest, algorithm="md5", comment=None
+    ):
+        """
+        As for `get_digest`, but also reports whether the digest was taken from
+        the cache.
+
+        :return: A tuple (digest, is_cache_hit).
+        """
+        # The file is stat-ed before hashing, so that any change made to the
+        # file while it is being hashed invalidates the stored digest
+        file_stat = os.stat(filepath)
+        digest = self.lookup(filepath, algorithm, comment, file_stat)
+        if digest is not None:
+            return digest, True
+        digest = compute_digest()
+        self.store(filepath, digest, algorithm, comment, file_stat)
+        return digest, False
+
+    def evict_missing(self):
+        """
+        Remove the entries for any files that no longer exist.
+
+        :return: The number of entries that were removed.
+        """
+        with self._lock:
+            connection = self._connect()
+            paths = [row[0] for row in connection.execute("SELECT path FROM digests")]
+            missing = [(path,) for path in set(paths) if not os.path.exists(path)]
+            with connection:
+                connection.executemany("DELETE FROM digests WHERE path = ?", missing)
+        return len(missing)
+
+    def close(self):
+        """
+        Close the connection to the cache database
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
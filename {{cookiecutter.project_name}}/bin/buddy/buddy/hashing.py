@@ -0,0 +1,464 @@
+"""
+Functions for computing the digest of the contents of a file.
+
+Files are read as raw bytes, in large buffers, and the digest is computed as
+follows:
+
+- If the file is valid UTF-8 text, it is hashed as if it had been opened in
+  text mode: line-endings are normalised to `\\n` and, if a comment-character
+  is provided, any line that starts with that comment-character is dropped.
+
+- Otherwise, the raw bytes of the file are hashed.
+
+This gives the same digests as hashing a text file line-by-line (or a binary
+file chunk-by-chunk), but every file is read exactly once and no per-line
+objects are created.
+
+Very large files can instead be memory-mapped (see `hash_file_mmap`), so that
+the hash functions are fed directly from the page cache.
+
+Any of the fixed-length `hashlib` algorithms can be used (md5, sha256,
+blake2b, ...), as can the xxHash algorithms if the `xxhash` package is
+installed.
+
+`hashlib` is imported when it is first used, rather than when this module is
+imported: loading its OpenSSL bindings dominates the start-up time of
+commands that don't hash anything (eg, `sidekick validate --quick`).
+"""
+
+import codecs
+import mmap
+import os
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+BUFFER_SIZE = 1 << 20
+MMAP_WINDOW_SIZE = 1 << 24
+# Buffers are decoded (to check that they are UTF-8), and have their
+# line-endings normalised, in slices of this many bytes; so the temporary
+# objects that this creates are small, whatever the size of the buffer
+TEXT_SLICE_SIZE = 1 << 16
+
+XXHASH_ALGORITHMS = ("xxh32", "xxh64", "xxh3_64", "xxh128")
+
+# The fixed-length algorithms in `hashlib.algorithms_guaranteed`; these are
+# listed here so that the name of an algorithm can be checked without
+# importing `hashlib`
+HASHLIB_ALGORITHMS = (
+    "blake2b",
+    "blake2s",
+    "md5",
+    "sha1",
+    "sha224",
+    "sha256",
+    "sha384",
+    "sha3_224",
+    "sha3_256",
+    "sha3_384",
+    "sha3_512",
+    "sha512",
+)
+
+
+def get_algorithms():
+    """
+    The names of the hashing algorithms that are available for hashing files.
+
+    The `shake_*` algorithms are excluded, since their digests don't have a
+    fixed length.
+    """
+    algorithms = set(HASHLIB_ALGORITHMS)
+    if xxhash is not None:
+        algorithms.update(
+            algorithm for algorithm in XXHASH_ALGORITHMS if hasattr(xxhash, algorithm)
+        )
+    return sorted(algorithms)
+
+
+def new_hash(algorithm):
+    """
+    Make a new hash object for a named algorithm.
+
+    :param algorithm: The name of a `hashlib` algorithm, or of an `xxhash`
+    algorithm (if that package is installed).
+    :return: A hash object, with `update`, `copy` and `hexdigest` methods.
+    """
+    if algorithm in XXHASH_ALGORITHMS:
+        if xxhash is None:
+            raise ValueError(
+                "The `xxhash` package is required for algorithm '{}'".format(algorithm)
+            )
+        return getattr(xxhash, algorithm)()
+    import hashlib
+
+    return hashlib.new(algorithm)
+
+
+# States for the (incomplete) line at the end of the most recent buffer, when
+# dropping comment lines
+_AT_LINE_START, _KEEP_LINE, _SKIP_LINE = range(3)
+
+
+class ContentDigest:
+    """
+    `ContentDigest` computes the digest for the contents of a file from a
+    sequence of buffers that hold consecutive sections of that file.
+    """
+
+    def __init__(self, algorithm="md5", comment=None):
+        self.algorithm = algorithm
+        self.comment = comment
+        # The number of bytes of the file that have been added
+        self.n_bytes = 0
+
+        self._raw_hash = new_hash(algorithm)
+        # The hash of the normalised text; this is None while the normalised
+        # text is identical to the raw bytes that have been seen so far
+        self._text_hash = None
+        self._is_text = True
+        self._undecoded = b""
+        self._pending_cr = False
+
+        self._comment_bytes = None if comment is None else comment.encode("utf-8")
+        self._line_state = _AT_LINE_START
+        self._line_prefix = b""
+
+    def update(self, buffer, start, end):
+        """
+        Add a section of the file to the digest.
+
+        :param buffer: A `bytes`, `bytearray` or `mmap` object.
+        :param start: The index of the first byte of the section in `buffer`.
+        :param end: The index after the last byte of the section in `buffer`.
+        """
+        view = memoryview(buffer)[start:end]
+        self.n_bytes += end - start
+        if self._is_text:
+            self._is_text = self._check_utf8(view)
+        if self._is_text:
+            segments, is_unchanged = self._normalise(buffer, start, end)
+            if not is_unchanged or self._text_hash is not None:
+                if self._text_hash is None:
+                    self._text_hash = self._raw_hash.copy()
+                for segment in segments:
+                    self._text_hash.update(segment)
+        self._raw_hash.update(view)
+
+    def hexdigest(self):
+        """
+        The digest for the contents of the file, once all of the file has
+        been added.
+        """
+        if self._is_text and self._undecoded:
+            # the file ends part-way through a multi-byte character
+            self._is_text = False
+        if not self._is_text:
+            return self._raw_hash.hexdigest()
+
+        text_hash = (
+            self._raw_hash.copy() if self._text_hash is None else self._text_hash
+        )
+        if self._pending_cr:
+            ending = b"\n"
+            if self._comment_bytes is not None:
+                segments, _ = self._drop_comments(ending, 0, len(ending))
+                ending = b"".join(segments)
+            text_hash.update(ending)
+        # A line that is shorter than the comment-character can't be a comment
+        text_hash.update(self._line_prefix)
+        return text_hash.hexdigest()
+
+    def _check_utf8(self, view):
+        # Is the file still valid utf-8 after adding this section?
+        try:
+            for position in range(0, len(view), TEXT_SLICE_SIZE):
+                self._decode_slice(view[position : position + TEXT_SLICE_SIZE])
+        except UnicodeDecodeError:
+            self._text_hash = None
+            return False
+        return True
+
+    def _decode_slice(self, view):
+        # Decode a slice of the file (that follows the bytes that were held
+        # back from the previous slice), holding back any incomplete
+        # character at its end; raises UnicodeDecodeError if it isn't utf-8
+        if self._undecoded:
+            head = self._undecoded + bytes(view[:4])
+            _, consumed = codecs.utf_8_decode(head, "strict", False)
+            if consumed == 0:
+                self._undecoded = head
+                return
+            view = view[consumed - len(self._undecoded) :]
+        _, consumed = codecs.utf_8_decode(view, "strict", False)
+        self._undecoded = bytes(view[consumed:])
+
+    def _normalise(self, buffer, start, end):
+        # Convert a section of the file into normalised text: returns an
+        # iterable of bytes-like segments, and whether those segments are
+        # identical to the raw bytes of the section
+        if self._pending_cr or buffer.find(b"\r", start, end) != -1:
+            return self._iter_normalised_slices(buffer, start, end), False
+
+        if self._comment_bytes is None:
+            return [memoryview(buffer)[start:end]], True
+
+        segments, is_filtered = self._drop_comments(buffer, start, end)
+        return segments, not is_filtered
+
+    def _iter_normalised_slices(self, buffer, start, end):
+        # Yield the segments of normalised text for a section of the file that
+        # has "\r" line-endings; this is done a slice at a time, so only one
+        # slice is copied at once
+        view = memoryview(buffer)
+        for position in range(start, end, TEXT_SLICE_SIZE):
+            text = bytes(view[position : min(position + TEXT_SLICE_SIZE, end)])
+            if self._pending_cr:
+                text = b"\r" + text
+            self._pending_cr = text.endswith(b"\r")
+            if self._pending_cr:
+                # The next slice may start with "\n"
+                text = text[:-1]
+            text = text.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+            if self._comment_bytes is None:
+                yield text
+            else:
+                segments, _ = self._drop_comments(text, 0, len(text))
+                yield from segments
+
+    def _drop_comments(self, buffer, start, end):
+        # Remove comment lines from a section of normalised text: returns a
+        # list of bytes-like segments, and whether any bytes were removed (or
+        # held back, until it is known whether they are part of a comment)
+        is_filtered = False
+        segments = []
+        position = start
+
+        # The start of a line, that was too short to tell whether it is a
+        # comment, is completed from the start of this section
+        if self._line_prefix:
+            is_filtered = True
+            n_needed = len(self._comment_bytes) - len(self._line_prefix)
+            head = bytes(memoryview(buffer)[start : min(start + n_needed, end)])
+            line_start = self._line_prefix + head
+            if line_start.startswith(self._comment_bytes):
+                self._line_state = _SKIP_LINE
+            elif len(head) < n_needed and self._comment_bytes.startswith(line_start):
+                self._line_prefix = line_start
+                return segments, is_filtered
+            else:
+                self._line_state = _KEEP_LINE
+                segments.append(self._line_prefix)
+            self._line_prefix = b""
+
+        view = memoryview(buffer)
+
+        # The remainder of a line that started in a previous section
+        if self._line_state != _AT_LINE_START:
+            newline = buffer.find(b"\n", position, end)
+            line_end = end if newline == -1 else newline + 1
+            if self._line_state == _KEEP_LINE:
+                segments.append(view[position:line_end])
+            else:
+                is_filtered = True
+            position = line_end
+            if newline == -1:
+                return segments, is_filtered
+            self._line_state = _AT_LINE_START
+
+        # Complete lines
+        last_newline = buffer.rfind(b"\n", position, end)
+        if last_newline != -1:
+            if self._drop_complete_lines(buffer, position, last_newline + 1, segments):
+                is_filtered = True
+            position = last_newline + 1
+
+        # The start of a line that continues into the next section
+        if position < end:
+            line_start = view[position:end]
+            n_comment = len(self._comment_bytes)
+            if len(line_start) >= n_comment:
+                if line_start[:n_comment] == self._comment_bytes:
+                    self._line_state = _SKIP_LINE
+                    is_filtered = True
+                else:
+                    self._line_state = _KEEP_LINE
+                    segments.append(line_start)
+            elif self._comment_bytes.startswith(line_start.tobytes()):
+                self._line_prefix = line_start.tobytes()
+                is_filtered = True
+            else:
+                self._line_state = _KEEP_LINE
+                segments.append(line_start)
+
+        return segments, is_filtered
+
+    def _drop_complete_lines(self, buffer, start, end, segments):
+        # Append any non-comment lines in buffer[start:end] (which starts at the
+        # start of a line and ends with a newline) to `segments`; returns
+        # whether any comment lines were found
+        view = memoryview(buffer)
+        comment = self._comment_bytes
+        n_comment = len(comment)
+        marker = b"\n" + comment
+        keep_from = position = start
+        is_filtered = False
+        while position < end:
+            if view[position : position + n_comment] == comment:
+                # drop this comment line
+                is_filtered = True
+                if keep_from < position:
+                    segments.append(view[keep_from:position])
+                position = buffer.find(b"\n", position, end) + 1
+                keep_from = position
+            else:
+                # jump to the start of the next comment line
+                position = buffer.find(marker, position, end)
+                if position == -1:
+                    break
+                position += 1
+        if keep_from < end:
+            segments.append(view[keep_from:end])
+        return is_filtered
+
+
+def hash_file(filepath, algorithm="md5", comment=None, buffer_size=BUFFER_SIZE):
+    """
+    Compute the digest for a file.
+
+    :param filepath: A path to a file, a string.
+    :param algorithm: The name of a hashing algorithm (see `get_algorithms`).
+    :param comment: The comment character for the file; all lines that start
+    with this character will be disregarded (if the file is UTF-8 text).
+    :param buffer_size: The number of bytes to read from the file at a time.
+
+    :return: The hex-digest for the file, as a string.
+    """
+    return _digest_buffered(filepath, algorithm, comment, buffer_size).hexdigest()
+
+
+def _digest_buffered(filepath, algorithm, comment, buffer_size=BUFFER_SIZE):
+    # Returns a `ContentDigest` that all of the file has been added to
+    digest = ContentDigest(algorithm, comment)
+    buffer = bytearray(buffer_size)
+    with open(filepath, "rb", buffering=0) as file_handle:
+        for n_bytes in iter(lambda: file_handle.readinto(buffer), 0):
+            digest.update(buffer, 0, n_bytes)
+    return digest
+
+
+def hash_file_mmap(
+    filepath, algorithm="md5", comment=None, window_size=MMAP_WINDOW_SIZE
+):
+    """
+    Compute the digest for a file, by memory-mapping the file.
+
+    This gives the same digest as `hash_file`, but the hash function reads
+    directly from (zero-copy) views of the mapped file, and comment lines are
+    found by searching the mapped file for newlines.
+
+    :param filepath: A path to a file, a string.
+    :param algorithm: The name of a hashing algorithm (see `get_algorithms`).
+    :param comment: The comment character for the file; all lines that start
+    with this character will be disregarded (if the file is UTF-8 text).
+    :param window_size: The number of bytes of the mapped file that are added
+    to the digest at a time.
+
+    :return: The hex-digest for the file, as a string.
+    """
+    return _digest_mapped(filepath, algorithm, comment, window_size).hexdigest()
+
+
+def _digest_mapped(filepath, algorithm, comment, window_size=MMAP_WINDOW_SIZE):
+    # Returns a `ContentDigest` that all of the (memory-mapped) file has been
+    # added to
+    digest = ContentDigest(algorithm, comment)
+    with open(filepath, "rb") as file_handle:
+        size = os.fstat(file_handle.fileno()).st_size
+        # Empty files can't be mapped
+        if size > 0:
+            with mmap.mmap(
+                file_handle.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mapped_file:
+                if hasattr(mapped_file, "madvise"):
+                    mapped_file.madvise(mmap.MADV_SEQUENTIAL)
+                for start in range(0, size, window_size):
+                    digest.update(mapped_file, start, min(start + window_size, size))
+    return digest
+
+
+def digest_file(filepath, algorithm="md5", comment=None, use_mmap=False):
+    """
+    Compute the digest for a file (as for `hash_file`, or `hash_file_mmap` if
+    `use_mmap` is set), and count the bytes that were read to compute it.
+
+    :return: A tuple (hexdigest, n_bytes).
+    """
+    if use_mmap:
+        digest = _digest_mapped(filepath, algorithm, comment)
+    else:
+        digest = _digest_buffered(filepath, algorithm, comment)
+    return digest.hexdigest(), digest.n_bytes
+
+
+def combine_leaf_digests(leaves, algorithm="md5"):
+    """
+    Compute the Merkle-style digest for a directory tree from the digests of
+    the files in that tree.
+
+    The digest is computed over the lines "<relative path>\\0<digest>\\n",
+    in sorted path order, so it doesn't depend on the order in which the
+    files were hashed.
+
+    :param leaves: A dictionary mapping the path of each file (relative to
+    the root of the tree, with "/" separators) to the digest of that file.
+    :param algorithm: The name of a hashing algorithm (see `get_algorithms`).
+    :return: The hex-digest for the tree, as a string.
+    """
+    tree_hash = new_hash(algorithm)
+    for relpath in sorted(leaves):
+        tree_hash.update(
+            "{}\0{}\n".format(relpath, leaves[relpath]).encode(
+                "utf-8", "surrogateescape"
+            )
+        )
+    return tree_hash.hexdigest()
+
+
+def count_lines(filepath, buffer_size=BUFFER_SIZE):
+    """
+    Count the lines in a file (as for `wc -l`, this is the number of newline
+    characters in the file).
+
+    :param filepath: A path to a file, a string.
+    :param buffer_size: The number of bytes to read from the file at a time.
+    :return: The number of lines in the file.
+    """
+    n_lines = 0
+    buffer = bytearray(buffer_size)
+    with open(filepath, "rb", buffering=0) as file_handle:
+        for n_bytes in iter(lambda: file_handle.readinto(buffer), 0):
+            n_lines += buffer.count(b"\n", 0, n_bytes)
+    return n_lines
+
+
+def hash_raw_file(filepath, algorithm="md5", buffer_size=BUFFER_SIZE):
+    """
+    Compute the digest of the raw bytes of a file. Unlike `hash_file`, text
+    files are not normalised, so two files have the same digest only if they
+    have identical contents.
+
+    :param filepath: A path to a file, a string.
+    :param algorithm: The name of a hashing algorithm (see `get_algorithms`).
+    :param buffer_size: The number of bytes to read from the file at a time.
+    :return: The hex-digest for the file, as a string.
+    """
+    raw_hash = new_hash(algorithm)
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(filepath, "rb", buffering=0) as file_handle:
+        for n_bytes in iter(lambda: file_handle.readinto(buffer), 0):
+            raw_hash.update(view[:n_bytes])
+    return raw_hash.hexdigest()
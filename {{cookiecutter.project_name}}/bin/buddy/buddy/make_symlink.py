@@ -1,5 +1,11 @@
 """
 Functions to make links from one file location (link) to another (target)
+
+A whole links-file can be processed in a single call (see `make_links`):
+
+- a text file with a `target link` pair on each line (blank lines and lines
+  that start with `#` are ignored); or
+- a yaml file (`.yaml` / `.yml`) that maps each link to its target.
 """
 
 import argparse
@@ -8,8 +14,10 @@ import os
 import os.path
 import sys
 
+from buddy.file_utils import read_path_pairs, read_yaml
+
 
-def add_relative_symlink(target, link):
+def add_relative_symlink(target, link, existing_dirs=None):
     """
     Create a symbolic link from `link` to `target`.
 
@@ -25,25 +33,102 @@ def add_relative_symlink(target, link):
     :param target: An existing file/dir/link on the filesystem
     :param link: A filepath; a softlink from this location to
       `target` will be made.
+    :param existing_dirs: A set of directories that are known to exist; any
+      directory made here is added to the set, so that a batch of links only
+      checks / makes each directory once.
     :return: Null
     """
 
     if not os.path.exists(target):
         raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), target)
 
+    if existing_dirs is None:
+        existing_dirs = set()
+
+    dname = os.path.dirname(link)
+    if dname and dname not in existing_dirs:
+        os.makedirs(dname, exist_ok=True)
+        existing_dirs.add(dname)
+    relative_target_path = os.path.relpath(target, start=dname)
+
     try:
-        dname = os.path.dirname(link)
-        if dname and not os.path.isdir(dname):
-            os.makedirs(dname, exist_ok=True)
-        relative_target_path = os.path.relpath(target, start=dname)
         os.symlink(relative_target_path, link)
     except FileExistsError as err:
         if not os.path.islink(link):
-            print("Attempt to convert a file to a link", file=sys.stderr)
-            raise err
+            raise FileExistsError(
+                errno.EEXIST, "Attempt to convert a file to a link", link
+            ) from err
         if os.readlink(link) != relative_target_path:
-            print("Attempt to rewrite a link", file=sys.stderr)
-            raise err
+            raise FileExistsError(
+                errno.EEXIST,
+                "Attempt to rewrite a link (to '{}')".format(relative_target_path),
+                link,
+            ) from err
+
+
+def read_links_file(links_file):
+    """
+    Read the (target, link) pairs from a links-file.
+
+    Text files should contain a whitespace-separated `target link` pair on
+    each line; yaml files should map each link to its target. A leading `~`
+    in any path is expanded to the user's home directory.
+
+    :param links_file: A file path.
+    :return: A list of (target, link) tuples, in the order they were given.
+    """
+    if links_file.endswith((".yaml", ".yml")):
+        pairs = [(target, link) for link, target in read_yaml(links_file).items()]
+        missing = [link for target, link in pairs if target is None]
+        if missing:
+            raise ValueError(
+                "No target is given for links in '{}': {}".format(
+                    links_file, ", ".join(str(link) for link in missing)
+                )
+            )
+    else:
+        pairs = read_path_pairs(links_file)
+
+    return [
+        (os.path.expanduser(str(target)), os.path.expanduser(str(link)))
+        for target, link in pairs
+    ]
+
+
+def make_links(pairs):
+    """
+    Make a relative symlink for each (target, link) pair.
+
+    The links are made in order (so a link may point to a link that was made
+    earlier in the batch) and an error for one link does not prevent the
+    remaining links from being made.
+
+    :param pairs: An iterable of (target, link) tuples.
+    :return: A list of (target, link, error) tuples for the links that could
+      not be made.
+    """
+    existing_dirs = set()
+    failures = []
+    for target, link in pairs:
+        try:
+            add_relative_symlink(target, link, existing_dirs)
+        except OSError as err:
+            failures.append((target, link, err))
+    return failures
+
+
+def run_workflow(links_file):
+    """
+    Make every link that is defined in a links-file; all the links that could
+    not be made are reported together, on stderr.
+
+    :param links_file: A file path (see `read_links_file`).
+    :return: The number of links that could not be made.
+    """
+    failures = make_links(read_links_file(links_file))
+    for target, link, err in failures:
+        print("FAILED\t{} -> {}\t{}".format(link, target, err), file=sys.stderr)
+    return len(failures)
 
 
 def define_command_arg_parser():
@@ -52,11 +137,24 @@ def define_command_arg_parser():
     program
     """
     parser = argparse.ArgumentParser()
-    parser.add_argument("target", nargs=1)
-    parser.add_argument("link", nargs=1)
+    parser.add_argument("target", nargs="?")
+    parser.add_argument("link", nargs="?")
+    parser.add_argument(
+        "--links-file",
+        type=str,
+        default=None,
+        help="text or yaml file that defines every link to be made",
+    )
     return parser
 
 
 if __name__ == "__main__":
-    ARGS = define_command_arg_parser().parse_args()
-    add_relative_symlink(ARGS.target[0], ARGS.link[0])
+    PARSER = define_command_arg_parser()
+    ARGS = PARSER.parse_args()
+    if ARGS.links_file is not None:
+        if ARGS.target is not None:
+            PARSER.error("Use either `--links-file` or `target link`, not both")
+        sys.exit(1 if run_workflow(ARGS.links_file) else 0)
+    if ARGS.link is None:
+        PARSER.error("Both `target` and `link` are required")
+    add_relative_symlink(ARGS.target, ARGS.link)
@@ -0,0 +1,79 @@
+"""
+Functions for applying a function to every item in a sequence, either serially
+or within a pool of worker threads / processes.
+
+- Results are always returned in the same order as the input items, so that
+  the parallel and serial code paths give identical output.
+"""
+
+import collections
+import itertools
+
+
+def get_executor(n_workers, use_processes=False):
+    """
+    Make a pool of workers for running tasks concurrently
+
+    :param n_workers: The maximum number of workers in the pool.
+    :param use_processes: Should the pool use processes (for CPU-bound tasks)
+    rather than threads (for I/O-bound tasks)?
+    :return: A `concurrent.futures.Executor`
+    """
+    # `concurrent.futures` is only imported if a pool is used (it is slow to
+    # import, relative to the start-up of a serial run)
+    import concurrent.futures
+
+    if use_processes:
+        return concurrent.futures.ProcessPoolExecutor(max_workers=n_workers)
+    return concurrent.futures.ThreadPoolExecutor(max_workers=n_workers)
+
+
+def imap_ordered(func, items, n_workers=1, use_processes=False):
+    """
+    Apply `func` to each of the `items`, yielding the results in the same order
+    as the `items`.
+
+    If `n_workers` is greater than one, the function calls are ran in a pool of
+    that many threads (or processes). Only a few items per worker are
+    submitted ahead of the result that is currently being waited on, so `items`
+    can be a long-running generator. Any exception raised by `func` is
+    re-raised when the corresponding result is reached.
+
+    :param func: A function of a single argument. If `use_processes` is True,
+    this (and the items) must be picklable.
+    :param items: An iterable.
+    :param n_workers: The number of workers to use; if this is None or is at
+    most 1, the items are processed serially in the current thread.
+    :param use_processes: Use a process pool rather than a thread pool.
+    :return: A generator over `func(item)` for each item.
+    """
+    if n_workers is None or n_workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    iterator = iter(items)
+    with get_executor(n_workers, use_processes) as executor:
+        pending = collections.deque(
+            executor.submit(func, item)
+            for item in itertools.islice(iterator, 2 * n_workers)
+        )
+        try:
+            while pending:
+                result = pending.popleft().result()
+                for item in itertools.islice(iterator, 1):
+                    pending.append(executor.submit(func, item))
+                yield result
+        finally:
+            # If the caller stops early (or a task fails) don't start any of
+            # the queued tasks
+            for future in pending:
+                future.cancel()
+
+
+def map_ordered(func, items, n_workers=1, use_processes=False):
+    """
+    Apply `func` to each of the `items` (see `imap_ordered`) and return the
+    results as a list.
+    """
+    return list(imap_ordered(func, items, n_workers, use_processes))
@@ -0,0 +1,249 @@
+"""
+Record the expected digests for a set of files, as a yaml file that can be
+used by `validate_file_contents.py`.
+
+- Directories are walked recursively and globs are expanded; each file is
+  hashed (in parallel, if requested) and its entry is written to the yaml file
+  as soon as it has been hashed, so the entries are never all held in memory.
+- If a `HashCache` is used, re-running the recorder only re-hashes the files
+  that are new or have changed since the previous run.
+- With `tree=True`, each directory in `paths` is recorded as a single
+  directory-tree test (see `TreeValidator`), that stores the digest of every
+  file in the directory. The yaml file, and the cache, are excluded from
+  any directory that holds them.
+- The yaml file is written to a `.partial` file and then renamed, so an
+  interrupted run never leaves a partially-written yaml file behind.
+"""
+
+import argparse
+import glob
+import json
+import os
+import os.path
+
+from buddy.file_utils import walk_files
+from buddy.hash_cache import HashCache
+from buddy.hashing import combine_leaf_digests, hash_file
+from buddy.parallel import imap_ordered
+from buddy.validate_file_contents import add_concurrency_arguments
+from buddy.validation_classes import get_tree_leaves
+
+
+def iter_input_files(paths):
+    """
+    Yield the path to every file that is named by, or is below, one of the
+    `paths`. Each file is yielded at most once.
+
+    :param paths: A list of file paths, directory paths or glob patterns
+    (`**` matches any number of subdirectories).
+    """
+    seen = set()
+    for path in paths:
+        matches = (
+            sorted(glob.iglob(path, recursive=True)) if glob.has_magic(path) else [path]
+        )
+        for match in matches:
+            filepaths = walk_files(match) if os.path.isdir(match) else [match]
+            for filepath in filepaths:
+                filepath = os.path.normpath(filepath)
+                if filepath not in seen:
+                    seen.add(filepath)
+                    yield filepath
+
+
+def _hash_input_file(arguments):
+    # module-level, so that it can be pickled when using a process pool
+    filepath, algorithm, cache = arguments
+    size = os.stat(filepath).st_size
+    if cache is None:
+        return filepath, hash_file(filepath, algorithm), size
+    digest = cache.get_digest(
+        filepath, lambda: hash_file(filepath, algorithm), algorithm=algorithm
+    )
+    return filepath, digest, size
+
+
+def format_entry(filepath, digest, size, algorithm="md5"):
+    """
+    Format the validation test for a single file as a yaml entry.
+
+    The test is named after the file. Strings are written as double-quoted
+    (JSON) scalars, so that unusual file names remain valid yaml.
+    """
+    checksum_key = "expected_md5sum" if algorithm == "md5" else "expected_" + algorithm
+    name = json.dumps(filepath)
+    lines = [
+        "{}:".format(name),
+        "  input_file: {}".format(name),
+        "  {}: {}".format(checksum_key, json.dumps(digest)),
+        "  expected_size: {}".format(size),
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def format_tree_entry(input_dir, leaves, algorithm="md5", excluded_files=None):
+    """
+    Format the directory-tree validation test for a directory as a yaml
+    entry; the digest of each file in the directory is stored in
+    `expected_leaves`, and the files that were skipped in `excluded_files`.
+    """
+    name = json.dumps(os.path.normpath(input_dir))
+    lines = [
+        "{}:".format(name),
+        "  input_dir: {}".format(name),
+    ]
+    if excluded_files:
+        lines.append("  excluded_files: {}".format(json.dumps(sorted(excluded_files))))
+    lines += [
+        "  expected_tree_{}: {}".format(
+            algorithm, json.dumps(combine_leaf_digests(leaves, algorithm))
+        ),
+        "  expected_leaves:" + ("" if leaves else " {}"),
+    ] + [
+        "    {}: {}".format(json.dumps(relpath), json.dumps(leaves[relpath]))
+        for relpath in sorted(leaves)
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def get_excluded_relpaths(input_dir, excluded):
+    """
+    The paths, relative to `input_dir` and with "/" separators, of those
+    `excluded` files that are below `input_dir`.
+
+    :param input_dir: A path to a directory.
+    :param excluded: A collection of absolute file paths.
+    """
+    input_dir = os.path.abspath(input_dir)
+    return sorted(
+        os.path.relpath(filepath, input_dir).replace(os.sep, "/")
+        for filepath in excluded
+        if filepath.startswith(os.path.join(input_dir, ""))
+    )
+
+
+def record_expectations(
+    paths,
+    yaml_file,
+    algorithm="md5",
+    n_workers=1,
+    use_processes=False,
+    cache_file=None,
+    tree=False,
+):
+    """
+    Hash every file that is matched by `paths` and write a validation test for
+    each of them to `yaml_file`.
+
+    :param paths: A list of file paths, directory paths or glob patterns.
+    :param yaml_file: The yaml file to write the validation tests to. Any
+    existing file is replaced.
+    :param algorithm: The hashing algorithm to use.
+    :param n_workers: The number of files to hash concurrently.
+    :param use_processes: Hash the files in a pool of processes, rather than a
+    pool of threads.
+    :param cache_file: A file in which the digest for each file is cached, so
+    that unchanged files need not be re-hashed in subsequent runs.
+    :param tree: Write a single directory-tree test for each directory in
+    `paths`, rather than a test for each file in the directory.
+    :return: The number of validation tests that were written.
+    """
+    tree_dirs = [path for path in paths if tree and os.path.isdir(path)]
+    paths = [path for path in paths if path not in tree_dirs]
+
+    cache = None if cache_file is None else HashCache(cache_file)
+    # the files written by the recorder itself; sqlite may also write a
+    # journal beside the cache
+    own_files = [yaml_file, yaml_file + ".partial"]
+    if cache_file is not None:
+        own_files += [cache_file + suffix for suffix in ["", "-journal", "-wal"]]
+    excluded = {os.path.abspath(x) for x in own_files}
+    input_files = (
+        filepath
+        for filepath in iter_input_files(paths)
+        if os.path.abspath(filepath) not in excluded
+    )
+    results = imap_ordered(
+        _hash_input_file,
+        ((filepath, algorithm, cache) for filepath in input_files),
+        n_workers,
+        use_processes,
+    )
+
+    os.makedirs(os.path.dirname(os.path.abspath(yaml_file)), exist_ok=True)
+    partial_file = yaml_file + ".partial"
+    n_entries = 0
+    try:
+        with open(partial_file, "w") as file_handle:
+            for filepath, digest, size in results:
+                file_handle.write(format_entry(filepath, digest, size, algorithm))
+                n_entries += 1
+            for input_dir in tree_dirs:
+                excluded_files = get_excluded_relpaths(input_dir, excluded)
+                leaves, _, _ = get_tree_leaves(
+                    input_dir,
+                    algorithm,
+                    n_workers=n_workers,
+                    cache=cache,
+                    excluded=excluded_files,
+                )
+                file_handle.write(
+                    format_tree_entry(input_dir, leaves, algorithm, excluded_files)
+                )
+                n_entries += 1
+        os.replace(partial_file, yaml_file)
+    except BaseException:
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+        raise
+    finally:
+        if cache is not None:
+            cache.close()
+    return n_entries
+
+
+def define_command_arg_parser():
+    """
+    Get a parser that extracts the command args used when calling this program
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "yaml_file", type=str, help="yaml file to write the validation tests to"
+    )
+    parser.add_argument(
+        "paths",
+        type=str,
+        nargs="+",
+        help="files, directories or glob patterns for the files to record",
+    )
+    parser.add_argument(
+        "--algorithm", type=str, default="md5", help="hashing algorithm (default: md5)"
+    )
+    add_concurrency_arguments(parser)
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=None,
+        help="sqlite file for caching the digests of unchanged files",
+    )
+    parser.add_argument(
+        "--tree",
+        action="store_true",
+        help="record each directory as a single directory-tree test",
+    )
+    return parser
+
+
+# ---- run as a script
+
+if __name__ == "__main__":
+    ARGS = define_command_arg_parser().parse_args()
+    record_expectations(
+        ARGS.paths,
+        ARGS.yaml_file,
+        ARGS.algorithm,
+        ARGS.workers,
+        ARGS.processes,
+        ARGS.cache,
+        ARGS.tree,
+    )
@@ -0,0 +1,493 @@
+"""
+Set up the file-structure of a project in a single process.
+
+The setup steps (checking external directories, making links, directories and
+copies, cloning git repositories and touching files) are ran in dependency
+order by `run_setup`. Every configuration file is read once, up-front, into a
+`SetupConfig`. The status and time taken for each step is printed to stderr.
+
+Each step plans its changes (see `setup_plan`) and then makes exactly those
+changes, so a run does what `--dry-run` prints (see `plan_setup`).
+
+Run as `python -m buddy.setup`, from the project's working directory.
+"""
+
+import argparse
+import os
+import os.path
+import sys
+import time
+
+from buddy.file_copies import (
+    ContentStore,
+    copy_file,
+    copy_tree,
+    get_default_content_store,
+)
+from buddy.file_utils import read_lines, read_path_pairs, read_yaml
+from buddy.git_backends import get_backend
+from buddy.git_classes import GitMirrorCache
+from buddy.make_symlink import make_links, read_links_file
+from buddy.setup_plan import (
+    FilesystemSnapshot,
+    plan_check_dirs,
+    plan_clones,
+    plan_copy_dirs,
+    plan_copy_files,
+    plan_links,
+    plan_make_dirs,
+    plan_touch_files,
+)
+from buddy.setup_git_clones import (
+    add_git_arguments,
+    parse_repository_details,
+    setup_repositories,
+)
+
+DEFAULT_CONFIG_DIR = os.path.join(".sidekick", "setup")
+
+# For each configuration file: the environment variable that can override its
+# path (as exported by `scripts/setup.sh`), and its default filename
+CONFIG_FILES = {
+    "check_dirs": ("CHECK_DIRS_FILE", "check_these_dirs.yaml"),
+    "links": ("MAKE_LINKS_FILE", "make_these_links.txt"),
+    "make_dirs": ("MAKE_DIRS_FILE", "make_these_subdirs.txt"),
+    "file_copies": ("MAKE_FILE_COPIES_FILE", "copy_these_files.txt"),
+    "dir_copies": ("MAKE_DIR_COPIES_FILE", "copy_these_dirs.txt"),
+    "repositories": ("REPO_CLONING_CONFIG", "clone_these_repos.yaml"),
+    "touch_files": ("TOUCH_FILES_FILE", "touch_these_files.txt"),
+}
+
+
+class SetupError(Exception):
+    """
+    A setup step could not be completed
+    """
+
+
+class SetupConfig:
+    """
+    `SetupConfig` holds the parsed contents of every setup configuration file
+    for a project, and the options for cloning git repositories.
+    """
+
+    def __init__(
+        self,
+        config_dir=DEFAULT_CONFIG_DIR,
+        environ=None,
+        n_workers=8,
+        mirror_dir=None,
+        shallow=False,
+        backend_name=None,
+        store_dir=None,
+        hardlink_copies=False,
+    ):
+        """
+        :param config_dir: The directory containing the configuration files.
+        :param environ: A dictionary of environment variables that may
+        override the path to each configuration file (see `CONFIG_FILES`);
+        defaults to `os.environ`.
+        :param n_workers: The number of git repositories to clone, or
+        required directories to check, concurrently.
+        :param mirror_dir: A directory of bare mirrors that the repositories
+        are cloned through, or None.
+        :param shallow: Should only the pinned commit of each repository be
+        fetched?
+        :param backend_name: The git backend to use (see `git_backends`); if
+        None, `$BUDDY_GIT_BACKEND` or the default backend is used.
+        :param store_dir: The directory of a `ContentStore` for hardlinked
+        copies, or None.
+        :param hardlink_copies: Should copied files be hardlinks to the files
+        in the content store?
+        """
+        if environ is None:
+            environ = os.environ
+        self.files = {
+            key: environ.get(variable) or os.path.join(config_dir, filename)
+            for key, (variable, filename) in CONFIG_FILES.items()
+        }
+        self.n_workers = n_workers
+        self.mirror_dir = mirror_dir
+        self.shallow = shallow
+        self.backend_name = backend_name
+        self.store = None if store_dir is None else ContentStore(store_dir)
+        self.hardlink_copies = hardlink_copies
+
+        self.check_dirs = read_yaml(self.files["check_dirs"])
+        self.links = read_links_file(self.files["links"])
+        self.make_dirs = read_lines(self.files["make_dirs"])
+        self.file_copies = read_path_pairs(self.files["file_copies"])
+        self.dir_copies = read_path_pairs(self.files["dir_copies"])
+        self.repositories = read_yaml(self.files["repositories"])
+        self.touch_files = read_lines(self.files["touch_files"])
+
+
+class SetupStep:
+    """
+    `SetupStep` is a named action that is ran on a `SetupConfig`, once all
+    the steps that it depends on have succeeded.
+
+    The step's `planner` (if any) lists the changes that the action would
+    make, without making them (see `setup_plan`). The action of a step with a
+    planner is called as `action(config, changes)` and makes those changes;
+    otherwise it is called as `action(config)`.
+    """
+
+    def __init__(self, name, action, depends_on=(), planner=None):
+        self.name = name
+        self.action = action
+        self.depends_on = tuple(depends_on)
+        self.planner = planner
+
+    def __repr__(self):
+        return "SetupStep({!r}, depends_on={!r})".format(self.name, self.depends_on)
+
+
+def plan_steps(steps):
+    """
+    Order a list of steps so that every step comes after the steps that it
+    depends on. Otherwise, steps keep the order they were given in.
+
+    :param steps: A list of `SetupStep` objects.
+    :return: A list of `SetupStep` objects.
+    """
+    names = {step.name for step in steps}
+    for step in steps:
+        unknown = [name for name in step.depends_on if name not in names]
+        if unknown:
+            raise ValueError(
+                "Step '{}' depends on unknown steps: {}".format(
+                    step.name, ", ".join(unknown)
+                )
+            )
+
+    planned = []
+    done = set()
+    remaining = list(steps)
+    while remaining:
+        ready = [
+            step for step in remaining if all(name in done for name in step.depends_on)
+        ]
+        if not ready:
+            raise ValueError(
+                "Steps have circular dependencies: {}".format(
+                    ", ".join(step.name for step in remaining)
+                )
+            )
+        step = ready[0]
+        planned.append(step)
+        done.add(step.name)
+        remaining.remove(step)
+    return planned
+
+
+# ---- the setup steps
+
+
+def _planned(changes, action):
+    return [change for change in changes if change.action == action]
+
+
+def _raise_for_problems(changes, description, problems=()):
+    # Every conflict in the plan (and any other problem) is reported together
+    problems = list(problems) + [
+        "- {}: {}".format(change.path, change.detail)
+        for change in changes
+        if change.is_conflict
+    ]
+    if problems:
+        raise SetupError(
+            "{} {}:\n{}".format(len(problems), description, "\n".join(problems))
+        )
+
+
+def check_external_dirs(config, changes):
+    """
+    Fail if any directory in the check-dirs yaml file is missing or
+    unreachable; the directories were checked concurrently, when the step was
+    planned, and all of the problems are reported together
+    """
+    _raise_for_problems(changes, "directories are missing or unreachable")
+
+
+def make_project_links(config, changes):
+    """
+    Make each planned link; all the links that can't be made are reported
+    together
+    """
+    planned = {change.path for change in _planned(changes, "link")}
+    failures = make_links(
+        (target, link) for target, link in config.links if link in planned
+    )
+    _raise_for_problems(
+        changes,
+        "links could not be made",
+        [
+            "- {} -> {}: {}".format(link, target, error)
+            for target, link, error in failures
+        ],
+    )
+
+
+def make_project_dirs(config, changes):
+    """
+    Make each planned directory (and intervening directories)
+    """
+    for change in _planned(changes, "mkdir"):
+        os.makedirs(change.path, exist_ok=True)
+    _raise_for_problems(changes, "directories could not be made")
+
+
+def _make_parent_dir(path):
+    parent = os.path.dirname(os.path.normpath(path))
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+
+def copy_files(config, changes):
+    """
+    Copy each planned original file to its copy-location. An existing copy is
+    never planned to be overwritten, so the project keeps a time-fixed version
+    of the file.
+
+    Copies are hardlinks to the files in the content store, if this is
+    requested (see `file_copies`).
+    """
+    for change in _planned(changes, "copy"):
+        _make_parent_dir(change.path)
+        copy_file(change.detail, change.path, config.store, config.hardlink_copies)
+    _raise_for_problems(changes, "files could not be copied")
+
+
+def copy_dirs(config, changes):
+    """
+    Copy each planned original directory to its copy-location. An existing
+    copy is never planned to be overwritten.
+    """
+    for change in _planned(changes, "copy"):
+        _make_parent_dir(change.path)
+        copy_tree(change.detail, change.path, config.store, config.hardlink_copies)
+    _raise_for_problems(changes, "directories could not be copied")
+
+
+def clone_repositories(config, changes):
+    """
+    Clone each planned git repository, or check out its pinned commit
+    """
+    planned = {change.path for change in changes}
+    if not planned:
+        return
+    backend = get_backend(config.backend_name)
+    mirror_cache = (
+        None
+        if config.mirror_dir is None
+        else GitMirrorCache(config.mirror_dir, backend)
+    )
+    repositories = parse_repository_details(
+        config.repositories, mirror_cache, config.shallow, backend
+    )
+    failures = setup_repositories(
+        {
+            name: repository
+            for name, repository in repositories.items()
+            if repository.output_path in planned
+        },
+        config.n_workers,
+    )
+    if failures:
+        raise SetupError(
+            "{} repositories could not be set up: {}".format(
+                len(failures), ", ".join(failures)
+            )
+        )
+
+
+def touch_files(config, changes):
+    """
+    Make an empty file for each planned file in the touch-files file
+    """
+    for change in _planned(changes, "touch"):
+        with open(change.path, "a"):
+            pass
+
+
+def get_setup_steps():
+    """
+    The steps that set up a project.
+
+    Links are made before directories, since the directories may be within
+    the link targets (eg, `./data/job` is typically a link); files are touched
+    once everything else is in place.
+    """
+    return [
+        SetupStep("check_dirs", check_external_dirs, planner=plan_check_dirs),
+        SetupStep("make_links", make_project_links, ["check_dirs"], plan_links),
+        SetupStep("make_dirs", make_project_dirs, ["make_links"], plan_make_dirs),
+        SetupStep("copy_files", copy_files, ["make_dirs"], plan_copy_files),
+        SetupStep("copy_dirs", copy_dirs, ["make_dirs"], plan_copy_dirs),
+        SetupStep("clone_repos", clone_repositories, ["make_dirs"], plan_clones),
+        SetupStep(
+            "touch_files",
+            touch_files,
+            ["copy_files", "copy_dirs", "clone_repos"],
+            plan_touch_files,
+        ),
+    ]
+
+
+def plan_setup(config, steps=None, snapshot=None):
+    """
+    List the changes that `run_setup` would make, in the order they would be
+    made, without changing the filesystem.
+
+    :param config: A `SetupConfig`.
+    :param steps: A list of `SetupStep` objects; defaults to
+    `get_setup_steps()`.
+    :param snapshot: The `FilesystemSnapshot` that paths are looked up
+    through; a new snapshot is used by default.
+    :return: A list of `PlannedChange` objects; any conflict in this list
+    would make its step fail.
+    """
+    if steps is None:
+        steps = get_setup_steps()
+    if snapshot is None:
+        snapshot = FilesystemSnapshot()
+    changes = []
+    for step in plan_steps(steps):
+        if step.planner is not None:
+            changes.extend(step.planner(config, snapshot))
+    return changes
+
+
+def print_plan(changes):
+    """
+    Print each planned change (on stdout) and a summary (on stderr).
+
+    :return: The number of conflicts in the plan.
+    """
+    for change in changes:
+        print(change.format())
+    n_conflicts = sum(change.is_conflict for change in changes)
+    print(
+        "{} changes planned, {} conflicts".format(
+            len(changes) - n_conflicts, n_conflicts
+        ),
+        file=sys.stderr,
+    )
+    return n_conflicts
+
+
+def run_setup(config, steps=None, snapshot=None):
+    """
+    Run each setup step, in dependency order.
+
+    Each step that has a planner is planned just before it runs, through a
+    `FilesystemSnapshot` that is shared by all the steps (as in `plan_setup`),
+    and then makes exactly the changes in its plan.
+
+    A step that fails does not stop the steps that don't depend on it; any
+    step that depends on a failed step is skipped. The status and time taken
+    for each step is printed to stderr.
+
+    :param config: A `SetupConfig`.
+    :param steps: A list of `SetupStep` objects; defaults to
+    `get_setup_steps()`.
+    :param snapshot: The `FilesystemSnapshot` that paths are looked up
+    through; a new snapshot is used by default.
+    :return: A dictionary mapping the name of each step that failed to the
+    error that occurred.
+    """
+    if steps is None:
+        steps = get_setup_steps()
+    if snapshot is None:
+        snapshot = FilesystemSnapshot()
+
+    start = time.perf_counter()
+    failures = {}
+    skipped = set()
+    for step in plan_steps(steps):
+        step_start = time.perf_counter()
+        if any(name in failures or name in skipped for name in step.depends_on):
+            status = "SKIPPED"
+            skipped.add(step.name)
+        else:
+            status = "OK"
+            try:
+                if step.planner is None:
+                    step.action(config)
+                else:
+                    step.action(config, step.planner(config, snapshot))
+            except Exception as exception:
+                status = "FAILED"
+                failures[step.name] = "{}: {}".format(
+                    type(exception).__name__, exception
+                )
+        print(
+            "[{}]\t{}\t{:.3f}s".format(
+                status, step.name, time.perf_counter() - step_start
+            ),
+            file=sys.stderr,
+            flush=True,
+        )
+
+    print(
+        "setup took {:.3f}s".format(time.perf_counter() - start),
+        file=sys.stderr,
+    )
+    for name, error in failures.items():
+        print("- {}: {}".format(name, error), file=sys.stderr)
+    return failures
+
+
+def define_command_arg_parser():
+    """
+    Get a parser that extracts the command args used when calling this program
+    """
+    parser = argparse.ArgumentParser(prog="python -m buddy.setup")
+    parser.add_argument(
+        "--config-dir",
+        type=str,
+        default=DEFAULT_CONFIG_DIR,
+        help="directory containing the setup configuration files (default:"
+        " {})".format(DEFAULT_CONFIG_DIR),
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print the changes that setup would make, without making them",
+    )
+    parser.add_argument(
+        "--copy-store",
+        type=str,
+        default=get_default_content_store(),
+        help="content-addressed store for hardlinked copies (default:"
+        " $BUDDY_CONTENT_STORE or ~/.cache/buddy/store)",
+    )
+    parser.add_argument(
+        "--hardlink-copies",
+        action="store_true",
+        help="make copied files (read-only) hardlinks to the files in the"
+        " content store; otherwise files are copied directly",
+    )
+    add_git_arguments(parser)
+    return parser
+
+
+# ---- run as a script
+
+if __name__ == "__main__":
+    ARGS = define_command_arg_parser().parse_args()
+    CONFIG = SetupConfig(
+        ARGS.config_dir,
+        n_workers=ARGS.workers,
+        mirror_dir=None if ARGS.no_mirror_cache else ARGS.mirror_cache,
+        shallow=ARGS.shallow,
+        backend_name=ARGS.git_backend,
+        store_dir=ARGS.copy_store if ARGS.hardlink_copies else None,
+        hardlink_copies=ARGS.hardlink_copies,
+    )
+    if ARGS.dry_run:
+        FAILURES = print_plan(plan_setup(CONFIG))
+    else:
+        FAILURES = run_setup(CONFIG)
+    sys.exit(1 if FAILURES else 0)
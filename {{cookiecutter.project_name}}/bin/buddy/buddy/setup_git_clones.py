@@ -4,41 +4,193 @@ project, and for cloning them
 """
 
 import argparse
+import sys
+import time
 
 from buddy.file_utils import read_yaml
-from buddy.git_classes import ExternalRepository
+from buddy.git_backends import BACKEND_NAMES, get_backend
+from buddy.git_classes import (
+    ExternalRepository,
+    GitMirrorCache,
+    get_default_mirror_cache,
+)
+from buddy.parallel import imap_ordered
 
 
-def parse_repository_details(yaml_dictionary):
+def parse_repository_details(
+    yaml_dictionary, mirror_cache=None, shallow=False, backend=None
+):
     """
     Extracts details of git repositories: where are they stored, where are they
     to be copied, which commit should be checked out?
+
+    :param mirror_cache: A `GitMirrorCache` to clone the repositories through,
+    or None.
+    :param shallow: Should only the requested commit of each repository be
+    fetched? This can be overridden for a repository by setting `shallow` in
+    its details.
+    :param backend: The git backend for the repositories (see
+    `git_backends`); if None, the `git` program is used.
     """
     repositories = {
-        k: ExternalRepository(v["url"], v["commit"], v["output"])
+        k: ExternalRepository(
+            v["url"],
+            # an unquoted sha1 prefix of digits is read from yaml as a number
+            str(v["commit"]),
+            v["output"],
+            mirror_cache,
+            shallow=v.get("shallow", shallow),
+            backend=backend,
+        )
         for k, v in yaml_dictionary.items()
     }
     return repositories
 
 
-def import_repository_details(yaml_file):
+def import_repository_details(
+    yaml_file, mirror_cache=None, shallow=False, backend=None
+):
     """
     Reads and extracts repository information from a yaml file
     """
     yaml_dict = read_yaml(yaml_file)
-    repositories = parse_repository_details(yaml_dict)
+    repositories = parse_repository_details(yaml_dict, mirror_cache, shallow, backend)
     return repositories
 
 
-def run_workflow(yaml_file):
+def setup_repository(repository):
+    """
+    Clone a git repository (which checks out the required commit), or
+    checkout the required commit in an existing clone, and check that the
+    required commit is checked out. Nothing is done (and git is not called)
+    if the required commit is already checked out.
+
+    :param repository: An `ExternalRepository`.
+    :return: A tuple (status, error, seconds); `status` is "OK", "UP-TO-DATE"
+    or "FAILED", and `error` describes the exception that was raised if the
+    repository could not be set up.
+    """
+    start = time.perf_counter()
+    if repository.is_satisfied():
+        return "UP-TO-DATE", None, time.perf_counter() - start
+
+    status, error = "OK", None
+    try:
+        if repository.local_exists():
+            repository.checkout()
+        else:
+            repository.clone()
+        if not repository.sha1_matches():
+            raise ValueError(
+                "commit '{}' is not checked out in '{}'".format(
+                    repository.commit, repository.output_path
+                )
+            )
+    except Exception as exception:
+        status = "FAILED"
+        error = "{}: {}".format(type(exception).__name__, exception)
+    return status, error, time.perf_counter() - start
+
+
+def run_workflow(
+    yaml_file, n_workers=1, mirror_dir=None, shallow=False, backend_name=None
+):
     """
     For each git repository mentioned in the yaml file, clone it and checkout
     the required commit.
+
+    The status, and time taken, for each repository is printed to stderr. A
+    failure for one repository does not stop the others from being set up;
+    all the failures are reported together at the end.
+
+    :param yaml_file: A yaml file that defines the repositories.
+    :param n_workers: The number of repositories to clone concurrently.
+    :param mirror_dir: A directory of bare mirrors that the repositories are
+    cloned through (see `GitMirrorCache`); if None, each repository is cloned
+    directly.
+    :param backend_name: The git backend to use (see `get_backend`).
+    :return: A dictionary mapping the name of each repository that could not
+    be set up to the error that occurred.
+    """
+    backend = get_backend(backend_name)
+    mirror_cache = None if mirror_dir is None else GitMirrorCache(mirror_dir, backend)
+    repositories = import_repository_details(yaml_file, mirror_cache, shallow, backend)
+    return setup_repositories(repositories, n_workers)
+
+
+def setup_repositories(repositories, n_workers=1):
+    """
+    Set up each of the repositories (see `setup_repository`); the status, and
+    time taken, for each repository is printed to stderr and all the failures
+    are reported together at the end.
+
+    :param repositories: A dictionary of `ExternalRepository` objects (see
+    `parse_repository_details`).
+    :param n_workers: The number of repositories to clone concurrently.
+    :return: A dictionary mapping the name of each repository that could not
+    be set up to the error that occurred.
+    """
+    outcomes = imap_ordered(setup_repository, repositories.values(), n_workers)
+
+    failures = {}
+    for name, (status, error, seconds) in zip(repositories.keys(), outcomes):
+        print(
+            "[{}]\t{}\t{:.1f}s".format(status, name, seconds),
+            file=sys.stderr,
+            flush=True,
+        )
+        if error is not None:
+            failures[name] = error
+
+    if failures:
+        print(
+            "{} of {} repositories could not be set up:".format(
+                len(failures), len(repositories)
+            ),
+            file=sys.stderr,
+        )
+        for name, error in failures.items():
+            print("- {}: {}".format(name, error), file=sys.stderr)
+    return failures
+
+
+def add_git_arguments(parser):
+    """
+    Add the arguments that control how git repositories are cloned to an
+    argument parser
     """
-    repositories = import_repository_details(yaml_file)
-    for _, repo in repositories.items():
-        repo.clone()
-        repo.checkout()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="number of repositories to clone concurrently (default: 8)",
+    )
+    parser.add_argument(
+        "--mirror-cache",
+        type=str,
+        default=get_default_mirror_cache(),
+        help="directory of bare mirrors, shared by all clones on this machine"
+        " (default: $BUDDY_GIT_CACHE or ~/.cache/buddy/git)",
+    )
+    parser.add_argument(
+        "--no-mirror-cache",
+        action="store_true",
+        help="clone each repository directly, without using a mirror",
+    )
+    parser.add_argument(
+        "--shallow",
+        action="store_true",
+        help="fetch only the pinned commit of each repository (shallow"
+        " repositories are not cloned through the mirror cache)",
+    )
+    parser.add_argument(
+        "--git-backend",
+        choices=BACKEND_NAMES,
+        default=None,
+        help="how git operations are ran: the git program (cli), in-process"
+        " (dulwich), or dulwich if it is installed (auto); the default is"
+        " $BUDDY_GIT_BACKEND, or cli",
+    )
 
 
 def define_command_arg_parser():
@@ -47,9 +199,17 @@ def define_command_arg_parser():
     """
     parser = argparse.ArgumentParser()
     parser.add_argument("git_yaml", nargs=1)
+    add_git_arguments(parser)
     return parser
 
 
 if __name__ == "__main__":
     ARGS = define_command_arg_parser().parse_args()
-    run_workflow(ARGS.git_yaml[0])
+    FAILURES = run_workflow(
+        ARGS.git_yaml[0],
+        ARGS.workers,
+        None if ARGS.no_mirror_cache else ARGS.mirror_cache,
+        ARGS.shallow,
+        ARGS.git_backend,
+    )
+    sys.exit(1 if FAILURES else 0)
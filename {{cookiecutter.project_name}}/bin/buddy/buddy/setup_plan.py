@@ -0,0 +1,337 @@
+"""
+Plan the changes that `buddy.setup` would make to a project, without making
+them. A dry-run prints the plan; a real run makes exactly the changes that
+are planned for each step.
+
+Every path is looked up (`lstat` / `stat` / `readlink`) at most once, through
+a `FilesystemSnapshot`, which is shared by all of the setup steps. This
+matters on network filesystems, where each lookup can be slow. The changes
+that are planned by earlier steps are recorded in the snapshot, so later steps
+see the filesystem as it would be once those changes were made (eg, a
+directory that is made inside a planned link, or a file that is touched after
+it was planned to be copied).
+"""
+
+import os
+import os.path
+import stat
+
+from buddy.setup_git_clones import parse_repository_details
+from buddy.validate_dir_existence import check_dirs
+
+_DIRECTORY, _FILE, _LINK = "dir", "file", "link"
+
+# the conflict for each `DirectoryStatus` of a required directory
+_DIRECTORY_PROBLEMS = {
+    "MISSING": "directory is missing",
+    "NOT_A_DIRECTORY": "not a directory",
+    "UNREACHABLE": "directory is unreachable",
+    "TIMEOUT": "directory did not respond",
+}
+
+
+def _read_text(path):
+    with open(path, "r") as file_handle:
+        return file_handle.read()
+
+
+class FilesystemSnapshot:
+    """
+    `FilesystemSnapshot` caches the result of looking up each path on the
+    filesystem, and records the paths that are planned to be made.
+    """
+
+    def __init__(self):
+        self._lstat = {}
+        self._stat = {}
+        self._readlink = {}
+        self._contents = {}
+        # path -> (kind, link target or None), for paths that are planned
+        self._planned = {}
+        self.n_lookups = 0
+
+    @staticmethod
+    def _key(path):
+        return os.path.normpath(path)
+
+    def _resolve(self, path):
+        # Rewrite a path that lies inside a planned link, so that it refers
+        # to the corresponding path inside the link target
+        key = self._key(path)
+        parent = key
+        while True:
+            parent, _ = os.path.split(parent)
+            if not parent:
+                return key
+            kind, target = self._planned.get(parent, (None, None))
+            if kind == _LINK:
+                relative = os.path.relpath(key, parent)
+                return self._resolve(
+                    os.path.join(os.path.dirname(parent), target, relative)
+                )
+
+    def _cached_call(self, cache, function, key):
+        if key not in cache:
+            self.n_lookups += 1
+            try:
+                cache[key] = function(key)
+            except OSError:
+                cache[key] = None
+        return cache[key]
+
+    def plan(self, path, kind, link_target=None):
+        """
+        Record that a directory, file or link (`kind`) is planned to be made
+        at `path`.
+        """
+        self._planned[self._key(path)] = (kind, link_target)
+
+    def lstat(self, path):
+        """
+        The `os.lstat` result for a path that exists on the filesystem, or
+        None.
+        """
+        return self._cached_call(self._lstat, os.lstat, self._resolve(path))
+
+    def stat(self, path):
+        """
+        The `os.stat` result for a path that exists on the filesystem, or
+        None.
+        """
+        key = self._resolve(path)
+        if key in self._lstat:
+            # `lstat` and `stat` only differ for links
+            status = self._lstat[key]
+            if status is None or not stat.S_ISLNK(status.st_mode):
+                return status
+        return self._cached_call(self._stat, os.stat, key)
+
+    def readlink(self, path):
+        """
+        The target of a link, or None if there is no link at `path`.
+        """
+        key = self._resolve(path)
+        kind, target = self._planned.get(key, (None, None))
+        if kind is not None:
+            return target
+        if not self.islink(path):
+            return None
+        return self._cached_call(self._readlink, os.readlink, key)
+
+    def read_text(self, path):
+        """
+        The contents of a file that exists on the filesystem, or None.
+        """
+        key = self._resolve(path)
+        if key in self._planned:
+            return None
+        return self._cached_call(self._contents, _read_text, key)
+
+    def _planned_kind(self, path):
+        return self._planned.get(self._resolve(path), (None, None))[0]
+
+    def lexists(self, path):
+        return self._planned_kind(path) is not None or self.lstat(path) is not None
+
+    def exists(self, path):
+        kind = self._planned_kind(path)
+        if kind == _LINK:
+            return self.exists(
+                os.path.join(os.path.dirname(self._key(path)), self.readlink(path))
+            )
+        return kind is not None or self.stat(path) is not None
+
+    def islink(self, path):
+        kind = self._planned_kind(path)
+        if kind is not None:
+            return kind == _LINK
+        status = self.lstat(path)
+        return status is not None and stat.S_ISLNK(status.st_mode)
+
+    def isdir(self, path):
+        kind = self._planned_kind(path)
+        if kind == _LINK:
+            return self.isdir(
+                os.path.join(os.path.dirname(self._key(path)), self.readlink(path))
+            )
+        if kind is not None:
+            return kind == _DIRECTORY
+        status = self.stat(path)
+        return status is not None and stat.S_ISDIR(status.st_mode)
+
+    def isfile(self, path):
+        kind = self._planned_kind(path)
+        if kind == _LINK:
+            return self.isfile(
+                os.path.join(os.path.dirname(self._key(path)), self.readlink(path))
+            )
+        if kind is not None:
+            return kind == _FILE
+        status = self.stat(path)
+        return status is not None and stat.S_ISREG(status.st_mode)
+
+
+class PlannedChange:
+    """
+    `PlannedChange` is a change that a setup step would make (eg, "link" or
+    "mkdir"), or a conflict that would stop the step from completing.
+    """
+
+    def __init__(self, step, action, path, detail="", is_conflict=False):
+        self.step = step
+        self.action = action
+        self.path = path
+        self.detail = detail
+        self.is_conflict = is_conflict
+
+    def __eq__(self, other):
+        return isinstance(other, PlannedChange) and vars(self) == vars(other)
+
+    def __repr__(self):
+        return "PlannedChange({!r}, {!r}, {!r}, {!r}, {!r})".format(
+            self.step, self.action, self.path, self.detail, self.is_conflict
+        )
+
+    def format(self):
+        """
+        Format the change as a line of the plan: conflicts are prefixed by
+        "!" and changes by "+".
+        """
+        return "\t".join(
+            ["!" if self.is_conflict else "+", self.step, self.action, self.path]
+            + ([self.detail] if self.detail else [])
+        )
+
+
+def _conflict(step, path, detail):
+    return PlannedChange(step, "conflict", path, detail, is_conflict=True)
+
+
+# ---- a planner for each setup step
+
+
+def plan_check_dirs(config, snapshot):
+    """
+    Plan the check that the required external directories exist. The
+    directories are checked concurrently, with a timeout for each (see
+    `validate_dir_existence.check_dirs`), rather than through the snapshot.
+    """
+    return [
+        _conflict(
+            "check_dirs",
+            status.path,
+            _DIRECTORY_PROBLEMS[status.status]
+            + ("" if status.error is None else ": " + status.error),
+        )
+        for status in check_dirs(config.check_dirs, config.n_workers)
+        if not status.is_ok
+    ]
+
+
+def plan_links(config, snapshot):
+    """
+    Plan the links that still need to be made
+    """
+    changes = []
+    for target, link in config.links:
+        relative_target = os.path.relpath(target, start=os.path.dirname(link))
+        if not snapshot.exists(target):
+            changes.append(_conflict("make_links", link, "target is missing"))
+        elif not snapshot.lexists(link):
+            changes.append(PlannedChange("make_links", "link", link, relative_target))
+            snapshot.plan(link, _LINK, relative_target)
+        elif not snapshot.islink(link):
+            changes.append(_conflict("make_links", link, "a file is in the way"))
+        elif snapshot.readlink(link) != relative_target:
+            changes.append(
+                _conflict(
+                    "make_links",
+                    link,
+                    "links to '{}', not '{}'".format(
+                        snapshot.readlink(link), relative_target
+                    ),
+                )
+            )
+    return changes
+
+
+def plan_make_dirs(config, snapshot):
+    """
+    Plan the directories that still need to be made
+    """
+    changes = []
+    for directory in config.make_dirs:
+        if snapshot.isdir(directory):
+            continue
+        if snapshot.lexists(directory):
+            changes.append(_conflict("make_dirs", directory, "a file is in the way"))
+        else:
+            changes.append(PlannedChange("make_dirs", "mkdir", directory))
+            snapshot.plan(directory, _DIRECTORY)
+    return changes
+
+
+def _plan_copies(step, pairs, snapshot, is_dir):
+    changes = []
+    kind, exists = (_DIRECTORY, snapshot.isdir) if is_dir else (_FILE, snapshot.isfile)
+    for original, copy in pairs:
+        if snapshot.lexists(copy):
+            continue
+        if not exists(original):
+            changes.append(_conflict(step, copy, "original is missing: " + original))
+        else:
+            changes.append(PlannedChange(step, "copy", copy, original))
+            snapshot.plan(copy, kind)
+    return changes
+
+
+def plan_copy_files(config, snapshot):
+    """
+    Plan the file copies that still need to be made
+    """
+    return _plan_copies("copy_files", config.file_copies, snapshot, is_dir=False)
+
+
+def plan_copy_dirs(config, snapshot):
+    """
+    Plan the directory copies that still need to be made
+    """
+    return _plan_copies("copy_dirs", config.dir_copies, snapshot, is_dir=True)
+
+
+def plan_clones(config, snapshot):
+    """
+    Plan the git repositories that still need to be cloned, or that need a
+    different commit to be checked out. This reads the `.git` directory of
+    each existing clone through the snapshot, but does not run git.
+    """
+    changes = []
+    for repository in parse_repository_details(config.repositories).values():
+        output = repository.output_path
+        if not snapshot.lexists(output):
+            changes.append(
+                PlannedChange(
+                    "clone_repos",
+                    "clone",
+                    output,
+                    "{} @ {}".format(repository.input_path, repository.commit),
+                )
+            )
+            snapshot.plan(output, _DIRECTORY)
+        elif not repository.is_satisfied(snapshot):
+            changes.append(
+                PlannedChange("clone_repos", "checkout", output, repository.commit)
+            )
+    return changes
+
+
+def plan_touch_files(config, snapshot):
+    """
+    Plan the files that still need to be touched
+    """
+    changes = []
+    for filename in config.touch_files:
+        if not snapshot.isfile(filename):
+            changes.append(PlannedChange("touch_files", "touch", filename))
+            snapshot.plan(filename, _FILE)
+    return changes
@@ -0,0 +1,258 @@
+"""
+Set up the subjobs of a project, running independent subjobs concurrently.
+
+The subjobs are listed in `subjob_names.txt`, one per line. A subjob that must
+be set up after some other subjobs lists them after a colon:
+
+    prepare_data
+    align_reads: prepare_data
+    qc_report: prepare_data align_reads
+
+A subjob can only depend on subjobs that are listed before it, so the
+dependencies always form a DAG. Each subjob is set up (by running
+`./sidekick setup` in `./subjobs/<subjob_name>`) as soon as all of its
+dependencies have been set up, with up to `n_workers` subjobs running at a
+time. If a subjob fails, the subjobs that depend on it are skipped. The
+subjobs of a subjob are set up one at a time, so nesting never adds to the
+number of subjobs that run at once.
+
+The output of each subjob is printed once it has finished, so the output of
+concurrent subjobs is not interleaved. A summary of the status and time taken
+for each subjob is printed at the end.
+"""
+
+import argparse
+import os
+import os.path
+import subprocess
+import sys
+import time
+
+from buddy.git_classes import get_default_mirror_cache
+
+DEFAULT_COMMAND = ("./sidekick", "setup")
+
+
+class Subjob:
+    """
+    `Subjob` is a subjob of a project, and the names of the subjobs that must
+    be set up before it.
+    """
+
+    def __init__(self, name, depends_on=(), path=None):
+        self.name = name
+        self.depends_on = tuple(depends_on)
+        self.path = os.path.join("subjobs", name) if path is None else path
+
+    def __eq__(self, other):
+        return isinstance(other, Subjob) and vars(self) == vars(other)
+
+    def __repr__(self):
+        return "Subjob({!r}, depends_on={!r})".format(self.name, self.depends_on)
+
+
+def read_subjobs(subjobs_file):
+    """
+    Read the subjobs, and their dependencies, from a subjobs file; blank lines
+    and comment lines are ignored. The dependencies are checked when the
+    subjobs are ran (see `check_dependencies`).
+
+    :param subjobs_file: A file path.
+    :return: A list of `Subjob` objects, in the order that they were listed.
+    """
+    subjobs = []
+    with open(subjobs_file, "r") as file_handle:
+        for line_number, line in enumerate(file_handle, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            name, _, dependencies = line.partition(":")
+            name = name.strip()
+            if not name:
+                raise ValueError(
+                    "Line {} of '{}' should start with the name of a subjob:"
+                    " '{}'".format(line_number, subjobs_file, line)
+                )
+            subjobs.append(Subjob(name, dependencies.split()))
+    return subjobs
+
+
+def check_subjobs(subjobs):
+    """
+    Check that every subjob has a directory containing `scripts/setup.sh`;
+    all the subjobs that don't are reported together.
+    """
+    missing = [
+        subjob.path
+        for subjob in subjobs
+        if not os.path.isfile(os.path.join(subjob.path, "scripts", "setup.sh"))
+    ]
+    if missing:
+        raise FileNotFoundError(
+            "Each subjob should be defined, with a scripts/setup.sh, before"
+            " it is set up: {}".format(", ".join(missing))
+        )
+
+
+def check_dependencies(subjobs):
+    """
+    Check that each subjob is listed once, and only depends on subjobs that
+    are listed before it (so the dependencies can't be circular); raises a
+    ValueError otherwise.
+    """
+    names = set()
+    for subjob in subjobs:
+        if subjob.name in names:
+            raise ValueError("Subjob '{}' is listed twice".format(subjob.name))
+        unknown = [name for name in subjob.depends_on if name not in names]
+        if unknown:
+            raise ValueError(
+                "Subjob '{}' depends on subjobs that aren't listed before it:"
+                " {}".format(subjob.name, ", ".join(unknown))
+            )
+        names.add(subjob.name)
+
+
+def setup_subjob(subjob, command=DEFAULT_COMMAND, env=None):
+    """
+    Run the setup command for a subjob, in the subjob's directory.
+
+    :return: A tuple (status, output, seconds); `status` is "OK" or
+    "FAILED" and `output` is the combined stdout / stderr of the command.
+    """
+    start = time.perf_counter()
+    try:
+        process = subprocess.run(
+            list(command),
+            cwd=subjob.path,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        status = "OK" if process.returncode == 0 else "FAILED"
+        output = process.stdout.decode("utf-8", "replace")
+    except OSError as exception:
+        status, output = "FAILED", "{}\n".format(exception)
+    return status, output, time.perf_counter() - start
+
+
+def run_subjobs(subjobs, n_workers=1, command=DEFAULT_COMMAND, env=None):
+    """
+    Set up each subjob once all of its dependencies have been set up, running
+    up to `n_workers` subjobs at a time.
+
+    :param subjobs: A list of `Subjob` objects; subjobs that are ready at the
+    same time are started in the order of this list.
+    :param n_workers: The maximum number of subjobs to set up concurrently.
+    :param command: The setup command that is ran in each subjob's directory.
+    :param env: The environment variables for the setup commands.
+    :return: A dictionary mapping the name of each subjob to a tuple
+    (status, seconds); `status` is "OK", "FAILED" or "SKIPPED" (if a
+    dependency was not set up).
+    :raises ValueError: If a subjob is listed twice, or depends on a subjob
+    that isn't listed before it.
+    """
+    # `concurrent.futures` is slow to import, so is only imported once there
+    # are subjobs to run
+    import concurrent.futures
+
+    check_dependencies(subjobs)
+    n_workers = max(n_workers, 1)
+    outcomes = {}
+    waiting = list(subjobs)
+    running = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_workers) as pool:
+        while waiting or running:
+            for subjob in list(waiting):
+                dependencies = [outcomes.get(name) for name in subjob.depends_on]
+                if any(x is not None and x[0] != "OK" for x in dependencies):
+                    waiting.remove(subjob)
+                    outcomes[subjob.name] = ("SKIPPED", 0.0)
+                elif None not in dependencies and len(running) < n_workers:
+                    waiting.remove(subjob)
+                    future = pool.submit(setup_subjob, subjob, command, env)
+                    running[future] = subjob
+
+            if not running:
+                continue
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                subjob = running.pop(future)
+                status, output, seconds = future.result()
+                outcomes[subjob.name] = (status, seconds)
+                print(
+                    "==> [{}]\t{}\t{:.1f}s\n{}".format(
+                        status, subjob.name, seconds, output
+                    ),
+                    file=sys.stderr,
+                    end="",
+                    flush=True,
+                )
+    return {subjob.name: outcomes[subjob.name] for subjob in subjobs}
+
+
+def run_workflow(subjobs_file, n_workers=1, command=DEFAULT_COMMAND):
+    """
+    Set up every subjob that is listed in a subjobs file, and print a timing
+    summary.
+
+    All of the subjobs share the environment of this process. The git mirror
+    cache is fixed (through `BUDDY_GIT_CACHE`) so that every subjob clones
+    through the same mirrors, and the environment checks that were made by
+    the calling `setup.sh` are not repeated (see `BUDDY_ENV_CHECKED` in
+    `scripts/setup.sh`). Each subjob sets up its own subjobs serially
+    (through `BUDDY_SUBJOB_WORKERS`), so at most `n_workers` subjobs are set
+    up at once, however deeply they are nested.
+
+    :return: A dictionary mapping the name of each subjob that was not set up
+    to its status ("FAILED" or "SKIPPED").
+    """
+    if not os.path.isfile(subjobs_file):
+        print("No subjobs defined", file=sys.stderr)
+        return {}
+    subjobs = read_subjobs(subjobs_file)
+    check_subjobs(subjobs)
+
+    env = dict(os.environ)
+    env["BUDDY_GIT_CACHE"] = get_default_mirror_cache()
+    env["BUDDY_SUBJOB_WORKERS"] = "1"
+
+    start = time.perf_counter()
+    outcomes = run_subjobs(subjobs, n_workers, command, env)
+
+    print("subjob\tstatus\tseconds", file=sys.stderr)
+    for name, (status, seconds) in outcomes.items():
+        print("{}\t{}\t{:.1f}".format(name, status, seconds), file=sys.stderr)
+    print(
+        "{} subjobs set up in {:.1f}s".format(
+            len(outcomes), time.perf_counter() - start
+        ),
+        file=sys.stderr,
+    )
+    return {name: status for name, (status, _) in outcomes.items() if status != "OK"}
+
+
+def define_command_arg_parser():
+    """
+    Get a parser that extracts the command args used when calling this program
+    """
+    parser = argparse.ArgumentParser(prog="python -m buddy.setup_subjobs")
+    parser.add_argument("subjobs_file", type=str, help="file listing the subjobs")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("BUDDY_SUBJOB_WORKERS", 4)),
+        help="number of subjobs to set up concurrently (default:"
+        " $BUDDY_SUBJOB_WORKERS or 4)",
+    )
+    return parser
+
+
+# ---- run as a script
+
+if __name__ == "__main__":
+    ARGS = define_command_arg_parser().parse_args()
+    FAILURES = run_workflow(ARGS.subjobs_file, ARGS.workers)
+    sys.exit(1 if FAILURES else 0)
@@ -3,27 +3,155 @@ Given a file-path to a .yaml file, this script will check
 whether every string in the .yaml file corresponds to a
 directory that exists (with respect to the current working
 directory)
+
+The directories are checked concurrently, with a single `stat` call each, in
+a bounded pool of daemon threads. A directory that takes longer than the
+timeout to check (eg, on a hung network mount) is reported as unreachable
+without blocking the other checks, or the exit of the program. All the
+directories that are missing or unreachable are reported together, with the
+time taken to check each of them.
 """
 
 import argparse
 import errno
 import os
 import os.path
+import queue
+import stat
 import sys
+import threading
+import time
 
 from buddy.file_utils import read_yaml
 
+DEFAULT_WORKERS = 8
+DEFAULT_TIMEOUT = 10.0
+
 
-def run_workflow(yaml_path):
+class DirectoryStatus:
+    """
+    `DirectoryStatus` is the outcome of checking a directory: `status` is
+    "OK", "MISSING", "NOT_A_DIRECTORY", "UNREACHABLE" or "TIMEOUT".
     """
-    Checks that every directory mentioned in the yaml file is really a
-    directory
 
-    :param yaml_path: a file-path
-    :return:
+    def __init__(self, path, status, seconds, error=None):
+        self.path = path
+        self.status = status
+        self.seconds = seconds
+        self.error = error
+
+    @property
+    def is_ok(self):
+        return self.status == "OK"
+
+    def __repr__(self):
+        return "DirectoryStatus({!r}, {!r}, {:.3f})".format(
+            self.path, self.status, self.seconds
+        )
+
+    def format(self):
+        """
+        Format the status as a tab-separated line: status, path, seconds and
+        (for unreachable directories) the error.
+        """
+        fields = [self.status, self.path, "{:.3f}s".format(self.seconds)]
+        if self.error is not None:
+            fields.append(self.error)
+        return "\t".join(fields)
+
+
+def _stat_dir(path):
+    # Check a directory with a single stat call: returns (status, error)
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return "MISSING", None
+    except OSError as exception:
+        return "UNREACHABLE", str(exception)
+    return ("OK" if stat.S_ISDIR(mode) else "NOT_A_DIRECTORY"), None
+
+
+def check_dirs(dirs, n_workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT):
+    """
+    Check whether each path is an accessible directory, checking up to
+    `n_workers` paths at a time.
+
+    The checks run in daemon threads. If checking a path takes more than
+    `timeout` seconds, it is given the status "TIMEOUT" and a new thread
+    takes over the remaining paths; the stuck thread is abandoned.
+
+    :param dirs: An iterable of directory paths.
+    :param n_workers: The maximum number of paths to check concurrently
+    (excluding abandoned checks).
+    :param timeout: The number of seconds to wait for the check of any one
+    path.
+    :return: A list of `DirectoryStatus` objects, one for each distinct path,
+    in the order that the paths were given.
+    """
+    paths = list(dict.fromkeys(dirs))
+    pending = queue.Queue()
+    for path in paths:
+        pending.put(path)
+    started = {}
+    results = {}
+    condition = threading.Condition()
+
+    def worker():
+        while True:
+            try:
+                path = pending.get_nowait()
+            except queue.Empty:
+                return
+            with condition:
+                started[path] = time.perf_counter()
+            status, error = _stat_dir(path)
+            with condition:
+                if path in results:
+                    # this check timed out, so this thread was replaced
+                    return
+                results[path] = DirectoryStatus(
+                    path, status, time.perf_counter() - started[path], error
+                )
+                condition.notify_all()
+
+    def start_worker():
+        threading.Thread(target=worker, daemon=True).start()
+
+    for _ in range(min(max(n_workers, 1), len(paths))):
+        start_worker()
+
+    with condition:
+        while len(results) < len(paths):
+            now = time.perf_counter()
+            in_flight = [x for x in started if x not in results]
+            for path in in_flight:
+                if now - started[path] >= timeout:
+                    results[path] = DirectoryStatus(
+                        path, "TIMEOUT", now - started[path], "no response"
+                    )
+                    start_worker()
+            deadlines = [started[x] + timeout for x in in_flight if x not in results]
+            condition.wait(max(min(deadlines) - now, 0) if deadlines else timeout)
+    return [results[path] for path in paths]
+
+
+def check_dirs_exist(dirs, n_workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT):
     """
-    dirs = read_yaml(yaml_path)
+    Checks that every directory in `dirs` is really a directory
+
+    Nothing is printed if all of the directories exist. Otherwise, every
+    directory that is missing or unreachable is reported (on stderr) and a
+    FileNotFoundError is raised.
 
+    :param dirs: An iterable of directory paths (tilde-prefixed paths are not
+    allowed)
+    :param n_workers: The maximum number of directories to check
+    concurrently.
+    :param timeout: The number of seconds to wait for the check of any one
+    directory.
+    :return: A list of `DirectoryStatus` objects (see `check_dirs`)
+    """
+    dirs = list(dirs)
     for current_dir in dirs:
         if not os.path.expanduser(current_dir) == current_dir:
             print(
@@ -32,10 +160,30 @@ def run_workflow(yaml_path):
             )
             raise Exception()
 
-        if not os.path.isdir(current_dir):
-            raise FileNotFoundError(
-                errno.ENOENT, os.strerror(errno.ENOENT), current_dir
-            )
+    statuses = check_dirs(dirs, n_workers, timeout)
+    failures = [status for status in statuses if not status.is_ok]
+    if failures:
+        for status in failures:
+            print(status.format(), file=sys.stderr)
+        raise FileNotFoundError(
+            errno.ENOENT,
+            "{} of {} directories are missing or unreachable".format(
+                len(failures), len(statuses)
+            ),
+            ", ".join(status.path for status in failures),
+        )
+    return statuses
+
+
+def run_workflow(yaml_path, n_workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT):
+    """
+    Checks that every directory mentioned in the yaml file is really a
+    directory
+
+    :param yaml_path: a file-path
+    :return:
+    """
+    check_dirs_exist(read_yaml(yaml_path), n_workers, timeout)
 
 
 def define_command_arg_parser():
@@ -45,6 +193,22 @@ def define_command_arg_parser():
     """
     parser = argparse.ArgumentParser()
     parser.add_argument("required_dirs_yaml", nargs=1)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="number of directories to check concurrently (default: {})".format(
+            DEFAULT_WORKERS
+        ),
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="seconds to wait for any one directory (default: {})".format(
+            DEFAULT_TIMEOUT
+        ),
+    )
     return parser
 
 
@@ -52,4 +216,4 @@ def define_command_arg_parser():
 
 if __name__ == "__main__":
     ARGS = define_command_arg_parser().parse_args()
-    run_workflow(ARGS.required_dirs_yaml[0])
+    run_workflow(ARGS.required_dirs_yaml[0], ARGS.workers, ARGS.timeout)
@@ -6,7 +6,8 @@ environment and verifies that the environment contains an appropriate python and
 
 import os
 import sys
-import subprocess
+
+from buddy.env_probe import find_executable
 
 
 def conda_env_is_activated():
@@ -50,15 +51,16 @@ def rscript_matches_conda():
     environment? If R is used in the current project, there should be an
     Rscript in <my_conda_env>/bin/Rscript
 
+    The `Rscript` is found by scanning the `PATH` (see `env_probe`), rather
+    than by running `which`.
+
     :return: bool
     """
     if not conda_env_is_activated():
         return False
 
     expected_rscript = os.path.join(os.environ["CONDA_PREFIX"], "bin", "Rscript")
-    which_rscript = subprocess.run(args=["which", "Rscript"], stdout=subprocess.PIPE)
-    observed_rscript = which_rscript.stdout.decode("utf-8").strip()
-    return expected_rscript == observed_rscript
+    return expected_rscript == find_executable("Rscript")
 
 
 def run_workflow(conda_prefix, is_r_required):
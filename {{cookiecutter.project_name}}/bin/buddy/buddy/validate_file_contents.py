@@ -1,18 +1,112 @@
 import argparse
+import json
+import sys
 
+from buddy.hash_cache import HashCache
+from buddy.validation_classes import ValidationResult
 from buddy.validation_workflow import ValidationWorkflow
 
 
-def setup_workflow(yaml_file):
-    workflow = ValidationWorkflow.from_yaml_file(yaml_file)
+def setup_workflow(yaml_file, stream_yaml=False):
+    workflow = ValidationWorkflow.from_yaml_file(yaml_file, stream_yaml)
     return workflow
 
 
-def run_workflow(yaml_file):
-    workflow = setup_workflow(yaml_file)
-    report = workflow.format_failure_report()
-    if report:
-        print(report)
+class ResultsWriter:
+    """
+    `ResultsWriter` writes a `ValidationResult` for each validation test to a
+    file, as JSON Lines or, if the file name ends with `.tsv`, as a
+    tab-separated table. Each result is flushed to the file as soon as it is
+    written.
+    """
+
+    def __init__(self, results_file):
+        self.results_file = results_file
+        self.is_tsv = results_file.endswith(".tsv")
+        self.file_handle = open(results_file, "w")
+        if self.is_tsv:
+            self.file_handle.write("\t".join(ValidationResult.FIELDS) + "\n")
+
+    @staticmethod
+    def format_tsv_value(value):
+        if value is None:
+            return ""
+        if isinstance(value, bool):
+            return str(value).lower()
+        if isinstance(value, float):
+            return "{:.6g}".format(value)
+        return str(value)
+
+    def write(self, result):
+        if self.is_tsv:
+            line = "\t".join(
+                self.format_tsv_value(value) for value in result.to_dict().values()
+            )
+        else:
+            line = json.dumps(result.to_dict())
+        self.file_handle.write(line + "\n")
+        self.file_handle.flush()
+
+    def close(self):
+        self.file_handle.close()
+
+
+def run_workflow(
+    yaml_file,
+    n_workers=1,
+    use_processes=False,
+    cache_file=None,
+    quick=False,
+    max_failures=None,
+    results_file=None,
+    stream_yaml=False,
+):
+    """
+    Run all the validation tests defined in a yaml file and print a report
+    for any that fail. Each failure is printed as soon as it is found.
+
+    :param yaml_file: A yaml file that defines the validation tests.
+    :param n_workers: The number of files to validate concurrently.
+    :param use_processes: Validate the files in a pool of processes rather
+    than a pool of threads.
+    :param cache_file: A file in which the digest for each validated file is
+    cached, so that unchanged files need not be re-hashed in subsequent runs;
+    a file with the cached size, mtime and inode is taken to be unchanged
+    without being re-read. If None (the default), every file is hashed.
+    :param quick: Only check that each file exists and has the expected size
+    (or number of lines); don't hash any files.
+    :param max_failures: Stop after this many tests have failed (None: run
+    all the tests).
+    :param results_file: A file to write the result (status, observed digest,
+    timing etc) of every validation test to; JSON Lines, or TSV if the file
+    name ends with `.tsv`.
+    :param stream_yaml: Read the validation tests from the yaml file one at a
+    time, as they are ran (for files that are too big to parse in memory);
+    the failures are then reported in the order of the file.
+    :return: The number of validation tests that failed.
+    """
+    workflow = setup_workflow(yaml_file, stream_yaml)
+    cache = None if cache_file is None else HashCache(cache_file)
+    workflow.use_cache(cache)
+
+    writer = None if results_file is None else ResultsWriter(results_file)
+    n_failures = 0
+    try:
+        for result in workflow.iter_results(
+            n_workers, use_processes, quick, max_failures
+        ):
+            if writer is not None:
+                writer.write(result)
+            if not result.is_valid:
+                n_failures += 1
+                print(workflow.format_failure(result), flush=True)
+    finally:
+        if writer is not None:
+            writer.close()
+        if cache is not None:
+            cache.evict_missing()
+            cache.close()
+    return n_failures
 
 
 def define_command_arg_parser():
@@ -21,11 +115,75 @@ def define_command_arg_parser():
     """
     parser = argparse.ArgumentParser()
     parser.add_argument("validate_yaml", nargs=1)
+    add_concurrency_arguments(parser)
+    parser.add_argument(
+        "--cache",
+        default=None,
+        help="sqlite file for caching the digests of files; a file whose size,"
+        " mtime and inode are unchanged is not re-read, so in-place corruption"
+        " that keeps those is not detected (default: no cache)",
+    )
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="only check file existence, sizes and line counts; don't hash",
+    )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="stop after the first failure (same as --max-failures 1)",
+    )
+    parser.add_argument(
+        "--max-failures",
+        type=int,
+        default=None,
+        metavar="N",
+        help="stop after the first N failures",
+    )
+    parser.add_argument(
+        "--results",
+        type=str,
+        default=None,
+        help="file for the result and timing of every test (.jsonl or .tsv)",
+    )
+    parser.add_argument(
+        "--stream-yaml",
+        action="store_true",
+        help="read the tests from the yaml file one at a time, as they are ran,"
+        " to save memory (failures are reported in file order)",
+    )
     return parser
 
 
+def add_concurrency_arguments(parser):
+    """
+    Add the arguments that control how many files are validated concurrently
+    """
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of files to validate concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--processes",
+        action="store_true",
+        help="validate files in a pool of processes, rather than threads",
+    )
+
+
 # ---- run as a script
 
 if __name__ == "__main__":
     ARGS = define_command_arg_parser().parse_args()
-    run_workflow(ARGS.validate_yaml[0])
+    N_FAILURES = run_workflow(
+        ARGS.validate_yaml[0],
+        ARGS.workers,
+        ARGS.processes,
+        ARGS.cache,
+        ARGS.quick,
+        1 if ARGS.fail_fast else ARGS.max_failures,
+        ARGS.results,
+        ARGS.stream_yaml,
+    )
+    sys.exit(1 if N_FAILURES else 0)
@@ -1,27 +1,558 @@
-import hashlib
+import os
+import time
 
+from buddy.file_utils import walk_files
+from buddy.hashing import combine_leaf_digests, count_lines, digest_file, get_algorithms
+from buddy.parallel import imap_ordered
 
-class Md5sumValidator:
-    def __init__(self, test_name, input_file, expected_md5sum, comment=None):
+
+class ChecksumValidator:
+    """
+    `ChecksumValidator` compares the digest of a file, computed with a given
+    hashing algorithm, against an expected value.
+
+    Optionally, the expected size (in bytes) and number of lines of the file
+    can be given. These are checked, before the file is hashed, by
+    `passes_quick_checks`.
+    """
+
+    def __init__(
+        self,
+        test_name,
+        input_file,
+        expected_checksum,
+        algorithm="md5",
+        comment=None,
+        use_mmap=False,
+        expected_size=None,
+        expected_lines=None,
+    ):
         self.test_name = test_name
         self.input_file = input_file
-        self.expected_md5sum = expected_md5sum
-        self.test_type = "md5sum"
+        self.expected_checksum = expected_checksum
+        self.algorithm = algorithm
+        self.test_type = algorithm
         self.comment = comment
+        self.use_mmap = use_mmap
+        self.expected_size = expected_size
+        self.expected_lines = expected_lines
+        self.cache = None
+
+    def check_file_properties(self):
+        """
+        Check the properties of the input file that are cheap to obtain:
+        - does the file exist?
+        - does it have the expected size (if `expected_size` is set)?
+        - does it have the expected number of lines (if `expected_lines` is
+        set; this requires a read through the file, but no hashing)?
+
+        :return: A `ValidationResult`; the status is "pass", "missing",
+        "unreadable" (eg, the file can't be opened), "wrong_size" or
+        "wrong_line_count".
+        """
+        start = time.perf_counter()
+        bytes_read = 0
+        try:
+            file_stat = os.stat(self.input_file)
+            status = "pass"
+            if (
+                self.expected_size is not None
+                and file_stat.st_size != self.expected_size
+            ):
+                status = "wrong_size"
+            elif self.expected_lines is not None:
+                if count_lines(self.input_file) != self.expected_lines:
+                    status = "wrong_line_count"
+                bytes_read = file_stat.st_size
+        except FileNotFoundError:
+            status = "missing"
+        except OSError:
+            status = "unreadable"
+        return ValidationResult(
+            self,
+            status,
+            bytes_read=bytes_read,
+            seconds=time.perf_counter() - start,
+        )
+
+    def passes_quick_checks(self):
+        """
+        Does the input file pass the cheap checks (see
+        `check_file_properties`)?
+
+        :return: bool
+        """
+        return self.check_file_properties().is_valid
+
+    def check_checksum(self):
+        """
+        Compare the digest of the input file against the expected value.
+
+        :return: A `ValidationResult`; the status is "pass" or "fail", or
+        "missing" / "unreadable" if the file can't be read.
+        """
+        start = time.perf_counter()
+        try:
+            observed_checksum, bytes_read, is_cache_hit = self._observe_checksum()
+        except OSError as error:
+            return ValidationResult(
+                self,
+                _get_error_status(error),
+                seconds=time.perf_counter() - start,
+            )
+        seconds = time.perf_counter() - start
+        status = "pass" if observed_checksum == self.expected_checksum else "fail"
+        return ValidationResult(
+            self,
+            status,
+            observed_checksum=observed_checksum,
+            bytes_read=bytes_read,
+            seconds=seconds,
+            cache_hit=is_cache_hit,
+        )
+
+    def compute_checksum(self):
+        """
+        Compute the digest for the input file (memory-mapping the file if
+        `use_mmap` is set).
+        """
+        checksum, _ = self.compute_checksum_and_size()
+        return checksum
+
+    def compute_checksum_and_size(self):
+        """
+        Compute the digest for the input file, as for `compute_checksum`.
+
+        :return: A tuple (checksum, bytes_read); `bytes_read` is the number
+        of bytes that were hashed.
+        """
+        return get_checksum_and_size(
+            self.input_file, self.algorithm, self.comment, self.use_mmap
+        )
+
+    def get_observed_checksum(self):
+        """
+        Obtain the digest for the input file; this is taken from `cache` (a
+        `HashCache`) if one has been provided and the file is unchanged.
+        """
+        observed_checksum, _, _ = self._observe_checksum()
+        return observed_checksum
+
+    def _observe_checksum(self):
+        # Returns the digest for the input file, the number of bytes that were
+        # hashed, and whether the digest was taken from the cache
+        if self.cache is None:
+            checksum, bytes_read = self.compute_checksum_and_size()
+            return checksum, bytes_read, False
+
+        bytes_read = 0
+
+        def compute_checksum():
+            nonlocal bytes_read
+            checksum, bytes_read = self.compute_checksum_and_size()
+            return checksum
+
+        checksum, is_cache_hit = self.cache.get_digest_and_status(
+            self.input_file,
+            compute_checksum,
+            algorithm=self.algorithm,
+            comment=self.comment,
+        )
+        return checksum, bytes_read, is_cache_hit
 
     def is_valid(self):
-        return get_md5sum(self.input_file, self.comment) == self.expected_md5sum
+        return self.get_observed_checksum() == self.expected_checksum
 
     def __eq__(self, other):
         return (
-            self.test_name == other.test_name
+            type(self) is type(other)
+            and self.test_name == other.test_name
             and self.input_file == other.input_file
-            and self.expected_md5sum == other.expected_md5sum
+            and self.expected_checksum == other.expected_checksum
+            and self.algorithm == other.algorithm
             and self.comment == other.comment
+            and self.use_mmap == other.use_mmap
+            and self.expected_size == other.expected_size
+            and self.expected_lines == other.expected_lines
+        )
+
+
+class Md5sumValidator(ChecksumValidator):
+    """
+    `Md5sumValidator` compares the md5sum of a file against an expected value.
+    """
+
+    def __init__(
+        self,
+        test_name,
+        input_file,
+        expected_md5sum,
+        comment=None,
+        use_mmap=False,
+        expected_size=None,
+        expected_lines=None,
+    ):
+        super().__init__(
+            test_name,
+            input_file,
+            expected_md5sum,
+            algorithm="md5",
+            comment=comment,
+            use_mmap=use_mmap,
+            expected_size=expected_size,
+            expected_lines=expected_lines,
+        )
+        self.test_type = "md5sum"
+
+    @property
+    def expected_md5sum(self):
+        return self.expected_checksum
+
+
+class TreeValidator(ChecksumValidator):
+    """
+    `TreeValidator` compares a Merkle-style digest for all the files below a
+    directory against an expected value.
+
+    The digest of each file (a "leaf") is computed, in parallel if
+    `n_workers` > 1, and these are combined in sorted path order (see
+    `combine_leaf_digests`). If the expected leaves are provided, a mismatch
+    reports exactly which files differ.
+    """
+
+    def __init__(
+        self,
+        test_name,
+        input_dir,
+        expected_tree_checksum,
+        algorithm="md5",
+        comment=None,
+        use_mmap=False,
+        expected_leaves=None,
+        n_workers=1,
+        excluded_files=None,
+    ):
+        super().__init__(
+            test_name,
+            input_dir,
+            expected_tree_checksum,
+            algorithm=algorithm,
+            comment=comment,
+            use_mmap=use_mmap,
         )
+        self.test_type = "tree_" + algorithm
+        self.expected_leaves = expected_leaves
+        self.n_workers = n_workers
+        self.excluded_files = excluded_files
+
+    @property
+    def input_dir(self):
+        return self.input_file
+
+    def check_file_properties(self):
+        start = time.perf_counter()
+        status = "pass" if os.path.isdir(self.input_dir) else "missing"
+        return ValidationResult(self, status, seconds=time.perf_counter() - start)
+
+    def compute_leaves(self):
+        """
+        Compute the digest of every file below the input directory.
+
+        :return: A tuple (leaves, bytes_read, is_cache_hit); `leaves` maps
+        the relative path of each file to its digest, `bytes_read` is the
+        number of bytes that were hashed, and `is_cache_hit` is True if every
+        digest was taken from the cache.
+        """
+        return get_tree_leaves(
+            self.input_dir,
+            self.algorithm,
+            self.comment,
+            self.use_mmap,
+            self.n_workers,
+            self.cache,
+            self.excluded_files,
+        )
+
+    def compute_checksum_and_size(self):
+        leaves, bytes_read, _ = self.compute_leaves()
+        return combine_leaf_digests(leaves, self.algorithm), bytes_read
+
+    def _observe_checksum(self):
+        # The modification time of a directory doesn't change when the files
+        # in it are edited, so only the leaves are cached
+        checksum, bytes_read = self.compute_checksum_and_size()
+        return checksum, bytes_read, False
+
+    def find_differences(self, leaves):
+        """
+        The relative paths of the files that are missing, unexpected or have
+        a different digest; None if the expected leaves are not known.
+        """
+        if self.expected_leaves is None:
+            return None
+        return sorted(
+            relpath
+            for relpath in set(leaves) | set(self.expected_leaves)
+            if leaves.get(relpath) != self.expected_leaves.get(relpath)
+        )
+
+    def check_checksum(self):
+        start = time.perf_counter()
+        try:
+            leaves, bytes_read, is_cache_hit = self.compute_leaves()
+        except OSError as error:
+            return ValidationResult(
+                self,
+                _get_error_status(error),
+                seconds=time.perf_counter() - start,
+            )
+        observed_checksum = combine_leaf_digests(leaves, self.algorithm)
+        is_valid = observed_checksum == self.expected_checksum
+        return ValidationResult(
+            self,
+            "pass" if is_valid else "fail",
+            observed_checksum=observed_checksum,
+            bytes_read=bytes_read,
+            seconds=time.perf_counter() - start,
+            cache_hit=is_cache_hit,
+            differences=None if is_valid else self.find_differences(leaves),
+        )
+
+    def __eq__(self, other):
+        return (
+            super().__eq__(other)
+            and self.expected_leaves == other.expected_leaves
+            and self.n_workers == other.n_workers
+            and self.excluded_files == other.excluded_files
+        )
+
+
+def _get_error_status(error):
+    # The status of a validation test for a file that couldn't be read
+    return "missing" if isinstance(error, FileNotFoundError) else "unreadable"
+
+
+def _hash_leaf(arguments):
+    # Returns the digest of a file, the number of bytes that were hashed, and
+    # whether the digest was taken from the cache
+    filepath, algorithm, comment, use_mmap, cache = arguments
+    bytes_read = 0
+
+    def compute_digest():
+        nonlocal bytes_read
+        digest, bytes_read = get_checksum_and_size(
+            filepath, algorithm, comment, use_mmap
+        )
+        return digest
+
+    if cache is None:
+        digest, is_cache_hit = compute_digest(), False
+    else:
+        digest, is_cache_hit = cache.get_digest_and_status(
+            filepath, compute_digest, algorithm, comment
+        )
+    return digest, bytes_read, is_cache_hit
+
+
+def get_tree_leaves(
+    input_dir,
+    algorithm="md5",
+    comment=None,
+    use_mmap=False,
+    n_workers=1,
+    cache=None,
+    excluded=None,
+):
+    """
+    Compute the digest of every file below a directory (`.git` directories
+    are skipped, and symlinks to directories are not followed).
+
+    :param input_dir: A path to a directory.
+    :param algorithm: The name of the hashing algorithm.
+    :param comment: The comment character for the files.
+    :param use_mmap: Should the files be memory-mapped when hashing?
+    :param n_workers: The number of files to hash concurrently (in a pool of
+    threads).
+    :param cache: A `HashCache` for the file digests, or None.
+    :param excluded: The paths of files to skip, relative to `input_dir` and
+    with "/" separators, or None.
+    :return: A tuple (leaves, bytes_read, is_cache_hit); `leaves` maps the
+    path of each file, relative to `input_dir` and with "/" separators, to its
+    digest.
+    """
+    excluded = set(excluded or [])
+    relpaths = {
+        filepath: os.path.relpath(filepath, input_dir).replace(os.sep, "/")
+        for filepath in walk_files(input_dir)
+    }
+    filepaths = [
+        filepath for filepath, relpath in relpaths.items() if relpath not in excluded
+    ]
+    hashed = imap_ordered(
+        _hash_leaf,
+        [(filepath, algorithm, comment, use_mmap, cache) for filepath in filepaths],
+        n_workers,
+    )
+    leaves = {}
+    bytes_read = 0
+    is_cache_hit = True
+    for filepath, (digest, n_bytes, is_leaf_cache_hit) in zip(filepaths, hashed):
+        leaves[relpaths[filepath]] = digest
+        bytes_read += n_bytes
+        is_cache_hit = is_cache_hit and is_leaf_cache_hit
+    return leaves, bytes_read, is_cache_hit
+
+
+class ValidationResult:
+    """
+    `ValidationResult` records the outcome of running a validation test on a
+    file, and how long that took.
+    """
+
+    FIELDS = [
+        "test_name",
+        "test_type",
+        "input_file",
+        "status",
+        "observed_checksum",
+        "bytes_read",
+        "seconds",
+        "mb_per_second",
+        "cache_hit",
+        "differences",
+    ]
+
+    def __init__(
+        self,
+        validator,
+        status,
+        observed_checksum=None,
+        bytes_read=0,
+        seconds=0.0,
+        cache_hit=False,
+        differences=None,
+    ):
+        self.test_name = validator.test_name
+        self.test_type = validator.test_type
+        self.input_file = validator.input_file
+        self.status = status
+        self.observed_checksum = observed_checksum
+        self.bytes_read = bytes_read
+        self.seconds = seconds
+        self.cache_hit = cache_hit
+        # the files that differ from expectation, for directory-tree tests
+        self.differences = differences
+
+    @property
+    def is_valid(self):
+        return self.status == "pass"
+
+    @property
+    def mb_per_second(self):
+        """
+        The rate at which the file was read, or None if it wasn't read
+        """
+        if self.bytes_read == 0 or self.seconds <= 0:
+            return None
+        return self.bytes_read / (1 << 20) / self.seconds
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+def define_validator(test_name, details):
+    """
+    Make a Validator object from the definition of a validation test.
+
+    The definition should contain an `input_file` and exactly one expected
+    checksum. The expected checksum determines the type of the validator:
+    `expected_md5sum` gives an `Md5sumValidator`, and `expected_<algorithm>`
+    (eg, `expected_blake2b`, `expected_sha256`) gives a `ChecksumValidator`
+    that uses that algorithm.
+
+    A whole directory can be checked by giving an `input_dir` and an
+    `expected_tree_<algorithm>` (eg, `expected_tree_md5`); this gives a
+    `TreeValidator`.
+
+    :param test_name: The name of the validation test.
+    :param details: A dictionary of the arguments for the validation test.
+    :return: A Validator object.
+    """
+    algorithms = get_algorithms()
+    checksum_keys = [
+        key
+        for key in details
+        if key == "expected_md5sum"
+        or (key.startswith("expected_") and key[len("expected_") :] in algorithms)
+        or (
+            key.startswith("expected_tree_")
+            and key[len("expected_tree_") :] in algorithms
+        )
+    ]
+    if len(checksum_keys) != 1:
+        raise ValueError(
+            "Validation test '{}' should define exactly one of: {}".format(
+                test_name,
+                ", ".join(
+                    ["expected_md5sum"]
+                    + ["expected_" + x for x in algorithms]
+                    + ["expected_tree_" + x for x in algorithms]
+                ),
+            )
+        )
+
+    checksum_key = checksum_keys[0]
+    if checksum_key.startswith("expected_tree_"):
+        arguments = {k: v for k, v in details.items() if k != checksum_key}
+        return TreeValidator(
+            test_name=test_name,
+            expected_tree_checksum=details[checksum_key],
+            algorithm=checksum_key[len("expected_tree_") :],
+            **arguments
+        )
+
+    if checksum_key == "expected_md5sum":
+        return Md5sumValidator(test_name=test_name, **details)
+
+    arguments = {k: v for k, v in details.items() if k != checksum_key}
+    return ChecksumValidator(
+        test_name=test_name,
+        expected_checksum=details[checksum_key],
+        algorithm=checksum_key[len("expected_") :],
+        **arguments
+    )
+
+
+def get_checksum(filepath, algorithm="md5", comment=None, use_mmap=False):
+    """
+    Compute the digest for a file using a given hashing algorithm.
+
+    :param filepath: a path to a file, a string.
+    :param algorithm: the name of the hashing algorithm (eg, "md5", "sha256",
+    "blake2b").
+    :param comment: the comment character for the file; all lines that start
+    with this character will be disregarded. Comment lines are only dropped
+    from text files; a file that isn't valid UTF-8 is hashed byte-for-byte.
+    :param use_mmap: should the file be memory-mapped, rather than read into
+    a buffer? This is typically faster for very large files.
+
+    :return: the hex-digest for the file, as a string
+    """
+    checksum, _ = get_checksum_and_size(filepath, algorithm, comment, use_mmap)
+    return checksum
+
+
+def get_checksum_and_size(filepath, algorithm="md5", comment=None, use_mmap=False):
+    """
+    Compute the digest for a file, as for `get_checksum`, and count the bytes
+    that were hashed.
+
+    :return: a tuple (checksum, bytes_read)
+    """
+    return digest_file(filepath, algorithm, comment, use_mmap)
 
 
-def get_md5sum(filepath, comment=None):
+def get_md5sum(filepath, comment=None, use_mmap=False):
     """
     Compute the md5 sum for a file.
     If `comment` is specified, ignore all lines of the file that start with
@@ -29,28 +560,11 @@ def get_md5sum(filepath, comment=None):
 
     :param filepath: a path to a file, a string.
     :param comment: the comment character for the file; all lines that start
-    with this character will be disregarded.
+    with this character will be disregarded. Comment lines are only dropped
+    from text files; a file that isn't valid UTF-8 is hashed byte-for-byte.
+    :param use_mmap: should the file be memory-mapped, rather than read into
+    a buffer? This is typically faster for very large files.
 
     :return: the md5sum for the file, as a string
     """
-    my_predicate = lambda x: True
-    if comment is not None:
-        my_predicate = lambda x: not x.startswith(comment)
-
-    try:
-        # We assume the file isn't binary
-        my_hash = hashlib.md5()
-        with open(filepath, "r") as f:
-            for line in filter(my_predicate, f):
-                my_hash.update(line.encode("utf-8"))
-    except UnicodeDecodeError:
-        # If there are any encoding errors, we try treating the file as if it's
-        # binary
-        my_hash = hashlib.md5()
-        with open(filepath, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                my_hash.update(chunk)
-    except:
-        raise
-
-    return my_hash.hexdigest()
+    return get_checksum(filepath, "md5", comment, use_mmap)
@@ -1,5 +1,25 @@
-from buddy.validation_classes import Md5sumValidator
-from buddy.file_utils import read_yaml
+import itertools
+
+from buddy.validation_classes import define_validator
+from buddy.file_utils import iter_yaml_mapping, read_yaml
+from buddy.parallel import imap_ordered
+
+# module-level, so that they can be pickled when using a process pool
+
+
+def _check_file_properties(validator):
+    return validator.check_file_properties()
+
+
+def _check_checksum(validator):
+    return validator.check_checksum()
+
+
+def _check_file(validator):
+    result = validator.check_file_properties()
+    if not result.is_valid:
+        return result
+    return validator.check_checksum()
 
 
 class ValidationWorkflow:
@@ -23,7 +43,7 @@ class ValidationWorkflow:
         return cls(cls.parse_validator_details(yaml_dictionary))
 
     @classmethod
-    def from_yaml_file(cls, yaml_file):
+    def from_yaml_file(cls, yaml_file, stream=False):
         """
         User can make a ValidationWorkflow from a yaml-file that defines the
         validation tests to be applied within that Workflow.
@@ -33,27 +53,152 @@ class ValidationWorkflow:
             test1:
                 input_file: some_file
                 expected_md5sum: some_hash_code
+        :param stream: Should the validation tests be read from the file one
+        at a time, as they are ran? (see `StreamedValidationWorkflow`)
 
         :return: A ValidationWorkflow object.
         """
+        if stream:
+            return StreamedValidationWorkflow(yaml_file)
         return cls.from_yaml_dict(read_yaml(yaml_file))
 
-    def get_failing_validators(self):
-        return {k: v for k, v in self.validators.items() if not v.is_valid()}
-
-    def format_failure_report(self):
-        def format_single_failure(validator):
-            return "\t".join(
-                [
-                    "[FAILURE]",
-                    "test_name:{}".format(validator.test_name),
-                    "test_type:{}".format(validator.test_type),
-                    "input_file:{}".format(validator.input_file),
-                ]
+    def use_cache(self, cache):
+        """
+        Store and reuse the digests computed by each validator in a cache.
+
+        :param cache: A `HashCache` object, or None to stop using a cache.
+        """
+        for validator in self.validators.values():
+            validator.cache = cache
+
+    def iter_validators(self):
+        """
+        :return: An iterator over the Validator objects, in the order that
+        they are stored in the workflow.
+        """
+        return iter(self.validators.values())
+
+    def iter_results(
+        self, n_workers=1, use_processes=False, quick=False, max_failures=None
+    ):
+        """
+        Run each of the validation tests, yielding the `ValidationResult` for
+        each test as soon as it has completed.
+
+        The tests are ran in two tiers. First, the cheap checks (does each file
+        exist, and have the expected size / number of lines) are ran for every
+        validator; the results for any that fail are yielded immediately.
+        Then, the files that passed the cheap checks are hashed. Within each
+        tier, results are yielded in the order that the validators are stored
+        in the workflow.
+
+        If the caller stops iterating, no further tests are started.
+
+        :param n_workers: The number of validation tests to run concurrently.
+        :param use_processes: Run the tests in a pool of processes, rather
+        than a pool of threads.
+        :param quick: Only run the cheap checks; don't hash any files.
+        :param max_failures: Stop running the tests once this many have failed
+        (None: run all the tests).
+        :return: A generator over `ValidationResult` objects.
+        """
+        results = self._iter_tiered_results(n_workers, use_processes, quick)
+        n_failures = 0
+        for result in results:
+            yield result
+            if not result.is_valid:
+                n_failures += 1
+                if max_failures is not None and n_failures >= max_failures:
+                    results.close()
+                    return
+
+    def _iter_tiered_results(self, n_workers, use_processes, quick):
+        validators = list(self.validators.values())
+        quick_results = imap_ordered(
+            _check_file_properties, validators, n_workers, use_processes
+        )
+        if quick:
+            yield from quick_results
+            return
+
+        to_hash = []
+        for validator, result in zip(validators, quick_results):
+            if result.is_valid:
+                to_hash.append(validator)
+            else:
+                yield result
+        yield from imap_ordered(_check_checksum, to_hash, n_workers, use_processes)
+
+    def iter_failing_validators(self, n_workers=1, use_processes=False, quick=False):
+        """
+        Run each of the validation tests, yielding each failing validator as
+        soon as its test has completed (see `iter_results`).
+
+        :return: A generator over the failing Validator objects.
+        """
+        validators = {v.test_name: v for v in self.validators.values()}
+        for result in self.iter_results(n_workers, use_processes, quick):
+            if not result.is_valid:
+                yield validators[result.test_name]
+
+    def get_failing_validators(self, n_workers=1, use_processes=False, quick=False):
+        """
+        Run each of the validation tests and return those that fail.
+
+        :param n_workers: The number of validation tests to run concurrently.
+        :param use_processes: Run the tests in a pool of processes, rather
+        than a pool of threads.
+        :param quick: Only run the cheap checks; don't hash any files.
+        :return: A dictionary containing the failing Validator objects, in the
+        same order as they are stored in the workflow.
+        """
+        failures = {
+            validator.test_name
+            for validator in self.iter_failing_validators(
+                n_workers, use_processes, quick
             )
+        }
+        return {k: v for k, v in self.validators.items() if v.test_name in failures}
+
+    @staticmethod
+    def format_failure(validator):
+        """
+        Format the report line for a failing validator (or for its
+        `ValidationResult`; for a directory-tree test, this includes the
+        files that differ from expectation, if they are known).
+        """
+        fields = [
+            "[FAILURE]",
+            "test_name:{}".format(validator.test_name),
+            "test_type:{}".format(validator.test_type),
+            "input_file:{}".format(validator.input_file),
+        ]
+        differences = getattr(validator, "differences", None)
+        if differences:
+            fields.append("differing_files:{}".format(",".join(differences)))
+        return "\t".join(fields)
 
-        failures = self.get_failing_validators()
-        return "\n".join(map(format_single_failure, failures.values()))
+    def iter_failure_report(
+        self, n_workers=1, use_processes=False, quick=False, max_failures=None
+    ):
+        """
+        Yield a report line for each failing validation test, as soon as the
+        test has completed.
+
+        :param max_failures: Stop running the tests once this many have failed
+        (None: run all the tests).
+        :return: A generator over the lines of the report.
+        """
+        for result in self.iter_results(n_workers, use_processes, quick, max_failures):
+            if not result.is_valid:
+                yield self.format_failure(result)
+
+    def format_failure_report(
+        self, n_workers=1, use_processes=False, quick=False, max_failures=None
+    ):
+        return "\n".join(
+            self.iter_failure_report(n_workers, use_processes, quick, max_failures)
+        )
 
     @staticmethod
     def parse_validator_details(yaml_dictionary):
@@ -62,6 +207,18 @@ class ValidationWorkflow:
         objects that can be used to apply those tests.
         - To compare md5sum between a file and a string, one of the keys must
         be `expected_md5sum` and another must be `input_file`.
+        - Other hashing algorithms can be used by replacing `expected_md5sum`
+        with `expected_<algorithm>`, eg, `expected_blake2b` or
+        `expected_sha256`.
+        - Optionally, `comment` gives a comment-character (lines starting with
+        this are not hashed) and `use_mmap: true` requests that the file be
+        memory-mapped while hashing (this is faster for very large files).
+        - Optionally, `expected_size` (in bytes) and `expected_lines` define
+        cheap checks that are ran before hashing the file.
+        - To compare a whole directory, give `input_dir` and
+        `expected_tree_<algorithm>` (optionally, with the per-file digests in
+        `expected_leaves` and the number of files to hash concurrently in
+        `n_workers`).
 
         :param yaml_dictionary: A dictionary that defines a set of validation
         tests. This should be of the form: {test1: {input_file: ...,
@@ -70,8 +227,63 @@ class ValidationWorkflow:
         dictionary, a Validator object.
         """
 
-        validators = {
-            k: Md5sumValidator(test_name=k, **v) for k, v in yaml_dictionary.items()
-        }
+        validators = {k: define_validator(k, v) for k, v in yaml_dictionary.items()}
 
         return validators
+
+
+class StreamedValidationWorkflow(ValidationWorkflow):
+    """
+    A ValidationWorkflow whose validation tests are read from a yaml file one
+    at a time, as the tests are ran; so only the few validators that are
+    in-flight are held in memory, rather than one for every test in the file.
+
+    Each file's cheap checks and hashing are ran together, so the results are
+    yielded in the order of the yaml file, rather than in two tiers.
+    """
+
+    def __init__(self, yaml_file):
+        self.yaml_file = yaml_file
+        self.cache = None
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, StreamedValidationWorkflow)
+            and self.yaml_file == other.yaml_file
+        )
+
+    def use_cache(self, cache):
+        self.cache = cache
+
+    def iter_validators(self):
+        for test_name, details in iter_yaml_mapping(self.yaml_file):
+            validator = define_validator(test_name, details)
+            validator.cache = self.cache
+            yield validator
+
+    def _iter_tiered_results(self, n_workers, use_processes, quick):
+        return self._imap_checks(
+            self.iter_validators(), n_workers, use_processes, quick
+        )
+
+    @staticmethod
+    def _imap_checks(validators, n_workers, use_processes, quick):
+        check = _check_file_properties if quick else _check_file
+        return imap_ordered(check, validators, n_workers, use_processes)
+
+    def iter_failing_validators(self, n_workers=1, use_processes=False, quick=False):
+        # the validators are read from the file once; `tee` only holds those
+        # that have been submitted but whose results haven't been reached
+        validators, to_check = itertools.tee(self.iter_validators())
+        results = self._imap_checks(to_check, n_workers, use_processes, quick)
+        for validator, result in zip(validators, results):
+            if not result.is_valid:
+                yield validator
+
+    def get_failing_validators(self, n_workers=1, use_processes=False, quick=False):
+        return {
+            validator.test_name: validator
+            for validator in self.iter_failing_validators(
+                n_workers, use_processes, quick
+            )
+        }
@@ -3,3 +3,44 @@ import hashlib
 
 def empty_md5():
     return hashlib.md5("".encode("utf-8")).hexdigest()
+
+
+def legacy_md5sum(filepath, comment=None):
+    """
+    The original line-by-line implementation of `get_md5sum`; the hashing
+    engine should give identical digests.
+    """
+    my_predicate = lambda x: True
+    if comment is not None:
+        my_predicate = lambda x: not x.startswith(comment)
+
+    try:
+        my_hash = hashlib.md5()
+        with open(filepath, "r", encoding="utf-8") as f:
+            for line in filter(my_predicate, f):
+                my_hash.update(line.encode("utf-8"))
+    except UnicodeDecodeError:
+        my_hash = hashlib.md5()
+        with open(filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(4096), b""):
+                my_hash.update(chunk)
+
+    return my_hash.hexdigest()
+
+
+def file_contents_for_hashing_tests():
+    return [
+        b"",
+        b"some-data\n",
+        b"no trailing newline",
+        b"# comment\ndata\n# another comment\nmore data\n",
+        b"## double comment\n# single\n#\n\n##\n#",
+        b"data\r\n# comment\r\nmore\rdata\r",
+        b"\r\n\r\r\n\n#\r#x\r",
+        b"#" * 50 + b"\n" + b"x#" * 30,
+        "caf\xe9 # not a comment\n# caf\xe9\n☃\n".encode("utf-8"),
+        "abcd\xe91\n# comment\n".encode("latin-1"),
+        b"\x0a\x1b\x2c\x3d\x4e\x5f",
+        b"valid start\n# comment\r\n\xff\xfe invalid end",
+        "☃☃☃".encode("utf-8")[:-1],
+    ]
@@ -0,0 +1,140 @@
+import json
+import os
+import subprocess
+
+import pytest
+
+from buddy import env_probe
+from buddy.env_probe import (
+    EnvProbe,
+    find_executable,
+    package_is_installed,
+    read_conda_packages,
+    run_workflow,
+)
+
+
+@pytest.fixture
+def conda_env(tmpdir):
+    """A fake conda environment, with an `Rscript` and some conda packages"""
+    bin_dir = tmpdir.mkdir("env").mkdir("bin")
+    rscript = bin_dir.join("Rscript")
+    rscript.write("")
+    rscript.chmod(0o755)
+    conda_meta = tmpdir.join("env").mkdir("conda-meta")
+    for package in ["r-base-4.0.3-hddad469_3", "python-3.8.5-h7579374_1"]:
+        conda_meta.join(package + ".json").write("{}")
+    conda_meta.join("history").write("")
+    return tmpdir.join("env")
+
+
+@pytest.fixture(autouse=True)
+def no_subprocesses(mocker):
+    mocker.patch.object(subprocess, "run", side_effect=AssertionError)
+    mocker.patch.object(subprocess, "Popen", side_effect=AssertionError)
+
+
+class TestProbes(object):
+    def test_read_conda_packages(self, conda_env):
+        assert read_conda_packages(str(conda_env)) == {"r-base", "python"}
+
+    def test_read_conda_packages_without_conda_meta(self, tmpdir):
+        assert read_conda_packages(str(tmpdir)) == set()
+
+    def test_find_executable(self, conda_env):
+        environ = {"PATH": str(conda_env.join("bin"))}
+        assert find_executable("Rscript", environ) == str(
+            conda_env.join("bin", "Rscript")
+        )
+        assert find_executable("not_a_program", environ) is None
+
+    def test_package_is_installed(self, conda_env):
+        prefix = str(conda_env)
+        assert package_is_installed("r_base", prefix)
+        # `pytest` is installed for the active python, but not by conda
+        assert package_is_installed("pytest", prefix)
+        assert not package_is_installed("not-a-package", prefix)
+
+
+class TestEnvProbeCache(object):
+    def make_probe(self, conda_env, cache_file):
+        environ = {"CONDA_PREFIX": str(conda_env), "PATH": str(conda_env.join("bin"))}
+        return EnvProbe(cache_file=str(cache_file), environ=environ)
+
+    def test_results_are_reused_while_the_env_is_unchanged(self, conda_env, tmpdir):
+        cache_file = tmpdir.join("cache", "env_probe.json")
+        probe = self.make_probe(conda_env, cache_file)
+        assert probe.has_package("r-base")
+        assert probe.which("Rscript") == str(conda_env.join("bin", "Rscript"))
+        assert probe.n_probes == 2
+        probe.save()
+
+        rerun = self.make_probe(conda_env, cache_file)
+        assert rerun.has_package("R_Base")
+        assert rerun.which("Rscript") == str(conda_env.join("bin", "Rscript"))
+        assert rerun.n_probes == 0
+
+    def test_results_are_discarded_when_conda_meta_changes(self, conda_env, tmpdir):
+        cache_file = tmpdir.join("env_probe.json")
+        probe = self.make_probe(conda_env, cache_file)
+        assert not probe.has_package("buddy-test-package")
+        probe.save()
+
+        conda_meta = conda_env.join("conda-meta")
+        conda_meta.join("buddy-test-package-0.0.1-0.json").write("{}")
+        os.utime(str(conda_meta), ns=(0, os.stat(str(conda_meta)).st_mtime_ns + 10**9))
+
+        rerun = self.make_probe(conda_env, cache_file)
+        assert rerun.has_package("buddy-test-package")
+        assert rerun.n_probes == 1
+
+    def test_results_for_other_envs_are_kept(self, conda_env, tmpdir):
+        cache_file = tmpdir.join("env_probe.json")
+        cache_file.write(json.dumps({"/some/other/env": {"packages": {}}}))
+        probe = self.make_probe(conda_env, cache_file)
+        probe.has_package("r-base")
+        probe.save()
+
+        assert set(json.loads(cache_file.read())) == {
+            "/some/other/env",
+            str(conda_env),
+        }
+
+    def test_an_unreadable_cache_is_ignored(self, conda_env, tmpdir):
+        cache_file = tmpdir.join("env_probe.json")
+        cache_file.write("not json")
+        probe = self.make_probe(conda_env, cache_file)
+        assert probe.has_package("r-base")
+        probe.save()
+        assert json.loads(cache_file.read())[str(conda_env)]["packages"] == {
+            "r-base": True
+        }
+
+    def test_nothing_is_cached_without_a_conda_env(self, tmpdir):
+        cache_file = tmpdir.join("env_probe.json")
+        probe = EnvProbe(cache_file=str(cache_file), environ={"PATH": ""})
+        assert probe.which("Rscript") is None
+        probe.save()
+        assert not cache_file.exists()
+
+
+class TestWorkflow(object):
+    def test_missing_package_or_executable(self, conda_env, tmpdir, mocker, capsys):
+        mocker.patch.dict(
+            os.environ,
+            {"CONDA_PREFIX": str(conda_env), "PATH": str(conda_env.join("bin"))},
+        )
+        cache_file = str(tmpdir.join("env_probe.json"))
+
+        assert run_workflow(["r-base"], ["Rscript"], cache_file)
+        assert not run_workflow(["r-base", "not-a-package"], [], cache_file)
+        assert not run_workflow([], ["not_a_program"], cache_file)
+        assert "package\tnot-a-package\tnot installed" in capsys.readouterr().out
+
+    def test_module_only_uses_the_standard_library(self):
+        with open(env_probe.__file__, "r") as file_handle:
+            assert "buddy" not in [
+                line.split()[1].split(".")[0]
+                for line in file_handle
+                if line.startswith(("import ", "from "))
+            ]
@@ -0,0 +1,144 @@
+import errno
+import os
+import os.path
+import stat
+
+import pytest
+import sh
+
+from buddy import file_copies
+from buddy.file_copies import ContentStore, copy_contents, copy_file, copy_tree
+
+
+def write_file(filepath, text):
+    directory = os.path.dirname(filepath)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(filepath, "w") as file_handle:
+        file_handle.write(text)
+
+
+def read_file(filepath):
+    with open(filepath) as file_handle:
+        return file_handle.read()
+
+
+def unsupported(source_handle, destination_handle, size):
+    raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+
+class TestCopyContents(object):
+    def test_copy_contents(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_file("a.txt", "a" * 100000)
+            method = copy_contents("a.txt", "b.txt")
+            assert method in ("reflink", "copy_file_range", "sendfile", "copy")
+            assert read_file("b.txt") == "a" * 100000
+
+    def test_unsupported_methods_fall_back(self, tmpdir, mocker):
+        with sh.pushd(tmpdir):
+            write_file("a.txt", "abc")
+            mocker.patch.object(
+                file_copies,
+                "_get_copy_methods",
+                return_value=[("reflink", unsupported), ("sendfile", unsupported)],
+            )
+            assert copy_contents("a.txt", "b.txt") == "copy"
+            assert read_file("b.txt") == "abc"
+
+    def test_existing_files_are_not_overwritten(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_file("a.txt", "abc")
+            write_file("b.txt", "keep me")
+            with pytest.raises(FileExistsError):
+                copy_contents("a.txt", "b.txt")
+            with pytest.raises(FileExistsError):
+                copy_file("a.txt", "b.txt")
+            assert read_file("b.txt") == "keep me"
+
+
+class TestContentStore(object):
+    def test_identical_files_are_stored_once(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_file("a/file.R", "x <- 1\n")
+            write_file("b/file.R", "x <- 1\n")
+            write_file("c/file.R", "x <- 2\n")
+            store = ContentStore("store")
+
+            paths = [store.add(os.path.join(x, "file.R")) for x in "abc"]
+            assert paths[0] == paths[1] != paths[2]
+            assert read_file(paths[0]) == "x <- 1\n"
+            assert not os.stat(paths[0]).st_mode & stat.S_IWUSR
+            stored = [files for _, _, files in os.walk("store") if files]
+            assert sum(len(files) for files in stored) == 2
+
+    def test_copies_without_hardlinks_bypass_the_store(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_file("original.txt", "abc")
+            os.chmod("original.txt", 0o750)
+            store = ContentStore("store")
+
+            copy_file("original.txt", "copy.txt", store)
+            assert read_file("copy.txt") == "abc"
+            assert stat.S_IMODE(os.stat("copy.txt").st_mode) == 0o750
+            assert not os.path.exists("store")
+
+            # the project's copy doesn't change when the original does
+            write_file("original.txt", "changed")
+            assert read_file("copy.txt") == "abc"
+
+    def test_no_store_across_filesystems(self, tmpdir, mocker):
+        with sh.pushd(tmpdir):
+            write_file("original.txt", "abc")
+            store = ContentStore("store")
+            mocker.patch.object(store, "can_link_to", return_value=False)
+
+            assert copy_file("original.txt", "copy.txt", store, hardlink=True) != (
+                "hardlink"
+            )
+            assert read_file("copy.txt") == "abc"
+            assert not os.path.exists(os.path.join("store", store.algorithm))
+
+    def test_hardlinked_copies(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_file("original.txt", "abc")
+            store = ContentStore("store")
+
+            assert copy_file("original.txt", "copy1.txt", store, hardlink=True) == (
+                "hardlink"
+            )
+            copy_file("original.txt", "copy2.txt", store, hardlink=True)
+            assert os.stat("copy1.txt").st_ino == os.stat("copy2.txt").st_ino
+            assert os.stat("copy1.txt").st_nlink == 3
+
+
+class TestCopyTree(object):
+    def test_trailing_separator_copies_the_contents(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_file("original/a.txt", "a")
+            copy_tree("original" + os.sep, "copy")
+            assert os.path.isfile(os.path.join("copy", "a.txt"))
+
+    def test_no_trailing_separator_copies_the_directory(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_file("original/a.txt", "a")
+            write_file("original/.git/HEAD", "ref")
+            write_file("original/sub/.gitignore", "*.o")
+            copy_tree("original", "copy")
+            assert os.path.isfile(os.path.join("copy", "original", "a.txt"))
+            assert not os.path.exists(os.path.join("copy", "original", ".git"))
+            assert os.path.isdir(os.path.join("copy", "original", "sub"))
+            assert not os.path.exists(
+                os.path.join("copy", "original", "sub", ".gitignore")
+            )
+
+    def test_symlinks_and_times_are_kept(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_file("original/a.txt", "a")
+            os.symlink("a.txt", os.path.join("original", "a.link"))
+            os.utime(os.path.join("original", "a.txt"), (1000000000, 1000000000))
+
+            n_files = copy_tree("original/", "copy", ContentStore("store"))
+            assert sum(n_files.values()) == 1
+            assert os.readlink(os.path.join("copy", "a.link")) == "a.txt"
+            assert os.stat(os.path.join("copy", "a.txt")).st_mtime == 1000000000
@@ -0,0 +1,161 @@
+import datetime
+import os
+
+import pytest
+import sh
+
+from textwrap import dedent
+
+from buddy import file_utils, validation_workflow
+from buddy.file_utils import iter_yaml_mapping, read_yaml
+from buddy.validation_workflow import ValidationWorkflow
+
+VALIDATION_YAML = dedent(
+    """
+    # some comment
+    test_1:
+        input_file: &shared some_file
+        expected_md5sum: 0123456789abcdef0123456789abcdef
+    test_2:
+        input_file: *shared
+        expected_sha256: "01234567"
+        expected_size: 12
+    test_3: {input_dir: some_dir, expected_tree_md5: abcdef}
+    """
+)
+
+
+@pytest.fixture
+def parse_counter(monkeypatch):
+    """Counts the number of times that a yaml file is parsed"""
+    calls = []
+    parse_yaml = file_utils._parse_yaml
+
+    def counting_parse_yaml(yaml_file):
+        calls.append(yaml_file)
+        return parse_yaml(yaml_file)
+
+    monkeypatch.setattr(file_utils, "_parse_yaml", counting_parse_yaml)
+    return calls
+
+
+class TestYamlCache(object):
+    def test_unchanged_file_is_not_parsed_again(self, tmpdir, parse_counter):
+        with sh.pushd(tmpdir):
+            with open("tests.yaml", "w") as f:
+                print(VALIDATION_YAML, file=f)
+
+            first = read_yaml("tests.yaml", cache_dir="cache")
+            second = read_yaml("tests.yaml", cache_dir="cache")
+
+            assert first == second == read_yaml("tests.yaml")
+            assert len(parse_counter) == 2
+            assert len(os.listdir("cache")) == 1
+
+    def test_modified_file_is_parsed_again(self, tmpdir, parse_counter):
+        with sh.pushd(tmpdir):
+            with open("tests.yaml", "w") as f:
+                print("a: 1", file=f)
+            assert read_yaml("tests.yaml", cache_dir="cache") == {"a": 1}
+
+            with open("tests.yaml", "w") as f:
+                print("a: 22", file=f)
+            assert read_yaml("tests.yaml", cache_dir="cache") == {"a": 22}
+            assert len(parse_counter) == 2
+
+    def test_cache_dir_from_the_environment(self, tmpdir, monkeypatch):
+        with sh.pushd(tmpdir):
+            with open("tests.yaml", "w") as f:
+                print("a: 1", file=f)
+            monkeypatch.setenv("BUDDY_YAML_CACHE", "env_cache")
+
+            assert read_yaml("tests.yaml") == {"a": 1}
+            assert len(os.listdir("env_cache")) == 1
+
+    def test_unmarshallable_contents_are_not_cached(self, tmpdir, parse_counter):
+        with sh.pushd(tmpdir):
+            with open("tests.yaml", "w") as f:
+                print("a: 2020-01-01", file=f)
+
+            for _ in range(2):
+                assert read_yaml("tests.yaml", cache_dir="cache") == {
+                    "a": datetime.date(2020, 1, 1)
+                }
+            assert len(parse_counter) == 2
+
+    def test_corrupt_cache_file_is_ignored(self, tmpdir):
+        with sh.pushd(tmpdir):
+            with open("tests.yaml", "w") as f:
+                print("a: 1", file=f)
+            read_yaml("tests.yaml", cache_dir="cache")
+            for cache_file in os.listdir("cache"):
+                with open(os.path.join("cache", cache_file), "wb") as f:
+                    f.write(b"not marshalled data")
+
+            assert read_yaml("tests.yaml", cache_dir="cache") == {"a": 1}
+
+    def test_empty_file(self, tmpdir):
+        with sh.pushd(tmpdir):
+            open("empty.yaml", "w").close()
+            assert read_yaml("empty.yaml", cache_dir="cache") == {}
+            assert read_yaml("empty.yaml", cache_dir="cache") == {}
+
+
+class TestStreamingYaml(object):
+    def test_entries_match_read_yaml(self, tmpdir):
+        with sh.pushd(tmpdir):
+            with open("tests.yaml", "w") as f:
+                print(VALIDATION_YAML, file=f)
+
+            entries = list(iter_yaml_mapping("tests.yaml"))
+
+            assert [key for key, _ in entries] == ["test_1", "test_2", "test_3"]
+            assert dict(entries) == read_yaml("tests.yaml")
+            assert entries[1][1]["input_file"] == "some_file"
+
+    def test_empty_file(self, tmpdir):
+        with sh.pushd(tmpdir):
+            with open("empty.yaml", "w") as f:
+                print("# only a comment\n---", file=f)
+            assert list(iter_yaml_mapping("empty.yaml")) == []
+
+    def test_file_without_a_mapping(self, tmpdir):
+        with sh.pushd(tmpdir):
+            with open("list.yaml", "w") as f:
+                print("- a\n- b", file=f)
+            with pytest.raises(ValueError):
+                list(iter_yaml_mapping("list.yaml"))
+
+    def test_streamed_workflow_matches_parsed_workflow(self, tmpdir):
+        with sh.pushd(tmpdir):
+            with open("tests.yaml", "w") as f:
+                print(VALIDATION_YAML, file=f)
+
+            streamed = ValidationWorkflow.from_yaml_file("tests.yaml", stream=True)
+            parsed = ValidationWorkflow.from_yaml_file("tests.yaml")
+            assert list(streamed.iter_validators()) == list(parsed.validators.values())
+            assert streamed.get_failing_validators() == parsed.get_failing_validators()
+
+    def test_streamed_workflow_reads_the_tests_as_they_are_ran(
+        self, tmpdir, monkeypatch
+    ):
+        defined = []
+        define_validator = validation_workflow.define_validator
+
+        def counting_define_validator(test_name, details):
+            defined.append(test_name)
+            return define_validator(test_name, details)
+
+        monkeypatch.setattr(
+            validation_workflow, "define_validator", counting_define_validator
+        )
+        with sh.pushd(tmpdir):
+            with open("tests.yaml", "w") as f:
+                print(VALIDATION_YAML, file=f)
+
+            workflow = ValidationWorkflow.from_yaml_file("tests.yaml", stream=True)
+            assert defined == []
+            results = list(workflow.iter_results(max_failures=1))
+
+        assert [result.test_name for result in results] == ["test_1"]
+        assert defined == ["test_1"]
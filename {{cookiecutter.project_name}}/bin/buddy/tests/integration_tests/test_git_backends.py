@@ -0,0 +1,57 @@
+import os
+
+import pytest
+import sh
+
+from buddy.git_backends import get_backend
+from buddy.git_classes import ExternalRepository
+from tests.integration_tests.test_setup_git_clones import commit_file_and_get_hash
+
+
+@pytest.fixture(params=["cli", "dulwich"])
+def backend(request):
+    if request.param == "dulwich":
+        pytest.importorskip("dulwich")
+    return get_backend(request.param)
+
+
+class TestGitBackends(object):
+    def test_resolve_commit(self, tmpdir, backend):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            commit_hash_1 = commit_file_and_get_hash("my_repo", "file1")
+            commit_hash_2 = commit_file_and_get_hash("my_repo", "file2")
+
+            assert backend.resolve_commit("my_repo", commit_hash_1) == commit_hash_1
+            assert backend.resolve_commit("my_repo", commit_hash_1[:8]) == commit_hash_1
+            assert backend.resolve_commit("my_repo", "f" * 40) is None
+            assert backend.resolve_commit("not_a_repo", commit_hash_1) is None
+            assert backend.head_sha1("my_repo") == commit_hash_2
+
+    def test_checkout(self, tmpdir, backend):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            commit_hash_1 = commit_file_and_get_hash("my_repo", "file1")
+            _ = commit_file_and_get_hash("my_repo", "file2")
+
+            backend.checkout("my_repo", commit_hash_1)
+            assert backend.head_sha1("my_repo") == commit_hash_1
+            assert os.path.isfile(os.path.join("my_repo", "file1"))
+            assert not os.path.isfile(os.path.join("my_repo", "file2"))
+
+            with pytest.raises(backend.errors):
+                backend.checkout("my_repo", "NOTAHASHCODE")
+
+    def test_external_repository(self, tmpdir, backend):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            commit_hash_1 = commit_file_and_get_hash("my_repo", "file1")
+            _ = commit_file_and_get_hash("my_repo", "file2")
+
+            repo = ExternalRepository(
+                "my_repo", commit_hash_1[:10], "my_copy", backend=backend
+            )
+            repo.clone()
+            repo.checkout()
+            assert repo.sha1_matches()
+            assert not os.path.isfile(os.path.join("my_copy", "file2"))
@@ -0,0 +1,107 @@
+import os
+import pickle
+
+import sh
+
+from buddy.hash_cache import HashCache
+from buddy.validation_classes import Md5sumValidator, get_md5sum
+from tests.integration_tests.data_for_md5sum_tests import empty_md5
+
+
+class TestHashCache(object):
+    def test_lookup_on_empty_cache(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.touch("some_file")
+            cache = HashCache("cache.sqlite")
+            assert cache.lookup("some_file") is None
+
+    def test_stored_digest_is_returned(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.touch("some_file")
+            cache = HashCache("cache.sqlite")
+            cache.store("some_file", "a" * 32)
+            assert cache.lookup("some_file") == "a" * 32
+            assert cache.lookup("some_file", algorithm="sha256") is None
+            assert cache.lookup("some_file", comment="#") is None
+
+    def test_cache_persists_between_instances(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.touch("some_file")
+            cache = HashCache(os.path.join(".sidekick", "cache", "hashes.sqlite"))
+            cache.store("some_file", "a" * 32)
+            cache.close()
+            assert HashCache(cache.cache_file).lookup("some_file") == "a" * 32
+
+    def test_modified_file_is_not_looked_up(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.touch("some_file")
+            cache = HashCache("cache.sqlite")
+            cache.store("some_file", "a" * 32)
+            with open("some_file", "w") as f:
+                print("some-data", file=f)
+            assert cache.lookup("some_file") is None
+
+    def test_digest_is_only_computed_once(self, tmpdir):
+        calls = []
+
+        def compute_digest():
+            calls.append(1)
+            return "a" * 32
+
+        with sh.pushd(tmpdir):
+            sh.touch("some_file")
+            cache = HashCache("cache.sqlite")
+            assert cache.get_digest("some_file", compute_digest) == "a" * 32
+            assert cache.get_digest("some_file", compute_digest) == "a" * 32
+            assert len(calls) == 1
+
+    def test_missing_files_are_evicted(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.touch("file1")
+            sh.touch("file2")
+            cache = HashCache("cache.sqlite")
+            cache.store("file1", "a" * 32)
+            cache.store("file2", "b" * 32)
+            os.remove("file2")
+            assert cache.evict_missing() == 1
+            assert cache.lookup("file1") == "a" * 32
+
+    def test_cache_can_be_pickled(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.touch("some_file")
+            cache = HashCache("cache.sqlite")
+            cache.store("some_file", "a" * 32)
+            copied_cache = pickle.loads(pickle.dumps(cache))
+            assert copied_cache.lookup("some_file") == "a" * 32
+
+
+class TestMd5sumValidatorWithCache(object):
+    def test_validator_stores_digest_in_cache(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.touch("empty_file")
+            validator = Md5sumValidator(
+                test_name="test1", input_file="empty_file", expected_md5sum=empty_md5()
+            )
+            validator.cache = HashCache("cache.sqlite")
+            assert validator.is_valid()
+            assert validator.cache.lookup("empty_file") == get_md5sum("empty_file")
+
+    def test_results_report_cache_hits(self, tmpdir):
+        with sh.pushd(tmpdir):
+            with open("some_file", "w") as f:
+                print("some-data", file=f)
+            validator = Md5sumValidator(
+                test_name="test1",
+                input_file="some_file",
+                expected_md5sum=get_md5sum("some_file"),
+            )
+            validator.cache = HashCache("cache.sqlite")
+
+            first = validator.check_checksum()
+            assert first.is_valid and not first.cache_hit
+            assert first.bytes_read == 10
+
+            second = validator.check_checksum()
+            assert second.is_valid and second.cache_hit
+            assert second.bytes_read == 0
+            assert second.observed_checksum == first.observed_checksum
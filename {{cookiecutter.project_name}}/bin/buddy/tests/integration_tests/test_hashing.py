@@ -0,0 +1,96 @@
+import hashlib
+
+import pytest
+import sh
+
+from buddy import hashing
+from buddy.hashing import HASHLIB_ALGORITHMS, digest_file, hash_file, hash_file_mmap
+from tests.integration_tests.data_for_md5sum_tests import (
+    file_contents_for_hashing_tests,
+    legacy_md5sum,
+)
+
+# The hashing engine reads files as raw bytes; it should give the same digests
+# as the original implementation (which read text files line-by-line) however
+# the file is split into buffers
+
+
+@pytest.mark.parametrize("contents", file_contents_for_hashing_tests())
+@pytest.mark.parametrize("comment", [None, "#", "##", "caf\xe9"])
+@pytest.mark.parametrize("buffer_size", [1, 2, 3, 5, 1 << 20])
+def test_digest_matches_line_by_line_digest(tmpdir, contents, comment, buffer_size):
+    with sh.pushd(tmpdir):
+        with open("some_file", "wb") as f:
+            f.write(contents)
+        assert hash_file(
+            "some_file", comment=comment, buffer_size=buffer_size
+        ) == legacy_md5sum("some_file", comment)
+
+
+@pytest.mark.parametrize("contents", file_contents_for_hashing_tests())
+@pytest.mark.parametrize("comment", [None, "#", "##", "caf\xe9"])
+@pytest.mark.parametrize("slice_size", [1, 2, 3])
+def test_buffers_are_checked_in_slices(
+    tmpdir, monkeypatch, contents, comment, slice_size
+):
+    monkeypatch.setattr(hashing, "TEXT_SLICE_SIZE", slice_size)
+    with sh.pushd(tmpdir):
+        with open("some_file", "wb") as f:
+            f.write(contents)
+        assert hash_file("some_file", comment=comment, buffer_size=7) == legacy_md5sum(
+            "some_file", comment
+        )
+
+
+@pytest.mark.parametrize("contents", file_contents_for_hashing_tests())
+@pytest.mark.parametrize("comment", [None, "#", "##"])
+@pytest.mark.parametrize("window_size", [1, 3, 1 << 24])
+def test_mmap_digest_matches_buffered_digest(tmpdir, contents, comment, window_size):
+    with sh.pushd(tmpdir):
+        with open("some_file", "wb") as f:
+            f.write(contents)
+        assert hash_file_mmap(
+            "some_file", comment=comment, window_size=window_size
+        ) == hash_file("some_file", comment=comment)
+
+
+class TestHashFile(object):
+    def test_binary_files_ignore_comments(self, tmpdir):
+        with sh.pushd(tmpdir):
+            contents = b"# comment\n\xff\xfe"
+            with open("binary_file", "wb") as f:
+                f.write(contents)
+            assert (
+                hash_file("binary_file", comment="#")
+                == hashlib.md5(contents).hexdigest()
+            )
+
+    def test_other_algorithms(self, tmpdir):
+        with sh.pushd(tmpdir):
+            with open("some_file", "wb") as f:
+                f.write(b"some-data\n")
+            assert (
+                hash_file("some_file", algorithm="sha256")
+                == hashlib.sha256(b"some-data\n").hexdigest()
+            )
+
+    @pytest.mark.parametrize("use_mmap", [False, True])
+    def test_digest_file_counts_the_bytes_read(self, tmpdir, use_mmap):
+        with sh.pushd(tmpdir):
+            contents = b"# comment\r\nsome-data\n"
+            with open("some_file", "wb") as f:
+                f.write(contents)
+            assert digest_file("some_file", comment="#", use_mmap=use_mmap) == (
+                hash_file("some_file", comment="#"),
+                len(contents),
+            )
+
+    def test_mmap_for_missing_file(self, tmpdir):
+        with sh.pushd(tmpdir):
+            with pytest.raises(FileNotFoundError):
+                hash_file_mmap("missing_file")
+
+    def test_listed_algorithms_match_hashlib(self):
+        assert set(HASHLIB_ALGORITHMS) == {
+            x for x in hashlib.algorithms_guaranteed if not x.startswith("shake_")
+        }
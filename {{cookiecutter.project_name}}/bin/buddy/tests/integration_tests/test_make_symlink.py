@@ -3,7 +3,12 @@ import os.path
 import pytest
 import sh
 
-from buddy.make_symlink import add_relative_symlink
+from buddy.make_symlink import (
+    add_relative_symlink,
+    make_links,
+    read_links_file,
+    run_workflow,
+)
 
 
 class TestLinkMaker(object):
@@ -99,3 +104,74 @@ class TestLinkMaker(object):
         with sh.pushd(tmpdir):
             with pytest.raises(FileNotFoundError):
                 add_relative_symlink("doesnt_exist.txt", "some_link")
+
+
+class TestLinksFile(object):
+    def test_read_text_links_file(self, tmpdir):
+        with sh.pushd(tmpdir):
+            with open("links.txt", "w") as file_handle:
+                file_handle.write(
+                    "# a comment\n\n  a.txt   subdir/a.link\n~/b.txt b.link\n"
+                )
+            assert read_links_file("links.txt") == [
+                ("a.txt", "subdir/a.link"),
+                (os.path.expanduser("~/b.txt"), "b.link"),
+            ]
+
+    def test_read_yaml_links_file(self, tmpdir):
+        with sh.pushd(tmpdir):
+            with open("links.yaml", "w") as file_handle:
+                file_handle.write("subdir/a.link: a.txt\nb.link: b.txt\n")
+            assert read_links_file("links.yaml") == [
+                ("a.txt", "subdir/a.link"),
+                ("b.txt", "b.link"),
+            ]
+
+    def test_all_unparseable_lines_are_reported(self, tmpdir):
+        with sh.pushd(tmpdir):
+            with open("links.txt", "w") as file_handle:
+                file_handle.write("a.txt\nb.txt b.link\nc.txt c d\n")
+            with pytest.raises(ValueError) as error:
+                read_links_file("links.txt")
+            assert "1: 'a.txt'" in str(error.value)
+            assert "3: 'c.txt c d'" in str(error.value)
+
+    def test_all_links_are_made_and_all_conflicts_are_reported(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.touch("a.txt", "b.txt", "c.txt")
+            pairs = [
+                ("a.txt", "subdir/a.link"),
+                ("missing.txt", "subdir/missing.link"),
+                ("subdir/a.link", "subdir/nested/a.link"),
+                ("b.txt", "c.txt"),
+                ("c.txt", "subdir/c.link"),
+            ]
+            failures = make_links(pairs)
+
+            assert [(target, link) for target, link, _ in failures] == [
+                ("missing.txt", "subdir/missing.link"),
+                ("b.txt", "c.txt"),
+            ]
+            assert isinstance(failures[0][2], FileNotFoundError)
+            assert isinstance(failures[1][2], FileExistsError)
+            assert os.readlink("subdir/a.link") == "../a.txt"
+            assert os.readlink("subdir/nested/a.link") == "../a.link"
+            assert os.readlink("subdir/c.link") == "../c.txt"
+
+    def test_each_directory_is_made_once(self, tmpdir, mocker):
+        with sh.pushd(tmpdir):
+            sh.touch("a.txt", "b.txt")
+            makedirs = mocker.patch("os.makedirs", wraps=os.makedirs)
+            assert make_links([("a.txt", "dir/a.link"), ("b.txt", "dir/b.link")]) == []
+            makedirs.assert_called_once_with("dir", exist_ok=True)
+
+    def test_workflow_reports_the_number_of_failures(self, tmpdir, capsys):
+        with sh.pushd(tmpdir):
+            sh.touch("a.txt")
+            with open("links.txt", "w") as file_handle:
+                file_handle.write("a.txt a.link\nb.txt b.link\nc.txt c.link\n")
+            assert run_workflow("links.txt") == 2
+            assert os.path.islink("a.link")
+            errors = capsys.readouterr().err
+            assert "b.link -> b.txt" in errors
+            assert "c.link -> c.txt" in errors
@@ -0,0 +1,116 @@
+import os
+
+import sh
+
+import buddy.record_expectations
+from buddy.hashing import hash_file
+from buddy.record_expectations import iter_input_files, record_expectations
+from buddy.validate_file_contents import run_workflow
+from buddy.validation_workflow import ValidationWorkflow
+
+
+def make_files(filepaths):
+    for filepath in filepaths:
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(filepath, "w") as f:
+            print("contents of {}".format(filepath), file=f)
+
+
+class TestIterInputFiles(object):
+    def test_directories_are_walked_in_sorted_order(self, tmpdir):
+        with sh.pushd(tmpdir):
+            make_files(["data/b.txt", "data/a/c.txt", "data/.git/HEAD", "other.txt"])
+            assert ["data/a/c.txt", "data/b.txt"] == list(iter_input_files(["data"]))
+
+    def test_globs_and_duplicates(self, tmpdir):
+        with sh.pushd(tmpdir):
+            make_files(["data/a.tsv", "data/sub/b.tsv", "data/c.txt"])
+            paths = ["data/**/*.tsv", "data/a.tsv", "data/c.txt"]
+            assert ["data/a.tsv", "data/sub/b.tsv", "data/c.txt"] == list(
+                iter_input_files(paths)
+            )
+
+
+class TestRecordExpectations(object):
+    def test_recorded_expectations_are_valid(self, tmpdir):
+        with sh.pushd(tmpdir):
+            make_files(["data/a.txt", "data/b c.txt", "results/d.tsv"])
+            n_entries = record_expectations(
+                ["data", "results/*.tsv"], "expectations.yaml", n_workers=2
+            )
+            assert n_entries == 3
+            assert not os.path.exists("expectations.yaml.partial")
+
+            workflow = ValidationWorkflow.from_yaml_file("expectations.yaml")
+            assert ["data/a.txt", "data/b c.txt", "results/d.tsv"] == list(
+                workflow.validators.keys()
+            )
+            assert {} == workflow.get_failing_validators()
+
+    def test_other_algorithms(self, tmpdir):
+        with sh.pushd(tmpdir):
+            make_files(["a.txt"])
+            record_expectations(["a.txt"], "expectations.yaml", algorithm="sha256")
+            validator = ValidationWorkflow.from_yaml_file(
+                "expectations.yaml"
+            ).validators["a.txt"]
+            assert validator.algorithm == "sha256"
+            assert validator.is_valid()
+
+    def test_only_new_or_changed_files_are_rehashed(self, tmpdir, monkeypatch):
+        hashed_files = []
+
+        def mock_hash_file(filepath, algorithm="md5"):
+            hashed_files.append(filepath)
+            return hash_file(filepath, algorithm)
+
+        monkeypatch.setattr(buddy.record_expectations, "hash_file", mock_hash_file)
+
+        with sh.pushd(tmpdir):
+            make_files(["data/a.txt", "data/b.txt"])
+            record_expectations(["data"], "expectations.yaml", cache_file="cache.db")
+            assert ["data/a.txt", "data/b.txt"] == hashed_files
+
+            del hashed_files[:]
+            make_files(["data/c.txt"])
+            with open("data/a.txt", "a") as f:
+                print("more data", file=f)
+            record_expectations(["data"], "expectations.yaml", cache_file="cache.db")
+            assert ["data/a.txt", "data/c.txt"] == hashed_files
+
+            workflow = ValidationWorkflow.from_yaml_file("expectations.yaml")
+            assert 3 == len(workflow.validators)
+            assert {} == workflow.get_failing_validators()
+
+    def test_directories_can_be_recorded_as_trees(self, tmpdir):
+        with sh.pushd(tmpdir):
+            make_files(["data/a.txt", "data/sub/b c.txt", "other.txt"])
+            n_entries = record_expectations(
+                ["other.txt", "data"], "expectations.yaml", tree=True
+            )
+            assert n_entries == 2
+
+            workflow = ValidationWorkflow.from_yaml_file("expectations.yaml")
+            tree_validator = workflow.validators["data"]
+            assert tree_validator.test_type == "tree_md5"
+            assert ["a.txt", "sub/b c.txt"] == sorted(tree_validator.expected_leaves)
+            assert {} == workflow.get_failing_validators()
+
+            make_files(["data/sub/b c.txt"])
+            with open("data/sub/b c.txt", "a") as f:
+                print("changed", file=f)
+            report = workflow.format_failure_report()
+            assert report.endswith("differing_files:sub/b c.txt")
+
+    def test_tree_excludes_its_own_yaml_and_cache(self, tmpdir):
+        with sh.pushd(tmpdir):
+            make_files(["d/a.txt", "d/sub/b.txt"])
+            record_expectations(["d"], "d/t.yaml", cache_file="d/c.sqlite", tree=True)
+
+            workflow = ValidationWorkflow.from_yaml_file("d/t.yaml")
+            assert ["a.txt", "sub/b.txt"] == sorted(
+                workflow.validators["d"].expected_leaves
+            )
+            assert 0 == run_workflow("d/t.yaml", cache_file="d/c.sqlite")
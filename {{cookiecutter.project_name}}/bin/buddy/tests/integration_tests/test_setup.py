@@ -0,0 +1,76 @@
+import os
+import os.path
+
+import sh
+
+from buddy.setup import SetupConfig, run_setup
+
+
+def write_file(filepath, text):
+    directory = os.path.dirname(filepath)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(filepath, "w") as file_handle:
+        file_handle.write(text)
+
+
+def write_config(config_dir, **contents):
+    filenames = {
+        "check_dirs": "check_these_dirs.yaml",
+        "links": "make_these_links.txt",
+        "make_dirs": "make_these_subdirs.txt",
+        "file_copies": "copy_these_files.txt",
+        "dir_copies": "copy_these_dirs.txt",
+        "repositories": "clone_these_repos.yaml",
+        "touch_files": "touch_these_files.txt",
+    }
+    for key, filename in filenames.items():
+        write_file(os.path.join(config_dir, filename), contents.get(key, "# empty\n"))
+
+
+class TestRunSetup(object):
+    def test_project_is_set_up(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_file("external/data/a.txt", "a")
+            write_file("external/lib/script.R", "x <- 1")
+            write_file("external/lib/.gitignore", "*.o")
+            write_file("external/file_to_copy.txt", "b")
+            write_config(
+                "config",
+                check_dirs="- external\n",
+                links="external/data ./data/ext\n",
+                make_dirs="# a comment\n./data/ext/subdir\n./results\n",
+                file_copies="external/file_to_copy.txt ./lib/copied.txt\n",
+                dir_copies="external/lib/ ./lib/external_lib\n",
+                touch_files="TODO.txt\n",
+            )
+            config = SetupConfig("config", environ={})
+
+            assert run_setup(config) == {}
+            assert os.readlink(os.path.join("data", "ext")) == "../external/data"
+            assert os.path.isdir(os.path.join("external", "data", "subdir"))
+            assert os.path.isdir("results")
+            assert os.path.isfile(os.path.join("lib", "copied.txt"))
+            assert os.path.isfile(os.path.join("lib", "external_lib", "script.R"))
+            assert not os.path.exists(os.path.join("lib", "external_lib", ".gitignore"))
+            assert os.path.isfile("TODO.txt")
+
+            # running setup again changes nothing
+            assert run_setup(SetupConfig("config", environ={})) == {}
+
+    def test_missing_external_dir_stops_dependent_steps(self, tmpdir, capsys):
+        with sh.pushd(tmpdir):
+            write_config("config", check_dirs="- not_a_dir\n", touch_files="TODO.txt\n")
+            failures = run_setup(SetupConfig("config", environ={}))
+
+            assert list(failures) == ["check_dirs"]
+            assert not os.path.exists("TODO.txt")
+            assert "[SKIPPED]\ttouch_files" in capsys.readouterr().err
+
+    def test_environment_overrides_config_files(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_config("config")
+            write_file("my_dirs.txt", "made_from_env\n")
+            config = SetupConfig("config", environ={"MAKE_DIRS_FILE": "my_dirs.txt"})
+
+            assert config.make_dirs == ["made_from_env"]
@@ -2,7 +2,13 @@ import sh
 import os
 import pytest
 
-from buddy.git_classes import ExternalRepository
+from buddy.git_classes import (
+    ExternalRepository,
+    GitMirrorCache,
+    LocalRepository,
+    read_head_sha1,
+)
+from buddy.setup_git_clones import run_workflow
 
 
 def commit_file_and_get_hash(repo_path, file_name):
@@ -62,6 +68,24 @@ class TestCheckoutEarlyCommit(object):
                 assert not os.path.isfile("file2")
 
 
+class TestCheckoutBranch(object):
+    @pytest.mark.parametrize("mirror_dir", [None, "mirrors"])
+    def test_clone_a_branch_by_name(self, tmpdir, mirror_dir):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            _ = commit_file_and_get_hash("my_repo", "file1")
+            sh.git("-C", "my_repo", "checkout", "-b", "feature")
+            commit_hash_2 = commit_file_and_get_hash("my_repo", "file2")
+            sh.git("-C", "my_repo", "checkout", "-")
+            mirror_cache = None if mirror_dir is None else GitMirrorCache(mirror_dir)
+
+            copied_repo = ExternalRepository("my_repo", "feature", "my_copy", mirror_cache)
+            copied_repo.clone()
+            copied_repo.checkout()
+            assert copied_repo.sha1_matches()
+            assert read_head_sha1("my_copy") == commit_hash_2
+
+
 class TestCheckoutInvalidHash(object):
     def test_checkout_invalid_hash(self, tmpdir):
         with sh.pushd(tmpdir):
@@ -75,8 +99,263 @@ class TestCheckoutInvalidHash(object):
             copied_repo = ExternalRepository(
                 repo_name, "NOTAHASHCODE", copied_repo_name
             )
-            copied_repo.clone()
-            assert os.path.isdir(copied_repo_name)
+            # the repository is only moved into place if the commit exists
+            with pytest.raises(ValueError):
+                copied_repo.clone()
+            assert not os.path.isdir(copied_repo_name)
+            assert os.path.isdir(copied_repo.staging_path())
 
             with pytest.raises(sh.ErrorReturnCode):
                 copied_repo.checkout()
+
+
+class TestConcurrentCloning(object):
+    def test_clones_are_made_and_failures_reported(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            commit_hash_1 = commit_file_and_get_hash("my_repo", "file1")
+            _ = commit_file_and_get_hash("my_repo", "file2")
+
+            with open("repos.yaml", "w") as f:
+                for name, commit in [
+                    ("copy1", commit_hash_1),
+                    ("copy2", "NOTAHASHCODE"),
+                    ("copy3", commit_hash_1),
+                ]:
+                    print(
+                        "{}:\n  url: my_repo\n  commit: '{}'\n  output: {}".format(
+                            name, commit, name
+                        ),
+                        file=f,
+                    )
+
+            failures = run_workflow("repos.yaml", n_workers=3)
+            assert ["copy2"] == list(failures.keys())
+            for name in ["copy1", "copy3"]:
+                assert os.path.isfile(os.path.join(name, "file1"))
+                assert not os.path.isfile(os.path.join(name, "file2"))
+
+
+class TestMirrorCache(object):
+    def test_clones_share_a_mirror(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            commit_hash_1 = commit_file_and_get_hash("my_repo", "file1")
+            url = "file://" + os.path.abspath("my_repo")
+            mirror_cache = GitMirrorCache("mirrors")
+
+            repo1 = ExternalRepository(url, commit_hash_1, "copy1", mirror_cache)
+            repo1.clone()
+            repo1.checkout()
+            mirror = mirror_cache.mirror_path(url)
+            assert os.path.isdir(mirror)
+            assert os.path.isfile(os.path.join("copy1", "file1"))
+            assert not os.path.isfile(
+                os.path.join("copy1", ".git", "objects", "info", "alternates")
+            )
+            origin = str(sh.git("-C", "copy1", "remote", "get-url", "origin")).strip()
+            assert origin == url
+
+            # new commits are fetched into the existing mirror
+            commit_hash_2 = commit_file_and_get_hash("my_repo", "file2")
+            repo2 = ExternalRepository(url, commit_hash_2, "copy2", mirror_cache)
+            repo2.clone()
+            repo2.checkout()
+            assert os.path.isfile(os.path.join("copy2", "file2"))
+            assert [mirror, mirror + ".lock"] == sorted(
+                os.path.join("mirrors", x) for x in os.listdir("mirrors")
+            )
+
+            # the clones don't depend on the mirror
+            sh.rm("-rf", "mirrors")
+            assert LocalRepository("copy1", commit_hash_1).sha1_matches()
+            sh.git("-C", "copy2", "fsck")
+
+    def test_known_commits_are_not_fetched_again(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            commit_hash_1 = commit_file_and_get_hash("my_repo", "file1")
+            url = "file://" + os.path.abspath("my_repo")
+            mirror_cache = GitMirrorCache("mirrors")
+            ExternalRepository(url, commit_hash_1, "copy1", mirror_cache).clone()
+            branch = str(sh.git("-C", "my_repo", "symbolic-ref", "--short", "HEAD"))
+
+            # the remote can't be reached, but the commit is in the mirror
+            sh.mv("my_repo", "moved_repo")
+            repo2 = ExternalRepository(url, commit_hash_1[:8], "copy2", mirror_cache)
+            repo2.clone()
+            assert repo2.sha1_matches()
+
+            # a branch may have moved, so the remote is fetched from
+            repo3 = ExternalRepository(url, branch.strip(), "copy3", mirror_cache)
+            with pytest.raises(sh.ErrorReturnCode):
+                repo3.clone()
+
+    def test_local_paths_are_keyed_by_absolute_path(self, tmpdir):
+        with sh.pushd(tmpdir):
+            os.mkdir("my_repo")
+            mirror_cache = GitMirrorCache("mirrors")
+            assert mirror_cache.mirror_path("my_repo") == mirror_cache.mirror_path(
+                os.path.abspath("my_repo")
+            )
+            assert mirror_cache.mirror_path("a/my_repo") != mirror_cache.mirror_path(
+                "b/my_repo"
+            )
+
+
+class TestShallowFetch(object):
+    def test_only_the_pinned_commit_is_fetched(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            _ = commit_file_and_get_hash("my_repo", "file1")
+            commit_hash_2 = commit_file_and_get_hash("my_repo", "file2")
+            _ = commit_file_and_get_hash("my_repo", "file3")
+            url = "file://" + os.path.abspath("my_repo")
+
+            repo = ExternalRepository(url, commit_hash_2, "my_copy", shallow=True)
+            assert not repo.sha1_matches()
+            repo.clone()
+            repo.checkout()
+            assert repo.sha1_matches()
+            assert os.path.isfile(os.path.join("my_copy", "file2"))
+            assert not os.path.isfile(os.path.join("my_copy", "file3"))
+            n_commits = str(sh.git("-C", "my_copy", "rev-list", "--count", "HEAD"))
+            assert n_commits.strip() == "1"
+
+    def test_abbreviated_commits_fall_back_to_a_full_clone(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            commit_hash_1 = commit_file_and_get_hash("my_repo", "file1")
+            _ = commit_file_and_get_hash("my_repo", "file2")
+
+            repo = ExternalRepository(
+                "my_repo", commit_hash_1[:10], "my_copy", shallow=True
+            )
+            repo.clone()
+            repo.checkout()
+            assert repo.sha1_matches()
+            n_commits = str(sh.git("-C", "my_copy", "rev-list", "--count", "--all"))
+            assert n_commits.strip() == "2"
+
+    def test_refused_fetch_falls_back_to_a_full_clone(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            commit_hash_1 = commit_file_and_get_hash("my_repo", "file1")
+
+            # an unknown commit can't be fetched, so everything is fetched
+            repo = ExternalRepository("my_repo", "f" * 40, "my_copy", shallow=True)
+            with pytest.raises(ValueError):
+                repo.clone()
+            staging_path = repo.staging_path()
+            assert LocalRepository(staging_path, commit_hash_1).sha1_matches() is False
+            n_commits = str(sh.git("-C", staging_path, "rev-list", "--count", "--all"))
+            assert n_commits.strip() == "1"
+
+    def test_shallow_repository_in_yaml_bypasses_the_mirror(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            _ = commit_file_and_get_hash("my_repo", "file1")
+            commit_hash_2 = commit_file_and_get_hash("my_repo", "file2")
+            url = "file://" + os.path.abspath("my_repo")
+            with open("repos.yaml", "w") as f:
+                print(
+                    "repo:\n  url: {}\n  commit: {}\n  output: my_copy\n"
+                    "  shallow: true".format(url, commit_hash_2),
+                    file=f,
+                )
+
+            assert {} == run_workflow("repos.yaml", mirror_dir="mirrors")
+            assert not os.path.exists("mirrors")
+            n_commits = str(sh.git("-C", "my_copy", "rev-list", "--count", "HEAD"))
+            assert n_commits.strip() == "1"
+
+
+class TestStagedClone(object):
+    def test_interrupted_clone_is_resumed(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            commit_hash_1 = commit_file_and_get_hash("my_repo", "file1")
+            commit_hash_2 = commit_file_and_get_hash("my_repo", "file2")
+
+            repo = ExternalRepository("my_repo", commit_hash_2, "my_copy")
+            assert repo.staging_path() == ".my_copy.partial"
+
+            # a previous attempt fetched the first commit, then stopped
+            sh.git("init", ".my_copy.partial")
+            sh.git("-C", ".my_copy.partial", "fetch", "../my_repo", commit_hash_1)
+            assert not repo.local_exists()
+
+            repo.clone()
+            assert repo.sha1_matches()
+            assert os.path.isfile(os.path.join("my_copy", "file2"))
+            assert not os.path.exists(".my_copy.partial")
+
+    def test_staging_directory_is_a_sibling(self):
+        repo = ExternalRepository("url", "a1b2c3d", os.path.join("lib", "pkg", ""))
+        assert repo.staging_path() == os.path.join("lib", ".pkg.partial")
+
+
+class TestReadHead(object):
+    def test_head_on_a_branch(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            commit_hash = commit_file_and_get_hash("my_repo", "file1")
+            assert read_head_sha1("my_repo") == commit_hash
+
+            # once the refs are packed, there are no loose refs
+            sh.git("-C", "my_repo", "pack-refs", "--all")
+            assert read_head_sha1("my_repo") == commit_hash
+
+    def test_detached_head(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            commit_hash_1 = commit_file_and_get_hash("my_repo", "file1")
+            _ = commit_file_and_get_hash("my_repo", "file2")
+            sh.git("-C", "my_repo", "checkout", commit_hash_1)
+            assert read_head_sha1("my_repo") == commit_hash_1
+
+    def test_worktree(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            commit_hash_1 = commit_file_and_get_hash("my_repo", "file1")
+            _ = commit_file_and_get_hash("my_repo", "file2")
+            sh.git("-C", "my_repo", "branch", "old", commit_hash_1)
+            sh.git("-C", "my_repo", "worktree", "add", "../my_worktree", "old")
+            assert read_head_sha1("my_worktree") == commit_hash_1
+
+    def test_not_a_repository(self, tmpdir):
+        with sh.pushd(tmpdir):
+            os.mkdir("not_a_repo")
+            assert read_head_sha1("not_a_repo") is None
+            assert read_head_sha1("missing") is None
+
+
+class TestAlreadySatisfied(object):
+    def test_rerunning_setup_makes_no_git_calls(self, tmpdir, mocker):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            commit_hash_1 = commit_file_and_get_hash("my_repo", "file1")
+            _ = commit_file_and_get_hash("my_repo", "file2")
+            with open("repos.yaml", "w") as f:
+                print(
+                    "copy1:\n  url: my_repo\n  commit: '{}'\n  output: copy1".format(
+                        commit_hash_1[:10]
+                    ),
+                    file=f,
+                )
+
+            assert run_workflow("repos.yaml") == {}
+            assert ExternalRepository("my_repo", commit_hash_1, "copy1").is_satisfied()
+
+            mocker.patch("sh.git")
+            assert run_workflow("repos.yaml") == {}
+            sh.git.assert_not_called()
+
+    def test_other_commits_are_not_satisfied(self, tmpdir):
+        with sh.pushd(tmpdir):
+            sh.git("init", "my_repo")
+            commit_hash_1 = commit_file_and_get_hash("my_repo", "file1")
+            commit_hash_2 = commit_file_and_get_hash("my_repo", "file2")
+            assert not ExternalRepository("x", commit_hash_1, "my_repo").is_satisfied()
+            assert ExternalRepository("x", commit_hash_2, "my_repo").is_satisfied()
+            assert not ExternalRepository("x", "master", "my_repo").is_satisfied()
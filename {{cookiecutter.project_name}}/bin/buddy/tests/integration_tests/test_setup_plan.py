@@ -0,0 +1,140 @@
+import os
+import os.path
+
+import sh
+
+from buddy.setup import SetupConfig, plan_setup, run_setup
+from buddy.setup_plan import FilesystemSnapshot, PlannedChange, plan_clones
+
+from tests.integration_tests.test_setup import write_config, write_file
+
+
+class TestFilesystemSnapshot(object):
+    def test_each_path_is_looked_up_once(self, tmpdir, mocker):
+        with sh.pushd(tmpdir):
+            write_file("a_dir/a_file", "a")
+            os.symlink("a_dir", "a_link")
+            lstat = mocker.patch("os.lstat", wraps=os.lstat)
+            stat = mocker.patch("os.stat", wraps=os.stat)
+            snapshot = FilesystemSnapshot()
+
+            for _ in range(3):
+                assert snapshot.isdir("a_dir")
+                assert snapshot.isdir("./a_dir/")
+                assert snapshot.isfile("a_dir/a_file")
+                assert snapshot.islink("a_link")
+                assert snapshot.isdir("a_link")
+                assert not snapshot.lexists("missing")
+                assert not snapshot.exists("missing")
+
+            # a link is looked up by both lstat and stat
+            looked_up = [("lstat", call[0][0]) for call in lstat.call_args_list] + [
+                ("stat", call[0][0]) for call in stat.call_args_list
+            ]
+            assert len(looked_up) == len(set(looked_up))
+            assert snapshot.n_lookups == len(looked_up)
+
+    def test_planned_paths(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_file("external/data/a.txt", "a")
+            snapshot = FilesystemSnapshot()
+            snapshot.plan("data/ext", "link", "../external/data")
+            snapshot.plan("new_dir", "dir")
+
+            assert snapshot.islink("data/ext")
+            assert snapshot.readlink("data/ext") == "../external/data"
+            assert snapshot.isdir("data/ext")
+            assert snapshot.isfile("data/ext/a.txt")
+            assert snapshot.isdir("new_dir")
+            assert not snapshot.lexists("new_dir/a_file")
+
+
+class TestPlanSetup(object):
+    def test_plan_lists_the_changes_that_setup_makes(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_file("external/data/a.txt", "a")
+            write_file("external/file_to_copy.txt", "b")
+            write_file("existing.txt", "c")
+            write_config(
+                "config",
+                check_dirs="- external\n",
+                links="external/data ./data/ext\nmissing.txt ./data/missing\n",
+                make_dirs="./data/ext/subdir\n./results\n",
+                file_copies=(
+                    "external/file_to_copy.txt ./lib/copied.txt\n"
+                    "missing.txt ./existing.txt\n"
+                ),
+                touch_files="lib/copied.txt\nTODO.txt\n",
+            )
+            config = SetupConfig("config", environ={})
+
+            changes = plan_setup(config)
+            assert changes == [
+                PlannedChange("make_links", "link", "./data/ext", "../external/data"),
+                PlannedChange(
+                    "make_links",
+                    "conflict",
+                    "./data/missing",
+                    "target is missing",
+                    is_conflict=True,
+                ),
+                PlannedChange("make_dirs", "mkdir", "./data/ext/subdir"),
+                PlannedChange("make_dirs", "mkdir", "./results"),
+                PlannedChange(
+                    "copy_files",
+                    "copy",
+                    "./lib/copied.txt",
+                    "external/file_to_copy.txt",
+                ),
+                PlannedChange("touch_files", "touch", "TODO.txt"),
+            ]
+            # nothing was changed
+            assert sorted(os.listdir(".")) == ["config", "existing.txt", "external"]
+
+            assert list(run_setup(config)) == ["make_links"]
+            assert os.path.islink(os.path.join("data", "ext"))
+
+    def test_plan_is_empty_once_setup_has_ran(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_file("external/data/a.txt", "a")
+            write_file("external/lib/script.R", "x <- 1")
+            write_config(
+                "config",
+                links="external/data ./data/ext\n",
+                make_dirs="./data/ext/subdir\n",
+                dir_copies="external/lib/ ./lib/external_lib\n",
+                touch_files="TODO.txt\n",
+            )
+            config = SetupConfig("config", environ={})
+            assert len(plan_setup(config)) == 4
+
+            assert run_setup(config) == {}
+            assert plan_setup(config) == []
+
+    def test_clones_are_checked_through_the_snapshot(self, tmpdir):
+        sha1 = "0123456789abcdef0123456789abcdef01234567"
+        with sh.pushd(tmpdir):
+            write_file("my_clone/.git/HEAD", sha1 + "\n")
+            write_config(
+                "config",
+                repositories=(
+                    "repo:\n"
+                    "  url: some_url\n"
+                    "  commit: {}\n"
+                    "  output: my_clone\n".format(sha1)
+                ),
+            )
+            config = SetupConfig("config", environ={})
+            snapshot = FilesystemSnapshot()
+
+            assert plan_clones(config, snapshot) == []
+            n_lookups = snapshot.n_lookups
+            assert n_lookups > 0
+
+            # the `.git` files are not read again
+            write_file("my_clone/.git/HEAD", "f" * 40 + "\n")
+            assert plan_clones(config, snapshot) == []
+            assert snapshot.n_lookups == n_lookups
+            assert plan_clones(config, FilesystemSnapshot()) == [
+                PlannedChange("clone_repos", "checkout", "my_clone", sha1)
+            ]
@@ -0,0 +1,157 @@
+import os
+import os.path
+import sys
+
+import pytest
+import sh
+
+from buddy.setup_subjobs import (
+    Subjob,
+    check_subjobs,
+    read_subjobs,
+    run_subjobs,
+    run_workflow,
+)
+
+# a setup command that records when it starts / finishes, and that fails for
+# any subjob that contains a file called "fail"
+SETUP_SCRIPT = """
+import os, sys, time
+with open("times.txt", "w") as f:
+    print(time.time(), file=f)
+    time.sleep(float(sys.argv[1]))
+    print(time.time(), file=f)
+print("setting up", os.path.basename(os.getcwd()))
+sys.exit(1 if os.path.exists("fail") else 0)
+"""
+
+
+def make_subjob(name, fail=False):
+    path = os.path.join("subjobs", name, "scripts")
+    os.makedirs(path)
+    open(os.path.join(path, "setup.sh"), "w").close()
+    if fail:
+        open(os.path.join("subjobs", name, "fail"), "w").close()
+
+
+def read_times(name):
+    with open(os.path.join("subjobs", name, "times.txt")) as file_handle:
+        return [float(line) for line in file_handle]
+
+
+def setup_command(seconds):
+    return [sys.executable, "-c", SETUP_SCRIPT, str(seconds)]
+
+
+class TestReadSubjobs(object):
+    def test_names_and_dependencies(self, tmpdir):
+        with sh.pushd(tmpdir):
+            with open("subjobs.txt", "w") as file_handle:
+                file_handle.write("# comment\n\na\nb: a\n  c : a b\n")
+            assert read_subjobs("subjobs.txt") == [
+                Subjob("a"),
+                Subjob("b", ["a"]),
+                Subjob("c", ["a", "b"]),
+            ]
+
+    def test_line_without_a_name(self, tmpdir):
+        with sh.pushd(tmpdir):
+            with open("subjobs.txt", "w") as file_handle:
+                file_handle.write("a\n: a\n")
+            with pytest.raises(ValueError):
+                read_subjobs("subjobs.txt")
+
+    def test_all_missing_subjobs_are_reported(self, tmpdir):
+        with sh.pushd(tmpdir):
+            make_subjob("a")
+            with pytest.raises(FileNotFoundError) as error:
+                check_subjobs([Subjob("a"), Subjob("b"), Subjob("c")])
+            assert "subjobs/b, subjobs/c" in str(error.value)
+
+
+class TestRunSubjobs(object):
+    def test_independent_subjobs_run_concurrently(self, tmpdir):
+        with sh.pushd(tmpdir):
+            subjobs = [Subjob("a"), Subjob("b"), Subjob("c")]
+            for subjob in subjobs:
+                make_subjob(subjob.name)
+
+            outcomes = run_subjobs(subjobs, n_workers=3, command=setup_command(0.5))
+
+            assert [status for status, _ in outcomes.values()] == ["OK"] * 3
+            starts = [read_times(name)[0] for name in "abc"]
+            ends = [read_times(name)[1] for name in "abc"]
+            assert max(starts) < min(ends)
+
+    def test_dependencies_finish_first(self, tmpdir):
+        with sh.pushd(tmpdir):
+            subjobs = [Subjob("a"), Subjob("b", ["a"]), Subjob("c")]
+            for subjob in subjobs:
+                make_subjob(subjob.name)
+
+            run_subjobs(subjobs, n_workers=3, command=setup_command(0.2))
+
+            assert read_times("a")[1] <= read_times("b")[0]
+            assert read_times("c")[0] < read_times("a")[1]
+
+    @pytest.mark.parametrize(
+        "subjobs",
+        [
+            [Subjob("a", ["not_a_subjob"])],
+            [Subjob("a", ["b"]), Subjob("b")],
+            [Subjob("a", ["b"]), Subjob("b", ["a"])],
+            [Subjob("a", ["a"])],
+            [Subjob("a"), Subjob("a")],
+        ],
+    )
+    def test_bad_dependencies_are_rejected(self, subjobs):
+        with pytest.raises(ValueError):
+            run_subjobs(subjobs, command=setup_command(0))
+
+    def test_dependents_of_a_failed_subjob_are_skipped(self, tmpdir, capsys):
+        with sh.pushd(tmpdir):
+            make_subjob("a", fail=True)
+            make_subjob("b")
+            make_subjob("c")
+            subjobs = [Subjob("a"), Subjob("b", ["a"]), Subjob("c")]
+
+            outcomes = run_subjobs(subjobs, n_workers=2, command=setup_command(0))
+
+            assert {name: status for name, (status, _) in outcomes.items()} == {
+                "a": "FAILED",
+                "b": "SKIPPED",
+                "c": "OK",
+            }
+            assert not os.path.exists(os.path.join("subjobs", "b", "times.txt"))
+            assert "setting up a" in capsys.readouterr().err
+
+    def test_workflow_reports_failures(self, tmpdir, capsys):
+        with sh.pushd(tmpdir):
+            make_subjob("a")
+            make_subjob("b", fail=True)
+            with open("subjobs.txt", "w") as file_handle:
+                file_handle.write("a\nb\n")
+
+            assert run_workflow("subjobs.txt", 2, setup_command(0)) == {"b": "FAILED"}
+            summary = capsys.readouterr().err
+            assert "a\tOK\t" in summary
+            assert "b\tFAILED\t" in summary
+
+    def test_nested_subjobs_are_set_up_serially(self, tmpdir, capsys, monkeypatch):
+        monkeypatch.setenv("BUDDY_SUBJOB_WORKERS", "4")
+        command = [
+            sys.executable,
+            "-c",
+            "import os; print('workers:', os.environ['BUDDY_SUBJOB_WORKERS'])",
+        ]
+        with sh.pushd(tmpdir):
+            make_subjob("a")
+            with open("subjobs.txt", "w") as file_handle:
+                file_handle.write("a\n")
+
+            assert run_workflow("subjobs.txt", 4, command) == {}
+            assert "workers: 1\n" in capsys.readouterr().err
+
+    def test_no_subjobs_file(self, tmpdir):
+        with sh.pushd(tmpdir):
+            assert run_workflow("subjobs.txt") == {}
@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+
+import sh
+
+SIDEKICK = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "sidekick.py"
+)
+
+
+def run_sidekick(*args):
+    """Run `sidekick` in a fresh interpreter; returns (status, imported modules)"""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", SIDEKICK] + list(args),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    modules = {
+        line.split("|")[-1].strip()
+        for line in process.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+    return process.returncode, modules
+
+
+def write_validation_yaml(md5sum):
+    with open("data.tsv", "w") as f:
+        print("gene\tsample\t0.1", file=f)
+    with open("tests.yaml", "w") as f:
+        print(
+            "test_data:\n  input_file: data.tsv\n  expected_md5sum: {}".format(md5sum),
+            file=f,
+        )
+
+
+class TestStartup(object):
+    def test_help_does_not_import_buddy(self):
+        status, modules = run_sidekick("--help")
+        assert status == 0
+        assert not {"buddy", "yaml"} & modules
+
+    def test_quick_validation_does_not_import_unused_modules(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_validation_yaml("0" * 32)
+            status, modules = run_sidekick(
+                "validate", "tests.yaml", "--quick", "--no-cache"
+            )
+
+        assert status == 0
+        assert "buddy.validate_file_contents" in modules
+        assert not {"hashlib", "sqlite3", "concurrent.futures", "subprocess"} & modules
+
+
+class TestExitStatus(object):
+    def test_validation_status_is_returned(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_validation_yaml("5c22ab96a92ef6ae58d95a71e79943f7")
+            assert run_sidekick("validate", "tests.yaml", "--no-cache")[0] == 0
+
+            write_validation_yaml("0" * 32)
+            assert run_sidekick("validate", "tests.yaml", "--no-cache")[0] == 1
+
+    def test_validation_runs_through_a_link_to_sidekick(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_validation_yaml("0" * 32)
+            os.symlink(os.path.realpath(SIDEKICK), "sidekick")
+            process = subprocess.run(
+                [sys.executable, "sidekick", "validate", "tests.yaml", "--no-cache"],
+                stdout=subprocess.PIPE,
+            )
+        assert process.returncode == 1
+        assert b"[FAILURE]" in process.stdout
+
+    def test_fail_fast_is_a_flag(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_validation_yaml("0" * 32)
+            status, _ = run_sidekick(
+                "validate", "--fail-fast", "tests.yaml", "--no-cache"
+            )
+        assert status == 1
+
+    def test_the_hash_cache_is_opt_in(self, tmpdir):
+        with sh.pushd(tmpdir):
+            write_validation_yaml("5c22ab96a92ef6ae58d95a71e79943f7")
+            assert run_sidekick("validate", "tests.yaml")[0] == 0
+            assert sorted(os.listdir(".")) == ["data.tsv", "tests.yaml"]
+
+            assert run_sidekick("validate", "tests.yaml", "--cache", "c.sqlite")[0] == 0
+            assert os.path.isfile("c.sqlite")
@@ -1,11 +1,12 @@
 import os
 import sh
+import time
 import pytest
 
 from textwrap import dedent
 from pytest_mock import mocker
 
-from buddy.validate_dir_existence import run_workflow
+from buddy.validate_dir_existence import check_dirs, check_dirs_exist, run_workflow
 
 
 class TestDirExistence(object):
@@ -104,3 +105,55 @@ class TestDirExistence(object):
                 print.assert_called_with(
                     "Don't use tilde `~` in dirnames in `validate_dir_existence.py`"
                 )
+
+
+class TestConcurrentDirChecks(object):
+    def test_all_missing_dirs_are_reported_together(self, tmpdir, capsys):
+        with sh.pushd(tmpdir):
+            os.makedirs("present")
+            open("a_file", "w").close()
+
+            with pytest.raises(FileNotFoundError) as e:
+                check_dirs_exist(["missing_1", "present", "a_file", "missing_2"])
+
+            assert e.value.filename == "missing_1, a_file, missing_2"
+            report = capsys.readouterr().err.splitlines()
+            assert [line.split("\t")[:2] for line in report] == [
+                ["MISSING", "missing_1"],
+                ["NOT_A_DIRECTORY", "a_file"],
+                ["MISSING", "missing_2"],
+            ]
+
+    def test_statuses_are_in_input_order_with_latencies(self, tmpdir):
+        with sh.pushd(tmpdir):
+            dirs = ["dir_{}".format(i) for i in range(20)]
+            for d in dirs[::2]:
+                os.makedirs(d)
+
+            statuses = check_dirs(dirs + dirs[:3], n_workers=4)
+
+            assert [x.path for x in statuses] == dirs
+            assert [x.is_ok for x in statuses] == [i % 2 == 0 for i in range(20)]
+            assert all(x.seconds >= 0 for x in statuses)
+
+    def test_a_hung_dir_does_not_block_the_other_checks(self, tmpdir, monkeypatch):
+        stat = os.stat
+
+        def slow_stat(path, *args, **kwargs):
+            if path == "hung_mount":
+                time.sleep(5)
+            return stat(path, *args, **kwargs)
+
+        with sh.pushd(tmpdir):
+            for d in ["dir_1", "dir_2"]:
+                os.makedirs(d)
+            monkeypatch.setattr(os, "stat", slow_stat)
+
+            start = time.perf_counter()
+            statuses = check_dirs(
+                ["hung_mount", "dir_1", "dir_2"], n_workers=1, timeout=0.2
+            )
+
+            assert time.perf_counter() - start < 2
+            assert [x.status for x in statuses] == ["TIMEOUT", "OK", "OK"]
+            assert statuses[0].seconds >= 0.2
@@ -1,11 +1,17 @@
+import hashlib
+import json
+
 import sh
 
 from textwrap import dedent
 from pytest_mock import mocker
 
-from buddy.validate_file_contents import run_workflow
+from buddy.validate_file_contents import define_command_arg_parser, run_workflow
 from tests.integration_tests.data_for_md5sum_tests import empty_md5
 
+DATA = "gene\tsample\tvalue\nABC1\ts1\t0.1\n"
+DATA_MD5 = hashlib.md5(DATA.encode("utf-8")).hexdigest()
+
 
 # The program
 # .. should not print anything if all validation tests pass
@@ -29,3 +35,103 @@ class TestMd5sumWorkflow(object):
             mocker.patch("builtins.print")
             run_workflow("config.yaml")
             print.assert_not_called()
+
+    def test_fail_fast_prints_first_failure_only(self, tmpdir, mocker):
+        yaml = dedent(
+            """
+            test1:
+                input_file: empty_file
+                expected_md5sum: {}
+            test2:
+                input_file: empty_file
+                expected_md5sum: {}
+            """
+        ).format("a" * 32, "b" * 32)
+
+        with sh.pushd(tmpdir):
+            sh.touch("empty_file")
+            with open("config.yaml", "w") as f:
+                print(yaml, file=f)
+
+            mocker.patch("builtins.print")
+            run_workflow("config.yaml", max_failures=1)
+            print.assert_called_once_with(
+                "[FAILURE]\ttest_name:test1\ttest_type:md5sum\tinput_file:empty_file",
+                flush=True,
+            )
+
+    def test_results_file_has_every_test(self, tmpdir, mocker):
+        yaml = dedent(
+            """
+            test1:
+                input_file: data_file
+                expected_md5sum: {}
+            test2:
+                input_file: data_file
+                expected_md5sum: {}
+            test3:
+                input_file: missing_file
+                expected_md5sum: {}
+            """
+        ).format(DATA_MD5, "b" * 32, DATA_MD5)
+
+        with sh.pushd(tmpdir):
+            with open("data_file", "w") as f:
+                f.write(DATA)
+            with open("config.yaml", "w") as f:
+                print(yaml, file=f)
+
+            mocker.patch("builtins.print")
+            n_failures = run_workflow("config.yaml", results_file="results.jsonl")
+            assert n_failures == 2
+
+            with open("results.jsonl") as f:
+                results = [json.loads(line) for line in f]
+            assert ["test3", "test1", "test2"] == [x["test_name"] for x in results]
+            assert ["missing", "pass", "fail"] == [x["status"] for x in results]
+            assert results[1]["observed_checksum"] == DATA_MD5
+            assert results[1]["bytes_read"] == len(DATA)
+            assert results[0]["observed_checksum"] is None
+            assert results[0]["bytes_read"] == 0
+
+    def test_results_can_be_written_as_tsv(self, tmpdir, mocker):
+        yaml = dedent(
+            """
+            test1:
+                input_file: data_file
+                expected_md5sum: {}
+            """
+        ).format(DATA_MD5)
+
+        with sh.pushd(tmpdir):
+            with open("data_file", "w") as f:
+                f.write(DATA)
+            with open("config.yaml", "w") as f:
+                print(yaml, file=f)
+
+            # the file is only read when its digest isn't in the cache
+            for bytes_read, cache_hit in [(str(len(DATA)), "false"), ("0", "true")]:
+                n_failures = run_workflow(
+                    "config.yaml", cache_file="cache.sqlite", results_file="results.tsv"
+                )
+                assert n_failures == 0
+                with open("results.tsv") as f:
+                    header, row = [line.rstrip("\n").split("\t") for line in f]
+                result = dict(zip(header, row))
+                assert result["status"] == "pass"
+                assert result["bytes_read"] == bytes_read
+                assert result["cache_hit"] == cache_hit
+
+
+class TestCommandArgs(object):
+    def test_fail_fast_does_not_take_the_yaml_file(self):
+        args = define_command_arg_parser().parse_args(["--fail-fast", "config.yaml"])
+        assert args.validate_yaml == ["config.yaml"]
+        assert args.fail_fast
+
+    def test_max_failures(self):
+        args = define_command_arg_parser().parse_args(
+            ["config.yaml", "--max-failures", "3"]
+        )
+        assert args.max_failures == 3
+        assert not args.fail_fast
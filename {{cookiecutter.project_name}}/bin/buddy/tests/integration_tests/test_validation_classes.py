@@ -1,7 +1,19 @@
+import hashlib
+import os
+
 import pytest
 import sh
 
-from buddy.validation_classes import get_md5sum
+import buddy.validation_classes
+from buddy.hash_cache import HashCache
+from buddy.hashing import combine_leaf_digests
+from buddy.validation_classes import (
+    ChecksumValidator,
+    TreeValidator,
+    get_checksum,
+    get_md5sum,
+    get_tree_leaves,
+)
 from tests.integration_tests.data_for_md5sum_tests import empty_md5
 
 # user
@@ -68,3 +80,123 @@ class TestMd5sumOnSubsetOfFile(object):
                 print("# comment line", file=f)
 
             assert get_md5sum(f_comment, comment="#") == empty_md5()
+
+
+class TestChecksumValidatorOnFile(object):
+    def test_blake2b_validator(self, tmpdir):
+        with sh.pushd(tmpdir):
+            with open("some_file", "w") as f:
+                print("some-data", file=f)
+            expected = hashlib.blake2b(b"some-data\n").hexdigest()
+            assert get_checksum("some_file", "blake2b") == expected
+            assert ChecksumValidator(
+                test_name="test1",
+                input_file="some_file",
+                expected_checksum=expected,
+                algorithm="blake2b",
+            ).is_valid()
+
+
+class TestQuickChecksOnFile(object):
+    def test_size_and_line_count(self, tmpdir):
+        with sh.pushd(tmpdir):
+            with open("some_file", "w") as f:
+                print("line1\nline2", file=f)
+
+            def make_validator(**kwargs):
+                return ChecksumValidator("test1", "some_file", "a" * 32, **kwargs)
+
+            assert make_validator().passes_quick_checks()
+            validator = make_validator(expected_size=12, expected_lines=2)
+            assert validator.passes_quick_checks()
+            assert not make_validator(expected_size=11).passes_quick_checks()
+            assert not make_validator(expected_lines=3).passes_quick_checks()
+
+    def test_missing_file(self, tmpdir):
+        with sh.pushd(tmpdir):
+            validator = ChecksumValidator("test1", "missing_file", "a" * 32)
+            assert not validator.passes_quick_checks()
+
+    def test_unreadable_file(self, tmpdir, monkeypatch):
+        def mock_count_lines(filepath):
+            raise PermissionError(13, "Permission denied", filepath)
+
+        monkeypatch.setattr(buddy.validation_classes, "count_lines", mock_count_lines)
+        with sh.pushd(tmpdir):
+            sh.touch("some_file")
+            validator = ChecksumValidator(
+                "test1", "some_file", "a" * 32, expected_lines=0
+            )
+            assert not validator.passes_quick_checks()
+            assert validator.check_file_properties().status == "unreadable"
+
+    def test_directory_in_place_of_a_file(self, tmpdir):
+        with sh.pushd(tmpdir):
+            os.mkdir("some_dir")
+            validator = ChecksumValidator("test1", "some_dir", "a" * 32)
+            assert validator.check_checksum().status == "unreadable"
+
+
+class TestTreeValidatorOnDirectory(object):
+    @staticmethod
+    def make_tree():
+        os.makedirs(os.path.join("results", "shard1"))
+        os.makedirs(os.path.join("results", ".git"))
+        for filepath in ["results/a.txt", "results/shard1/b.txt", "results/.git/x"]:
+            with open(filepath, "w") as f:
+                print(filepath, file=f)
+
+    def test_leaves_and_root(self, tmpdir):
+        with sh.pushd(tmpdir):
+            self.make_tree()
+            leaves, bytes_read, is_cache_hit = get_tree_leaves("results", n_workers=2)
+            assert leaves == {
+                "a.txt": get_md5sum("results/a.txt"),
+                "shard1/b.txt": get_md5sum("results/shard1/b.txt"),
+            }
+            assert bytes_read == 35
+            assert not is_cache_hit
+
+            root = hashlib.md5(
+                "a.txt\0{}\nshard1/b.txt\0{}\n".format(
+                    leaves["a.txt"], leaves["shard1/b.txt"]
+                ).encode()
+            ).hexdigest()
+            assert combine_leaf_digests(leaves) == root
+            assert TreeValidator("test1", "results", root).is_valid()
+
+    def test_mismatch_reports_differing_files(self, tmpdir):
+        with sh.pushd(tmpdir):
+            self.make_tree()
+            leaves, _, _ = get_tree_leaves("results")
+            validator = TreeValidator(
+                "test1",
+                "results",
+                combine_leaf_digests(leaves),
+                expected_leaves=leaves,
+                n_workers=2,
+            )
+            assert validator.check_checksum().is_valid
+
+            with open("results/a.txt", "a") as f:
+                print("extra", file=f)
+            sh.touch("results/shard1/c.txt")
+            result = validator.check_checksum()
+            assert result.status == "fail"
+            assert result.differences == ["a.txt", "shard1/c.txt"]
+
+    def test_leaves_are_cached(self, tmpdir):
+        with sh.pushd(tmpdir):
+            self.make_tree()
+            leaves, _, _ = get_tree_leaves("results")
+            validator = TreeValidator("test1", "results", combine_leaf_digests(leaves))
+            validator.cache = HashCache("cache.sqlite")
+            assert not validator.check_checksum().cache_hit
+            result = validator.check_checksum()
+            assert result.is_valid and result.cache_hit
+            assert result.bytes_read == 0
+
+    def test_missing_directory(self, tmpdir):
+        with sh.pushd(tmpdir):
+            validator = TreeValidator("test1", "results", "a" * 32)
+            assert validator.check_file_properties().status == "missing"
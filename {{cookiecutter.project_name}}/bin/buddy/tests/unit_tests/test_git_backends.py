@@ -0,0 +1,37 @@
+import pytest
+
+from buddy import setup_git_clones
+from buddy.git_backends import GitCliBackend, get_backend
+
+
+class TestGetBackend(object):
+    def test_default_is_the_git_program(self, monkeypatch):
+        monkeypatch.delenv("BUDDY_GIT_BACKEND", raising=False)
+        assert isinstance(get_backend(), GitCliBackend)
+        assert get_backend("cli").name == "cli"
+
+    def test_command_line_default_is_the_git_program(self, monkeypatch):
+        monkeypatch.delenv("BUDDY_GIT_BACKEND", raising=False)
+        parser = setup_git_clones.define_command_arg_parser()
+        args = parser.parse_args(["repos.yaml"])
+        assert get_backend(args.git_backend).name == "cli"
+
+    def test_backend_from_environment(self, monkeypatch):
+        monkeypatch.setenv("BUDDY_GIT_BACKEND", "not_a_backend")
+        with pytest.raises(ValueError):
+            get_backend()
+
+    def test_auto_falls_back_to_git_program(self, monkeypatch):
+        monkeypatch.setattr("builtins.__import__", mock_import_without_dulwich)
+        assert get_backend("auto").name == "cli"
+        with pytest.raises(ImportError):
+            get_backend("dulwich")
+
+
+REAL_IMPORT = __import__
+
+
+def mock_import_without_dulwich(name, *args, **kwargs):
+    if name.startswith("dulwich"):
+        raise ImportError("No module named 'dulwich'")
+    return REAL_IMPORT(name, *args, **kwargs)
@@ -2,7 +2,7 @@ import os
 import sh
 
 from pytest_mock import mocker
-from buddy.git_classes import ExternalRepository, LocalRepository
+from buddy.git_classes import ExternalRepository, GitMirrorCache, LocalRepository
 from tests.unit_tests.data_for_git_tests import repo_data1, repo_data2
 
 
@@ -41,9 +41,17 @@ class TestGitClone(object):
         # note that we can't patch the function `sh.git.clone`
         mocker.patch("sh.git")
         mocker.patch("os.path.exists", return_value=False)
+        mocker.patch("os.rename")
         repo = ExternalRepository(*repo_data1())
         repo.clone()
-        sh.git.assert_called_once_with("clone", repo.input_path, repo.output_path)
+        # the repository is fetched into a staging directory, then moved
+        staging_path = repo.staging_path()
+        sh.git.assert_any_call("init", "--quiet", staging_path)
+        sh.git.assert_any_call(
+            "-C", staging_path, "remote", "add", "origin", repo.input_path
+        )
+        sh.git.assert_any_call("-C", staging_path, "checkout", repo.commit)
+        os.rename.assert_called_once_with(staging_path, repo.output_path)
 
     def test_no_clone_when_local_copy_exists(self, mocker):
         mocker.patch("sh.git")
@@ -83,3 +91,20 @@ class TestGitCommit(object):
 #      - obtain the hash for the first commit
 #      - checkout the first commit
 #      - assert that file1 exists and file2 doesn't
+
+
+class TestGitCloneThroughMirror(object):
+    def test_clone_uses_mirror(self, mocker):
+        mocker.patch("sh.git")
+        mocker.patch("os.path.exists", return_value=False)
+        mocker.patch("os.rename")
+        mirror_cache = GitMirrorCache("some_dir")
+        mocker.patch.object(mirror_cache, "update", return_value="some_mirror")
+        url, commit, output = repo_data1()
+        repo = ExternalRepository(url, commit, output, mirror_cache)
+        repo.clone()
+        mirror_cache.update.assert_called_once_with(url, commit)
+        staging_path = repo.staging_path()
+        sh.git.assert_any_call("clone", "--quiet", "some_mirror", staging_path)
+        sh.git.assert_any_call("-C", staging_path, "remote", "set-url", "origin", url)
+        os.rename.assert_called_once_with(staging_path, output)
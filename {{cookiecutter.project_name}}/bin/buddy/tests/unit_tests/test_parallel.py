@@ -0,0 +1,50 @@
+import pytest
+
+from buddy.parallel import imap_ordered, map_ordered
+
+
+def square(x):
+    return x * x
+
+
+def fail_on_three(x):
+    if x == 3:
+        raise ValueError("three")
+    return x
+
+
+class TestMapOrdered(object):
+    def test_serial_map(self):
+        assert map_ordered(square, range(5)) == [0, 1, 4, 9, 16]
+
+    def test_threaded_map_preserves_order(self):
+        assert map_ordered(square, range(100), n_workers=4) == [
+            x * x for x in range(100)
+        ]
+
+    def test_process_map_preserves_order(self):
+        assert map_ordered(square, range(20), n_workers=2, use_processes=True) == [
+            x * x for x in range(20)
+        ]
+
+    def test_empty_input(self):
+        assert map_ordered(square, [], n_workers=4) == []
+
+    def test_errors_are_reraised(self):
+        with pytest.raises(ValueError):
+            map_ordered(fail_on_three, range(10), n_workers=4)
+
+
+class TestImapOrdered(object):
+    def test_generator_input_is_consumed_lazily(self):
+        consumed = []
+
+        def items():
+            for x in range(1000):
+                consumed.append(x)
+                yield x
+
+        results = imap_ordered(square, items(), n_workers=2)
+        assert next(results) == 0
+        results.close()
+        assert len(consumed) < 1000
@@ -0,0 +1,84 @@
+import pytest
+
+from buddy.setup import SetupStep, get_setup_steps, plan_steps, run_setup
+
+
+def names(steps):
+    return [step.name for step in steps]
+
+
+class TestPlanSteps(object):
+    def test_steps_come_after_their_dependencies(self):
+        steps = [
+            SetupStep("c", None, ["b"]),
+            SetupStep("a", None),
+            SetupStep("b", None, ["a"]),
+            SetupStep("d", None),
+        ]
+        assert names(plan_steps(steps)) == ["a", "b", "c", "d"]
+
+    def test_independent_steps_keep_their_order(self):
+        steps = [SetupStep(name, None) for name in "zyx"]
+        assert names(plan_steps(steps)) == ["z", "y", "x"]
+
+    def test_unknown_dependency(self):
+        with pytest.raises(ValueError):
+            plan_steps([SetupStep("a", None, ["not_a_step"])])
+
+    def test_circular_dependencies(self):
+        with pytest.raises(ValueError):
+            plan_steps([SetupStep("a", None, ["b"]), SetupStep("b", None, ["a"])])
+
+    def test_project_setup_steps(self):
+        planned = names(plan_steps(get_setup_steps()))
+        assert planned[:3] == ["check_dirs", "make_links", "make_dirs"]
+        assert planned[-1] == "touch_files"
+
+
+class TestRunSetup(object):
+    def test_steps_after_a_failure_are_skipped(self, capsys):
+        calls = []
+
+        def record(config):
+            calls.append(config)
+
+        def fail(config):
+            raise OSError("no space left")
+
+        steps = [
+            SetupStep("first", fail),
+            SetupStep("second", record, ["first"]),
+            SetupStep("third", record, ["second"]),
+            SetupStep("independent", record),
+        ]
+        failures = run_setup("some_config", steps)
+
+        assert failures == {"first": "OSError: no space left"}
+        assert calls == ["some_config"]
+        errors = capsys.readouterr().err
+        assert "[FAILED]\tfirst" in errors
+        assert "[SKIPPED]\tsecond" in errors
+        assert "[SKIPPED]\tthird" in errors
+        assert "[OK]\tindependent" in errors
+
+    def test_steps_make_the_changes_they_planned(self):
+        calls = []
+
+        def planner(config, snapshot):
+            calls.append(("plan", config, snapshot))
+            return ["change"]
+
+        def apply(config, changes):
+            calls.append(("apply", config, changes))
+
+        steps = [
+            SetupStep("first", apply, planner=planner),
+            SetupStep("second", apply, ["first"], planner=planner),
+        ]
+        assert run_setup("some_config", steps, snapshot="some_snapshot") == {}
+
+        plan_and_apply = [
+            ("plan", "some_config", "some_snapshot"),
+            ("apply", "some_config", ["change"]),
+        ]
+        assert calls == plan_and_apply + plan_and_apply
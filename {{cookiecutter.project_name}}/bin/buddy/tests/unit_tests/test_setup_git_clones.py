@@ -1,6 +1,6 @@
 import os
 
-from buddy.setup_git_clones import parse_repository_details
+from buddy.setup_git_clones import parse_repository_details, run_workflow
 from buddy.git_classes import ExternalRepository
 
 from tests.unit_tests.data_for_git_tests import (
@@ -48,3 +48,86 @@ class TestLocalRepositoryExists(object):
         monkeypatch.setattr(os.path, "exists", mock_return)
         repo = ExternalRepository(*repo_data1())
         assert not repo.local_exists()
+
+
+class TestRunWorkflow(object):
+    @staticmethod
+    def write_yaml(filepath, repo_names):
+        with open(filepath, "w") as f:
+            for name in repo_names:
+                print(
+                    "{}:\n  url: url_{}\n  commit: abc1234\n  output: out_{}".format(
+                        name, name, name
+                    ),
+                    file=f,
+                )
+
+    def test_all_failures_are_collected(self, tmpdir, monkeypatch):
+        cloned = []
+
+        def mock_clone(self):
+            cloned.append(self.input_path)
+            if self.input_path in ["url_repo2", "url_repo4"]:
+                raise RuntimeError("could not clone {}".format(self.input_path))
+
+        monkeypatch.setattr(ExternalRepository, "clone", mock_clone)
+        monkeypatch.setattr(ExternalRepository, "checkout", lambda self: None)
+        monkeypatch.setattr(ExternalRepository, "sha1_matches", lambda self: True)
+
+        yaml_file = str(tmpdir.join("repos.yaml"))
+        self.write_yaml(yaml_file, ["repo{}".format(i) for i in range(5)])
+
+        failures = run_workflow(yaml_file, n_workers=3)
+        assert sorted(cloned) == ["url_repo{}".format(i) for i in range(5)]
+        assert failures == {
+            "repo2": "RuntimeError: could not clone url_repo2",
+            "repo4": "RuntimeError: could not clone url_repo4",
+        }
+
+    def test_no_failures(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(ExternalRepository, "clone", lambda self: None)
+        monkeypatch.setattr(ExternalRepository, "checkout", lambda self: None)
+        monkeypatch.setattr(ExternalRepository, "sha1_matches", lambda self: True)
+
+        yaml_file = str(tmpdir.join("repos.yaml"))
+        self.write_yaml(yaml_file, ["repo1", "repo2"])
+        assert run_workflow(yaml_file, n_workers=2) == {}
+
+    def test_unverified_checkout_is_a_failure(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(ExternalRepository, "clone", lambda self: None)
+        monkeypatch.setattr(ExternalRepository, "checkout", lambda self: None)
+        monkeypatch.setattr(ExternalRepository, "sha1_matches", lambda self: False)
+
+        yaml_file = str(tmpdir.join("repos.yaml"))
+        self.write_yaml(yaml_file, ["repo1"])
+        assert ["repo1"] == list(run_workflow(yaml_file).keys())
+
+
+    def test_new_clones_are_not_checked_out_again(self, tmpdir, monkeypatch):
+        checked_out = []
+        monkeypatch.setattr(ExternalRepository, "clone", lambda self: None)
+        monkeypatch.setattr(
+            ExternalRepository, "checkout", lambda self: checked_out.append(self)
+        )
+        monkeypatch.setattr(ExternalRepository, "sha1_matches", lambda self: True)
+
+        yaml_file = str(tmpdir.join("repos.yaml"))
+        self.write_yaml(yaml_file, ["repo1", "repo2"])
+        with tmpdir.as_cwd():
+            os.mkdir("out_repo1")
+            assert run_workflow(yaml_file) == {}
+        # only the existing clone is checked out
+        assert [repo.output_path for repo in checked_out] == ["out_repo1"]
+
+
+class TestShallowOption(object):
+    def test_shallow_can_be_set_per_repository(self):
+        repo_yaml = {"repo1": repo_dict1(), "repo2": dict(repo_dict2(), shallow=True)}
+        repositories = parse_repository_details(repo_yaml)
+        assert not repositories["repo1"].shallow
+        assert repositories["repo2"].shallow
+
+        repo_yaml = {"repo1": repo_dict1(), "repo2": dict(repo_dict2(), shallow=False)}
+        repositories = parse_repository_details(repo_yaml, shallow=True)
+        assert repositories["repo1"].shallow
+        assert not repositories["repo2"].shallow
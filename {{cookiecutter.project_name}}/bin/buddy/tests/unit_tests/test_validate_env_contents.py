@@ -1,5 +1,6 @@
 import os, sys, subprocess
 
+from buddy import validate_env_contents
 from buddy.validate_env_contents import (
     python_matches_conda,
     conda_env_matches_expected,
@@ -50,28 +51,26 @@ class TestPythonInCondaEnv(object):
 
 class TestRscriptInCondaEnv(object):
     def mock_which(*args, **kwargs):
-        """Mocks a subprocess call to `which Rscript`"""
-        return subprocess.CompletedProcess(
-            args=None, returncode=0, stdout=b"/my/conda/env/bin/Rscript\n"
-        )
+        """Mocks the `PATH` scan for `Rscript`"""
+        return "/my/conda/env/bin/Rscript"
 
     def test_with_no_conda_env(self, mocker, monkeypatch):
         mocker.patch.dict("os.environ", values={}, clear=True)
-        monkeypatch.setattr(subprocess, "run", self.mock_which)
+        monkeypatch.setattr(validate_env_contents, "find_executable", self.mock_which)
         assert not rscript_matches_conda()
 
     def test_with_matching_conda_env(self, mocker, monkeypatch):
         mocker.patch.dict(
             "os.environ", values={"CONDA_PREFIX": "/my/conda/env"}, clear=True
         )
-        monkeypatch.setattr(subprocess, "run", self.mock_which)
+        monkeypatch.setattr(validate_env_contents, "find_executable", self.mock_which)
         assert rscript_matches_conda()
 
     def test_with_mismatching_conda_env(self, mocker, monkeypatch):
         mocker.patch.dict(
             "os.environ", values={"CONDA_PREFIX": "/some/other/env"}, clear=True
         )
-        monkeypatch.setattr(subprocess, "run", self.mock_which)
+        monkeypatch.setattr(validate_env_contents, "find_executable", self.mock_which)
         assert not rscript_matches_conda()
 
     def test_without_rscript(self, mocker, monkeypatch):
@@ -80,11 +79,23 @@ class TestRscriptInCondaEnv(object):
         )
 
         def local_mock_which(*args, **kwargs):
-            return subprocess.CompletedProcess(args=None, returncode=1, stdout=b"")
+            return None
 
-        monkeypatch.setattr(subprocess, "run", local_mock_which)
+        monkeypatch.setattr(validate_env_contents, "find_executable", local_mock_which)
         assert not rscript_matches_conda()
 
+    def test_rscript_is_found_without_a_subprocess(self, mocker, tmpdir):
+        rscript = tmpdir.mkdir("bin").join("Rscript")
+        rscript.write("")
+        rscript.chmod(0o755)
+        mocker.patch.dict(
+            "os.environ",
+            values={"CONDA_PREFIX": str(tmpdir), "PATH": str(tmpdir.join("bin"))},
+            clear=True,
+        )
+        mocker.patch.object(subprocess, "run", side_effect=AssertionError)
+        assert rscript_matches_conda()
+
 
 # If r is required, and Rscript is not available, an informative error should
 # be thrown
@@ -1,6 +1,14 @@
+import pytest
+
 import buddy.validate_file_contents
 
-from buddy.validation_classes import Md5sumValidator
+from buddy.validation_classes import (
+    ChecksumValidator,
+    Md5sumValidator,
+    TreeValidator,
+    ValidationResult,
+    define_validator,
+)
 
 # user
 # .. can ensure the md5sum for a file matches a given value
@@ -40,14 +48,16 @@ class TestEqualityOfMd5sumValidators(object):
 
 class TestMd5sumValidatorMethods(object):
     @staticmethod
-    def mock_return(filepath, comment=None):
+    def mock_return(filepath, algorithm="md5", comment=None, use_mmap=False):
         if comment is None:
-            return "a" * 32
+            return "a" * 32, 0
         else:
-            return "b" * 32
+            return "b" * 32, 0
 
     def test_is_valid_detects_matching_md5sum(self, monkeypatch):
-        monkeypatch.setattr(buddy.validation_classes, "get_md5sum", self.mock_return)
+        monkeypatch.setattr(
+            buddy.validation_classes, "get_checksum_and_size", self.mock_return
+        )
 
         validator = Md5sumValidator(
             test_name="test1", input_file="some_file", expected_md5sum="a" * 32
@@ -56,7 +66,9 @@ class TestMd5sumValidatorMethods(object):
         assert validator.is_valid()
 
     def test_is_valid_detects_nonmatching_md5sum(self, monkeypatch):
-        monkeypatch.setattr(buddy.validation_classes, "get_md5sum", self.mock_return)
+        monkeypatch.setattr(
+            buddy.validation_classes, "get_checksum_and_size", self.mock_return
+        )
 
         validator = Md5sumValidator(
             test_name="test1", input_file="some_file", expected_md5sum="c" * 32
@@ -65,7 +77,9 @@ class TestMd5sumValidatorMethods(object):
         assert not validator.is_valid()
 
     def test_stripping_comment_character_affects_md5sum(self, monkeypatch):
-        monkeypatch.setattr(buddy.validation_classes, "get_md5sum", self.mock_return)
+        monkeypatch.setattr(
+            buddy.validation_classes, "get_checksum_and_size", self.mock_return
+        )
 
         validator = Md5sumValidator(
             test_name="test1",
@@ -75,3 +89,135 @@ class TestMd5sumValidatorMethods(object):
         )
 
         assert validator.is_valid()
+
+
+class TestChecksumValidators(object):
+    @staticmethod
+    def mock_return(filepath, algorithm="md5", comment=None, use_mmap=False):
+        return algorithm * 4, 0
+
+    def test_is_valid_uses_requested_algorithm(self, monkeypatch):
+        monkeypatch.setattr(
+            buddy.validation_classes, "get_checksum_and_size", self.mock_return
+        )
+
+        validator = ChecksumValidator(
+            test_name="test1",
+            input_file="some_file",
+            expected_checksum="blake2b" * 4,
+            algorithm="blake2b",
+        )
+        assert validator.test_type == "blake2b"
+        assert validator.is_valid()
+
+    def test_md5sum_and_checksum_validators_differ(self):
+        validator1 = Md5sumValidator(
+            test_name="test1", input_file="some_file", expected_md5sum="a" * 32
+        )
+        validator2 = ChecksumValidator(
+            test_name="test1",
+            input_file="some_file",
+            expected_checksum="a" * 32,
+            algorithm="md5",
+        )
+        assert validator1 != validator2
+
+
+class TestDefineValidator(object):
+    def test_md5sum_definition(self):
+        validator = define_validator(
+            "test1", {"input_file": "some_file", "expected_md5sum": "a" * 32}
+        )
+        assert validator == Md5sumValidator(
+            test_name="test1", input_file="some_file", expected_md5sum="a" * 32
+        )
+
+    def test_tree_definition(self):
+        validator = define_validator(
+            "test1",
+            {
+                "input_dir": "some_dir",
+                "expected_tree_sha256": "a" * 64,
+                "expected_leaves": {"x.txt": "b" * 64},
+                "n_workers": 4,
+            },
+        )
+        assert validator == TreeValidator(
+            test_name="test1",
+            input_dir="some_dir",
+            expected_tree_checksum="a" * 64,
+            algorithm="sha256",
+            expected_leaves={"x.txt": "b" * 64},
+            n_workers=4,
+        )
+        assert validator.test_type == "tree_sha256"
+
+    def test_other_algorithm_definitions(self):
+        for algorithm in ["md5", "sha256", "blake2b"]:
+            validator = define_validator(
+                "test1",
+                {
+                    "input_file": "some_file",
+                    "expected_" + algorithm: "a" * 32,
+                    "comment": "#",
+                },
+            )
+            assert validator == ChecksumValidator(
+                test_name="test1",
+                input_file="some_file",
+                expected_checksum="a" * 32,
+                algorithm=algorithm,
+                comment="#",
+            )
+
+    def test_missing_checksum(self):
+        with pytest.raises(ValueError):
+            define_validator("test1", {"input_file": "some_file"})
+
+    def test_unknown_algorithm(self):
+        with pytest.raises(ValueError):
+            define_validator(
+                "test1", {"input_file": "some_file", "expected_nohash": "a" * 32}
+            )
+
+    def test_multiple_checksums(self):
+        with pytest.raises(ValueError):
+            define_validator(
+                "test1",
+                {
+                    "input_file": "some_file",
+                    "expected_md5sum": "a" * 32,
+                    "expected_sha256": "b" * 64,
+                },
+            )
+
+
+class TestValidationResult(object):
+    def test_result_fields(self):
+        validator = Md5sumValidator("test1", "some_file", "a" * 32)
+        result = ValidationResult(
+            validator,
+            "fail",
+            observed_checksum="b" * 32,
+            bytes_read=3 << 20,
+            seconds=2.0,
+        )
+        assert not result.is_valid
+        assert result.mb_per_second == 1.5
+        assert result.to_dict() == {
+            "test_name": "test1",
+            "test_type": "md5sum",
+            "input_file": "some_file",
+            "status": "fail",
+            "observed_checksum": "b" * 32,
+            "bytes_read": 3 << 20,
+            "seconds": 2.0,
+            "mb_per_second": 1.5,
+            "cache_hit": False,
+            "differences": None,
+        }
+
+    def test_unread_files_have_no_throughput(self):
+        validator = Md5sumValidator("test1", "some_file", "a" * 32)
+        result = ValidationResult(validator, "missing")
+        assert result.mb_per_second is None
@@ -1,10 +1,11 @@
 from mock import patch, mock_open
+import sh
 
 
 import buddy
 
 from buddy.validation_workflow import ValidationWorkflow
-from buddy.validation_classes import Md5sumValidator
+from buddy.validation_classes import ChecksumValidator, Md5sumValidator
 
 # ---- test data
 
@@ -100,45 +101,123 @@ class TestGetFailingValidators(object):
         workflow = ValidationWorkflow(validator_dict)
         assert {} == workflow.get_failing_validators()
 
-    def test_all_passing_validators_means_no_failures(self, monkeypatch):
-        def mock_md5sum(filepath, comment=None):
-            return "a" * 32
+    def test_all_passing_validators_means_no_failures(self, monkeypatch, tmpdir):
+        def mock_checksum_and_size(
+            filepath, algorithm="md5", comment=None, use_mmap=False
+        ):
+            return "a" * 32, 0
 
-        monkeypatch.setattr(buddy.validation_classes, "get_md5sum", mock_md5sum)
+        monkeypatch.setattr(
+            buddy.validation_classes, "get_checksum_and_size", mock_checksum_and_size
+        )
 
         validator_dict = single_md5sum_validator()
         workflow = ValidationWorkflow(validator_dict)
-        assert {} == workflow.get_failing_validators()
+        with sh.pushd(tmpdir):
+            sh.touch("some_file")
+            assert {} == workflow.get_failing_validators()
+
+    def test_missing_files_fail_without_being_hashed(self, monkeypatch):
+        def mock_checksum_and_size(
+            filepath, algorithm="md5", comment=None, use_mmap=False
+        ):
+            raise AssertionError("a missing file should not be hashed")
+
+        monkeypatch.setattr(
+            buddy.validation_classes, "get_checksum_and_size", mock_checksum_and_size
+        )
+
+        validator_dict = single_md5sum_validator()
+        workflow = ValidationWorkflow(validator_dict)
+        assert validator_dict == workflow.get_failing_validators()
 
-    def test_all_failing_validators(self, monkeypatch):
-        def mock_md5sum(filepath, comment=None):
-            return "b" * 32
+    def test_wrong_size_fails_without_being_hashed(self, monkeypatch, tmpdir):
+        def mock_checksum_and_size(
+            filepath, algorithm="md5", comment=None, use_mmap=False
+        ):
+            raise AssertionError("a file of the wrong size should not be hashed")
 
-        monkeypatch.setattr(buddy.validation_classes, "get_md5sum", mock_md5sum)
+        monkeypatch.setattr(
+            buddy.validation_classes, "get_checksum_and_size", mock_checksum_and_size
+        )
+
+        validator_dict = {
+            "my_test": Md5sumValidator(
+                "my_test", "some_file", "a" * 32, expected_size=100
+            )
+        }
+        workflow = ValidationWorkflow(validator_dict)
+        with sh.pushd(tmpdir):
+            sh.touch("some_file")
+            assert validator_dict == workflow.get_failing_validators()
+
+    def test_quick_mode_does_not_hash(self, monkeypatch, tmpdir):
+        def mock_checksum_and_size(
+            filepath, algorithm="md5", comment=None, use_mmap=False
+        ):
+            raise AssertionError("no file should be hashed in quick mode")
+
+        monkeypatch.setattr(
+            buddy.validation_classes, "get_checksum_and_size", mock_checksum_and_size
+        )
+
+        validator_dict = {
+            "present": Md5sumValidator("present", "some_file", "a" * 32),
+            "absent": Md5sumValidator("absent", "other_file", "a" * 32),
+        }
+        workflow = ValidationWorkflow(validator_dict)
+        with sh.pushd(tmpdir):
+            sh.touch("some_file")
+            failures = workflow.get_failing_validators(quick=True)
+        assert ["absent"] == list(failures.keys())
+
+    def test_all_failing_validators(self, monkeypatch, tmpdir):
+        def mock_checksum_and_size(
+            filepath, algorithm="md5", comment=None, use_mmap=False
+        ):
+            return "b" * 32, 0
+
+        monkeypatch.setattr(
+            buddy.validation_classes, "get_checksum_and_size", mock_checksum_and_size
+        )
 
         validator_dict = single_md5sum_validator()
         workflow = ValidationWorkflow(validator_dict)
-        assert validator_dict == workflow.get_failing_validators()
+        with sh.pushd(tmpdir):
+            sh.touch("some_file")
+            assert validator_dict == workflow.get_failing_validators()
+            # the file was hashed, rather than being reported as missing
+            assert ["fail"] == [result.status for result in workflow.iter_results()]
 
 
 class TestValidationReportFormatting(object):
-    def test_all_passing_means_no_report(self, monkeypatch):
+    def test_all_passing_means_no_report(self, monkeypatch, tmpdir):
         # returns a string
         # lines are of form "test_name:XYZ\ttest_type:md5sum\tinput_file:ABC"
-        def mock_md5sum(filepath, comment=None):
-            return "a" * 32
+        def mock_checksum_and_size(
+            filepath, algorithm="md5", comment=None, use_mmap=False
+        ):
+            return "a" * 32, 0
 
-        monkeypatch.setattr(buddy.validation_classes, "get_md5sum", mock_md5sum)
+        monkeypatch.setattr(
+            buddy.validation_classes, "get_checksum_and_size", mock_checksum_and_size
+        )
 
         validator_dict = single_md5sum_validator()
         workflow = ValidationWorkflow(validator_dict)
-        assert "" == workflow.format_failure_report()
-
-    def test_all_failing_gives_report(self, monkeypatch):
-        def mock_md5sum(filepath, comment=None):
-            return "b" * 32
-
-        monkeypatch.setattr(buddy.validation_classes, "get_md5sum", mock_md5sum)
+        with sh.pushd(tmpdir):
+            sh.touch("some_file")
+            assert "" == workflow.format_failure_report()
+
+    def test_all_failing_gives_report(self, monkeypatch, tmpdir):
+        def mock_checksum_and_size(
+            filepath, algorithm="md5", comment=None, use_mmap=False
+        ):
+            return "b" * 32, 0
+
+        monkeypatch.setattr(
+            buddy.validation_classes, "get_checksum_and_size", mock_checksum_and_size
+        )
 
         validator_dict = single_md5sum_validator()
         workflow = ValidationWorkflow(validator_dict)
@@ -150,7 +229,10 @@ class TestValidationReportFormatting(object):
                 "input_file:some_file",
             ]
         )
-        assert report == workflow.format_failure_report()
+        with sh.pushd(tmpdir):
+            sh.touch("some_file")
+            assert report == workflow.format_failure_report()
+            assert ["fail"] == [result.status for result in workflow.iter_results()]
 
 
 class TestParseValidatorDetails(object):
@@ -183,3 +265,146 @@ class TestParseValidatorDetails(object):
 
         assert all(map(lambda x: isinstance(x, Md5sumValidator), validators.values()))
         assert validators == expected_validators
+
+    def test_mixed_algorithms_can_be_parsed(self):
+        yaml_dict = {
+            "test1": {"input_file": "some_file", "expected_md5sum": "a" * 32},
+            "test2": {"input_file": "another_file", "expected_blake2b": "b" * 128},
+        }
+        validators = ValidationWorkflow.parse_validator_details(yaml_dict)
+        assert validators == {
+            "test1": Md5sumValidator(
+                test_name="test1", input_file="some_file", expected_md5sum="a" * 32
+            ),
+            "test2": ChecksumValidator(
+                test_name="test2",
+                input_file="another_file",
+                expected_checksum="b" * 128,
+                algorithm="blake2b",
+            ),
+        }
+
+    def test_mmap_option_can_be_parsed(self):
+        yaml_dict = {
+            "test1": {
+                "input_file": "some_file",
+                "expected_md5sum": "a" * 32,
+                "use_mmap": True,
+            }
+        }
+        validators = ValidationWorkflow.parse_validator_details(yaml_dict)
+        assert validators["test1"].use_mmap
+        assert validators["test1"] != Md5sumValidator(
+            test_name="test1", input_file="some_file", expected_md5sum="a" * 32
+        )
+
+
+class TestConcurrentValidation(object):
+    @staticmethod
+    def many_md5sum_validators():
+        return {
+            "test{}".format(i): Md5sumValidator(
+                test_name="test{}".format(i),
+                input_file="file{}".format(i),
+                expected_md5sum="a" * 32,
+            )
+            for i in range(20)
+        }
+
+    def test_threaded_failures_match_serial_failures(self, monkeypatch, tmpdir):
+        def mock_checksum_and_size(
+            filepath, algorithm="md5", comment=None, use_mmap=False
+        ):
+            return ("a" * 32 if int(filepath[4:]) % 3 else "b" * 32), 0
+
+        monkeypatch.setattr(
+            buddy.validation_classes, "get_checksum_and_size", mock_checksum_and_size
+        )
+
+        workflow = ValidationWorkflow(self.many_md5sum_validators())
+        with sh.pushd(tmpdir):
+            # file0 is missing, so fails the cheap checks
+            for i in range(1, 20):
+                sh.touch("file{}".format(i))
+            serial = workflow.get_failing_validators()
+            threaded = workflow.get_failing_validators(n_workers=4)
+            assert list(serial.keys()) == list(threaded.keys())
+            assert serial == threaded
+            assert workflow.format_failure_report() == workflow.format_failure_report(
+                n_workers=4
+            )
+        assert ["test{}".format(i) for i in range(0, 20, 3)] == list(serial.keys())
+
+
+class TestStreamingFailureReport(object):
+    @staticmethod
+    def many_md5sum_validators():
+        return {
+            "test{}".format(i): Md5sumValidator(
+                test_name="test{}".format(i),
+                input_file="file{}".format(i),
+                expected_md5sum="a" * 32,
+            )
+            for i in range(10)
+        }
+
+    def test_report_lines_are_yielded_before_all_files_are_hashed(
+        self, monkeypatch, tmpdir
+    ):
+        hashed_files = []
+
+        def mock_checksum_and_size(
+            filepath, algorithm="md5", comment=None, use_mmap=False
+        ):
+            hashed_files.append(filepath)
+            return "b" * 32, 0
+
+        monkeypatch.setattr(
+            buddy.validation_classes, "get_checksum_and_size", mock_checksum_and_size
+        )
+
+        workflow = ValidationWorkflow(self.many_md5sum_validators())
+        with sh.pushd(tmpdir):
+            for i in range(10):
+                sh.touch("file{}".format(i))
+            report = workflow.iter_failure_report()
+            assert "test_name:test0" in next(report)
+            assert ["file0"] == hashed_files
+
+    def test_fail_fast_stops_after_n_failures(self, monkeypatch, tmpdir):
+        hashed_files = []
+
+        def mock_checksum_and_size(
+            filepath, algorithm="md5", comment=None, use_mmap=False
+        ):
+            hashed_files.append(filepath)
+            return "b" * 32, 0
+
+        monkeypatch.setattr(
+            buddy.validation_classes, "get_checksum_and_size", mock_checksum_and_size
+        )
+
+        workflow = ValidationWorkflow(self.many_md5sum_validators())
+        with sh.pushd(tmpdir):
+            for i in range(10):
+                sh.touch("file{}".format(i))
+            report = list(workflow.iter_failure_report(max_failures=2))
+        assert 2 == len(report)
+        assert ["file0", "file1"] == hashed_files
+
+    def test_missing_files_are_reported_first(self, monkeypatch, tmpdir):
+        def mock_checksum_and_size(
+            filepath, algorithm="md5", comment=None, use_mmap=False
+        ):
+            return "b" * 32, 0
+
+        monkeypatch.setattr(
+            buddy.validation_classes, "get_checksum_and_size", mock_checksum_and_size
+        )
+
+        workflow = ValidationWorkflow(self.many_md5sum_validators())
+        with sh.pushd(tmpdir):
+            for i in range(9):
+                sh.touch("file{}".format(i))
+            first_line = next(workflow.iter_failure_report(n_workers=3))
+        assert "test_name:test9" in first_line
@@ -9,11 +9,39 @@ This script calls the code for various aspects of the current project:
 - `sidekick validate --yaml ...` : check that results files or input data files
   are consistent with the expectations (eg, they haven't been corrupted during
   storage / transfer or altered by changes to the analysis code).
+
+- `sidekick validate <yaml> --record <paths> ...` : write the expectations for
+  a set of files (or directories / globs) to a yaml file.
+
+`sidekick` is called many times by workflow rules, so it should start quickly:
+subcommands are ran in this process (rather than in a second python
+interpreter), and the `buddy` modules are only imported by the subcommands
+that use them (see `import_buddy`).
 """
 
 import argparse
 import os
-import subprocess
+import sys
+
+# `bin/buddy` (which holds the `buddy` package); `./sidekick` is a link to
+# this script, so the link is resolved
+BUDDY_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "buddy")
+
+
+def import_buddy(module_name):
+    """
+    Import a module from the `buddy` package for this project, whether or not
+    `buddy` has been installed.
+
+    :param module_name: The name of a module in `buddy`, eg, "setup".
+    :return: The module.
+    """
+    if BUDDY_DIR not in sys.path:
+        sys.path.insert(0, BUDDY_DIR)
+    # `__import__` (unlike `importlib.import_module`) is timed by
+    # `python -X importtime`
+    __import__("buddy." + module_name)
+    return sys.modules["buddy." + module_name]
 
 
 def setup(args):
@@ -24,11 +52,21 @@ def setup(args):
     - Defines the file structure
     - Builds and installs any required packages
     - Then does this recursively for any subprojects
+
+    With `--dry-run`, the changes that would be made to the file structure are
+    printed (and nothing is changed); returns non-zero if any change would
+    fail.
+
+    Returns the exit status of the setup script.
     """
-    try:
-        subprocess.run(["./scripts/setup.sh"], check=True)
-    except:
-        raise
+    if args.dry_run:
+        buddy_setup = import_buddy("setup")
+        config = buddy_setup.SetupConfig(buddy_setup.DEFAULT_CONFIG_DIR)
+        return 1 if buddy_setup.print_plan(buddy_setup.plan_setup(config)) else 0
+
+    import subprocess
+
+    return subprocess.run(["./scripts/setup.sh"]).returncode
 
 
 def validate(args):
@@ -38,11 +76,39 @@ def validate(args):
     - Ensure that data files are uncorrupted
     - Check that restructuring the project code does not affect the results
       files
+
+    Returns the exit status of the validation (non-zero if any test failed).
+
+    With `--record`, the expectations for a set of files are written to the
+    yaml file instead.
     """
-    validation_script = os.path.join(
-        "bin", "buddy", "buddy", "validate_file_contents.py"
+    cache_file = None if args.no_cache else args.cache
+
+    if args.record:
+        record_expectations = import_buddy("record_expectations")
+        record_expectations.record_expectations(
+            args.record,
+            args.yaml[0],
+            args.algorithm,
+            args.workers,
+            args.processes,
+            cache_file,
+            args.tree,
+        )
+        return 0
+
+    validate_file_contents = import_buddy("validate_file_contents")
+    n_failures = validate_file_contents.run_workflow(
+        args.yaml[0],
+        args.workers,
+        args.processes,
+        cache_file,
+        args.quick,
+        1 if args.fail_fast else args.max_failures,
+        args.results,
+        args.stream_yaml,
     )
-    subprocess.run(["python", validation_script] + args.yaml)
+    return 1 if n_failures else 0
 
 
 # ---- parsers
@@ -55,6 +121,11 @@ def add_setup_subparser(subparsers):
 
     setup_parser = subparsers.add_parser("setup")
     setup_parser.set_defaults(func=setup)
+    setup_parser.add_argument(
+        "--dry-run", action="store_true",
+        help="print the links / dirs / copies / clones / touches that setup"
+        " would make, without making them"
+    )
 
 
 import textwrap
@@ -74,6 +145,12 @@ def add_validation_subparser(subparsers):
                 test_name_X:
                     input_file: compare_the_md5sum_for_this_file
                     expected_md5sum: against_this_hashcode
+                    # optional: cheap checks that run before hashing
+                    expected_size: 1234
+                    expected_lines: 56
+                test_name_Y:
+                    input_dir: compare_all_the_files_in_this_directory
+                    expected_tree_md5: against_this_hashcode
             """),
         formatter_class=argparse.RawTextHelpFormatter)
     validation_parser.set_defaults(func=validate)
@@ -81,6 +158,60 @@ def add_validation_subparser(subparsers):
         "yaml", type=str, nargs=1,
         help="yaml file containing the validation tests"
     )
+    validation_parser.add_argument(
+        "--workers", type=int, default=1,
+        help="number of files to validate concurrently (default: 1)"
+    )
+    validation_parser.add_argument(
+        "--processes", action="store_true",
+        help="validate files in a pool of processes, rather than threads"
+    )
+    validation_parser.add_argument(
+        "--cache", type=str, default=None, metavar="FILE",
+        help="sqlite file (eg, .sidekick/cache/hashes.sqlite) for caching the"
+        " digests of files; a file whose size, mtime and inode are unchanged"
+        " is not re-read, so in-place corruption that keeps those is not"
+        " detected (default: no cache)"
+    )
+    validation_parser.add_argument(
+        "--no-cache", action="store_true",
+        help="re-hash every file, without reading or updating a cache (the"
+        " default; overrides --cache)"
+    )
+    validation_parser.add_argument(
+        "--quick", action="store_true",
+        help="only check file existence, sizes and line counts; don't hash"
+    )
+    validation_parser.add_argument(
+        "--fail-fast", action="store_true",
+        help="stop after the first failure (same as --max-failures 1)"
+    )
+    validation_parser.add_argument(
+        "--max-failures", type=int, default=None, metavar="N",
+        help="stop after the first N failures"
+    )
+    validation_parser.add_argument(
+        "--results", type=str, default=None,
+        help="file for the result and timing of every test (.jsonl or .tsv)"
+    )
+    validation_parser.add_argument(
+        "--stream-yaml", action="store_true",
+        help="read the tests from the yaml file one at a time, as they are ran,"
+        " to save memory (failures are reported in file order)"
+    )
+    validation_parser.add_argument(
+        "--record", type=str, nargs="+", metavar="PATH",
+        help="write the expectations for these files / directories / globs to"
+        " the yaml file, rather than validating"
+    )
+    validation_parser.add_argument(
+        "--algorithm", type=str, default="md5",
+        help="hashing algorithm used when recording expectations (default: md5)"
+    )
+    validation_parser.add_argument(
+        "--tree", action="store_true",
+        help="record each directory as a single directory-tree test"
+    )
 
 
 def define_parser():
@@ -108,7 +239,7 @@ def main():
     parser = define_parser()
     args = parser.parse_args()
 
-    args.func(args)
+    sys.exit(args.func(args))
 
 
 # ---- script
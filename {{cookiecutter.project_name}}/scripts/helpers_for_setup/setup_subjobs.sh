@@ -34,40 +34,13 @@ fi
 ###############################################################################
 # For every non-comment / non-blank line in the SUBJOBS_FILE, assume that a
 # subjob in ./subjobs/<subjob_name> exists and run it's setup-script
+#
+# A line may also list the subjobs that must be set up first, after a colon
+# ("<subjob_name>: <other_subjob> ..."). Subjobs that don't depend on each
+# other are set up concurrently (up to BUDDY_SUBJOB_WORKERS at a time), in
+# a single python process; see `buddy/setup_subjobs.py`. The subjobs of a
+# subjob are set up one at a time.
 
-while read -r LINE;
-do
-  # Ignore blanks and
-  # .. ignore lines if they start with '#' (ie, comment lines)
-  if [[ -z "${LINE}" ]] || [[ "${LINE:0:1}" == "#" ]];
-  then
-    continue
-  fi
-
-  # Define path to subjob and check that subjob is defined
-  SUBJOB_PATH="./subjobs/${LINE}"
-  if [[ ! -d "${SUBJOB_PATH}" ]];
-  then
-    die_and_moan \
-    "${0}: Subjob ${SUBJOB_PATH} should be defined before calling \
-     \n setup_subjobs.sh with ${LINE} in ${SUBJOBS_FILE}"
-  fi
-
-  if [[ ! -f "${SUBJOB_PATH}/scripts/setup.sh" ]];
-  then
-    die_and_moan \
-    "${0}: Subjob ${SUBJOB_PATH} should have a scripts/setup.sh defined"
-  fi
-
-  # Change dir into the subjob,
-  #   run the setup scripts for the subjob,
-  #   then move back into the original directory.
-
-  # Since (...)-wrapping the code runs it in a subshell, we don't need to cd
-  #   back into the original directory.
-
-  (cd "${SUBJOB_PATH}" && ./sidekick setup)
-
-done < "${SUBJOBS_FILE}"
+python -m buddy.setup_subjobs "${SUBJOBS_FILE}"
 
 ###############################################################################
@@ -106,28 +106,39 @@ if [[ "${ENVNAME}" != "${CONDA_DEFAULT_ENV}" ]]; then
 
 ###############################################################################
 # - If the `buddy` python package has not previously been installed, install it
+# - Ensure that python / Rscript are ran from $CONDA_PREFIX/bin/
+#
+# These checks are made once per conda environment (and R requirement):
+# subjobs (which are set up by `setup_subjobs.sh`) inherit BUDDY_ENV_CHECKED
+# and skip them.
 #
 # TODO: ensure files in BUDDY_PY are newer than ${CONDA_PREFIX}/lib/buddy
 #
-if $(conda list | grep -qe "^buddy\\b"); then
-  echo "${0}: 'buddy' has already been installed" >&2
+ENV_CHECK_KEY="${CONDA_PREFIX}:${IS_R_REQUIRED}"
+if [[ "${BUDDY_ENV_CHECKED:-}" == "${ENV_CHECK_KEY}" ]]; then
+  echo "${0}: conda env '${ENVNAME}' has already been checked" >&2
 else
-  if [[ ! -d "${BUDDY_PY}" ]]
-  then
-    die_and_moan \
-    "${0}: '${BUDDY_PY}' is not a directory: \
-    \n ... Cannot install the project-setup helper scripts"
+  # `env_probe.py` checks for `buddy` without running `conda list`; the result
+  # is cached until a package is added to / removed from the env
+  if python "${BUDDY_PY}/buddy/env_probe.py" --package buddy > /dev/null; then
+    echo "${0}: 'buddy' has already been installed" >&2
+  else
+    if [[ ! -d "${BUDDY_PY}" ]]
+    then
+      die_and_moan \
+      "${0}: '${BUDDY_PY}' is not a directory: \
+      \n ... Cannot install the project-setup helper scripts"
+    fi
+
+    pip install -e "${BUDDY_PY}"
   fi
 
-  pip install -e "${BUDDY_PY}"
-fi
-
-###############################################################################
-# - Ensure that python / Rscript are ran from $CONDA_PREFIX/bin/
+  python "${BUDDY_PY}/buddy/validate_env_contents.py" \
+    "${CONDA_PREFIX}" \
+    "${IS_R_REQUIRED}"
 
-python "${BUDDY_PY}/buddy/validate_env_contents.py" \
-  "${CONDA_PREFIX}" \
-  "${IS_R_REQUIRED}"
+  export BUDDY_ENV_CHECKED="${ENV_CHECK_KEY}"
+fi
 
 ###############################################################################
 # - If the user plans to use R within jupyter, ensure an R kernel is available
@@ -152,14 +163,12 @@ fi
 # - This includes any R function scripts that are hard-copied into this job
 #
 
-DIRS_SCRIPT="${SETUP_HELPERS_DIR}/setup_dirs.sh"
-if [[ ! -f "${DIRS_SCRIPT}" ]];
-then
-  die_and_moan \
-  "${0}: '${DIRS_SCRIPT}' should exist"
-fi
-
-bash "${DIRS_SCRIPT}"
+# All of these steps are ran in a single python process by `buddy.setup`; the
+# configuration files are those exported above (CHECK_DIRS_FILE,
+# MAKE_LINKS_FILE, MAKE_DIRS_FILE, MAKE_FILE_COPIES_FILE, MAKE_DIR_COPIES_FILE,
+# REPO_CLONING_CONFIG and TOUCH_FILES_FILE).
+#
+python -m buddy.setup --config-dir "${CONFIG_DIR}"
 
 ###############################################################################
 # - Construct the R package for this job